@@ -1,33 +1,229 @@
 """
 Credit Card Analysis Web Application - Flask Backend
 Phase 1: Statement Data Extraction
+
+Run with `python app.py` (development server), or in production with the
+pre-fork gunicorn settings in gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+create_app() builds further app instances (e.g. with test settings) that
+share this module's model client, caches and metrics.
 """
 
 import os
+import json
+import math
+import contextlib
+import asyncio
+import time
 import base64
-from flask import Flask, request, jsonify
+import contextvars
+import functools
+import shutil
+import tempfile
+import threading
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Blueprint, Flask, Response, abort, current_app, g, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.exceptions import OutputParserException
 from pydantic import BaseModel, Field
 from typing import Optional
+from cache import ResultCache, make_cache_key, is_valid_key
+from preprocessing import ImagePreprocessor
+from pdf_pages import PdfRasterizer, PdfError, is_pdf
+from statement_text import parse_statement_header, parse_statement_analysis
+from tiling import ImageTile, ImageTiler, merge_tile_transactions
+from structured_output import response_format, validate_output, build_repair_prompt
+from jobs import JobQueue, QueueFullError
+from streaming import RecommendationStreamParser, format_sse
+from categorizer import TransactionCategorizer
+from recommendation_cache import RecommendationCache
+from metrics import PipelineMetrics, GaugeSet
+from gateway import ModelGateway, GatewayError
+from scheduler import RequestScheduler, parse_class_settings
+from store import StatementStore, is_iso_date
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend communication
+def env_flag(name, default):
+    """Read a boolean setting from the environment"""
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Routes and request hooks; create_app() registers them on a Flask app
+api = Blueprint('api', __name__)
+
+# Chat models (LLM_BACKEND=openai, or stub for offline load tests). Built on
+# first use by get_llm(), so importing the app does not load the provider SDK
+# and pre-fork workers each open their own HTTP connections
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").strip().lower()
+MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Per-stage models: statement extraction (image or PDF text layer) and the
+# text-only calls (categorization fallback, recommendations, repairs)
+EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL") or MODEL_NAME
+TEXT_MODEL = os.getenv("TEXT_MODEL") or MODEL_NAME
+EXTRACTION_CALLS = ("extract", "analyze", "extract_text", "analyze_text")
+
+llm = None
+text_llm = None
+llm_lock = threading.Lock()
+
+# Accepted upload formats (PDF pages are rasterized locally)
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'pdf'}
+
+# Upload limits: MAX_UPLOAD_MB per file, MAX_REQUEST_MB for a whole request
+# (Flask answers larger request bodies with 413 before they are read)
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "20"))
+MAX_REQUEST_MB = float(os.getenv("MAX_REQUEST_MB", "100"))
+# Uploads that outlive their request (batches, streams, jobs) wait in temporary
+# files that only stay in memory up to this size
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_KB", "512")) * 1024
+
+# Batch extraction limits
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Image preprocessing applied before every vision call
+image_preprocessor = ImagePreprocessor(
+    enabled=env_flag("IMAGE_PREPROCESS", True),
+    max_edge=int(os.getenv("IMAGE_MAX_EDGE", "1600")),
+    grayscale=env_flag("IMAGE_GRAYSCALE", True),
+    output_format=os.getenv("IMAGE_FORMAT", "WEBP"),
+    quality=int(os.getenv("IMAGE_QUALITY", "85")),
+    autocrop=env_flag("IMAGE_AUTOCROP", False)
+)
+# Images decoded at once - a decoded upload is many times its file size
+preprocess_slots = threading.BoundedSemaphore(int(os.getenv("PREPROCESS_CONCURRENCY", "4")))
+
+# Multi-page PDF statements: pages are rendered locally and extracted in parallel
+pdf_rasterizer = PdfRasterizer(
+    dpi=int(os.getenv("PDF_DPI", "150")),
+    max_pages=int(os.getenv("PDF_MAX_PAGES", "20")),
+    grayscale=image_preprocessor.grayscale,
+    max_edge=image_preprocessor.max_edge if image_preprocessor.enabled else 0
+)
+PDF_PAGE_CONCURRENCY = int(os.getenv("PDF_PAGE_CONCURRENCY", "8"))
+# Read digital PDFs from their text layer before falling back to vision
+PDF_TEXT_LAYER = env_flag("PDF_TEXT_LAYER", True)
+
+# Tall images (long screenshots, scans) are analyzed as overlapping tiles
+image_tiler = ImageTiler(
+    min_aspect=float(os.getenv("TILE_MIN_ASPECT", "2.0")),
+    tile_aspect=float(os.getenv("TILE_ASPECT", "1.4")),
+    overlap=float(os.getenv("TILE_OVERLAP", "0.15")),
+    max_tiles=int(os.getenv("TILE_MAX_TILES", "12"))
+) if env_flag("IMAGE_TILING", False) else None
+
+# Schema-constrained replies for statement analysis and recommendations; invalid
+# replies get one text-only repair call instead of failing the request
+STRUCTURED_OUTPUT = env_flag("STRUCTURED_OUTPUT", False)
+
+# One extraction per statement: the analysis prompt also reads the header fields,
+# so /api/extract and /api/analyze are both served from a single vision pass
+UNIFIED_EXTRACTION = env_flag("UNIFIED_EXTRACTION", True)
+
+# Background job queue for /api/analyze/jobs
+job_queue = JobQueue(
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_queued=int(os.getenv("JOB_QUEUE_DEPTH", "32")),
+    result_ttl_seconds=int(os.getenv("JOB_RESULT_TTL_SECONDS", "600"))
+)
+
+JOB_RETRY_AFTER_SECONDS = int(os.getenv("JOB_RETRY_AFTER_SECONDS", "5"))
+
+# Local transaction categorizer (keyword rules, model fallback for leftovers)
+CATEGORIES = ["Cash Withdrawal", "Shopping", "Dining", "Bills", "Transfer", "Interest", "Other"]
+
+transaction_categorizer = (
+    TransactionCategorizer.from_files(os.getenv("CATEGORY_RULES_FILE"))
+    if env_flag("LOCAL_CATEGORIZER", True) else None
+)
+
+# Prompt versions - bump whenever a prompt changes so cached results are invalidated
+EXTRACT_PROMPT_VERSION = "extract-v1"
+ANALYZE_PROMPT_VERSION = "analyze-v2"
+RECOMMEND_PROMPT_VERSION = "recommend-v2"
+CATEGORIZE_PROMPT_VERSION = "categorize-v2"
+PAGE_PROMPT_VERSION = "page-v2"
+TEXT_PROMPT_VERSION = "text-v1"
+UNIFIED_PROMPT_VERSION = "unified-v1"
+
+# Part of analysis cache keys: categories depend on the rules and the fallback prompt
+CATEGORIZER_SIGNATURE = (
+    f"{transaction_categorizer.signature}-{CATEGORIZE_PROMPT_VERSION}-{TEXT_MODEL}"
+    if transaction_categorizer else "model"
+)
+
+# Part of analysis cache keys: the unified prompt also extracts the header fields
+EXTRACTION_SIGNATURE = UNIFIED_PROMPT_VERSION if UNIFIED_EXTRACTION else "split"
+
+# Recommendations re-used (re-scaled) across statements with a similar spending profile
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_ENTRIES", "1024")),
+    share_step=float(os.getenv("RECOMMENDATION_SHARE_STEP", "10")),
+    signature=f"{TEXT_MODEL}-{RECOMMEND_PROMPT_VERSION}"
+) if env_flag("RECOMMENDATION_CACHE", True) else None
+
+# Initialize result cache (in-memory LRU + optional on-disk tier)
+result_cache = ResultCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "256")),
+    disk_dir=os.getenv("CACHE_DIR") or None,
+    ttl_seconds=int(os.getenv("CACHE_TTL_SECONDS", "86400")),
+    max_disk_bytes=int(os.getenv("CACHE_MAX_DISK_MB", "100")) * 1024 * 1024
+)
+
+# Per-stage latency histograms (/metrics); slower requests are logged with their breakdown
+metrics = PipelineMetrics(
+    slow_request_seconds=float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
+)
 
-# Initialize OpenAI model
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0,
-    openai_api_key=os.getenv("OPENAI_API_KEY")
+# Gateway around every model call: concurrency/rate limits, jittered retries, circuit breaker
+model_gateway = ModelGateway(
+    max_concurrency=int(os.getenv("MODEL_MAX_CONCURRENCY", "8")),
+    rate_per_second=float(os.getenv("MODEL_RATE_PER_SECOND", "0")),
+    burst=float(os.getenv("MODEL_BURST", "0")) or None,
+    queue_timeout=float(os.getenv("MODEL_QUEUE_TIMEOUT_SECONDS", "30")),
+    max_retries=int(os.getenv("MODEL_MAX_RETRIES", "3")),
+    backoff_base=float(os.getenv("MODEL_BACKOFF_BASE_SECONDS", "0.5")),
+    backoff_max=float(os.getenv("MODEL_BACKOFF_MAX_SECONDS", "8")),
+    breaker_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+    breaker_reset_seconds=float(os.getenv("BREAKER_RESET_SECONDS", "30")),
+    on_queue_wait=lambda seconds: metrics.observe_stage("model_queue_wait", seconds)
 )
 
+# Admission of model-bound requests: weighted queues per workload class (extract,
+# analyze) with reserved slots, round robin between tenants (API keys) in a class
+SCHEDULER_TENANT_HEADER = os.getenv("SCHEDULER_TENANT_HEADER", "X-API-Key")
+
+request_scheduler = RequestScheduler(
+    max_active=int(os.getenv("SCHEDULER_SLOTS", "8")),
+    weights=parse_class_settings(os.getenv("SCHEDULER_WEIGHTS", "extract=4,analyze=1")),
+    reserved=parse_class_settings(os.getenv("SCHEDULER_RESERVED", "extract=2"), int),
+    max_queued=int(os.getenv("SCHEDULER_QUEUE_DEPTH", "256")),
+    max_queued_per_tenant=int(os.getenv("SCHEDULER_TENANT_QUEUE_DEPTH", "64")),
+    queue_timeout=float(os.getenv("SCHEDULER_QUEUE_TIMEOUT_SECONDS", "30")),
+    on_queue_wait=lambda workload, seconds: metrics.observe_stage(f"{workload}_schedule_wait", seconds)
+) if env_flag("REQUEST_SCHEDULER", True) else None
+
+metrics.register(GaugeSet("cardmgmt_gateway", "Model gateway state", model_gateway.stats))
+if request_scheduler is not None:
+    metrics.register(GaugeSet("cardmgmt_scheduler", "Request scheduler state", request_scheduler.stats))
+metrics.register(GaugeSet("cardmgmt_cache", "Result cache counters", result_cache.stats))
+if recommendation_cache is not None:
+    metrics.register(GaugeSet(
+        "cardmgmt_recommendation_cache", "Recommendation template cache counters", recommendation_cache.stats
+    ))
+
+# Local statement history (SQLite); set STATEMENT_DB empty to disable persistence
+STATEMENT_DB = os.getenv("STATEMENT_DB", "statements.db")
+statement_store = StatementStore(STATEMENT_DB) if STATEMENT_DB else None
+
 # ============================================================================
 # DATA MODELS
 # ============================================================================
@@ -44,6 +240,7 @@ class CreditCardStatement(BaseModel):
 
 class Transaction(BaseModel):
     """Pydantic model for individual transaction"""
+    date: Optional[str] = Field(default=None, description="Transaction date as printed (DD/MM/YYYY when the year is shown)")
     description: str = Field(description="Transaction description")
     amount: float = Field(description="Transaction amount (positive for debits, negative for credits)")
     category: str = Field(description="Expense category: Cash Withdrawal, Shopping, Dining, Bills, Transfer, Interest, or Other")
@@ -51,12 +248,47 @@ class Transaction(BaseModel):
 
 class StatementAnalysis(BaseModel):
     """Pydantic model for complete statement analysis"""
+    card_account_number: Optional[str] = Field(default=None, description="Credit card account number (masked if needed)")
+    statement_date: Optional[str] = Field(default=None, description="Statement date in DD/MM/YYYY format")
     total_debits: float = Field(description="Total debit amount from statement summary")
     total_credits: float = Field(description="Total credit amount from statement summary")
     closing_balance: float = Field(description="Closing balance from statement")
     transactions: list[Transaction] = Field(description="List of all transactions with categories")
 
 
+class ExtractedTransaction(BaseModel):
+    """Pydantic model for a transaction as read from the image (categorized locally)"""
+    date: Optional[str] = Field(default=None, description="Transaction date as printed (DD/MM/YYYY when the year is shown)")
+    description: str = Field(description="Transaction description exactly as printed")
+    amount: float = Field(description="Transaction amount (positive for debits, negative for credits)")
+
+
+class ExtractedStatement(BaseModel):
+    """Pydantic model for statement extraction without categories"""
+    card_account_number: Optional[str] = Field(default=None, description="Credit card account number (masked if needed)")
+    statement_date: Optional[str] = Field(default=None, description="Statement date in DD/MM/YYYY format")
+    total_debits: float = Field(description="Total debit amount from statement summary")
+    total_credits: float = Field(description="Total credit amount from statement summary")
+    closing_balance: float = Field(description="Closing balance from statement")
+    transactions: list[ExtractedTransaction] = Field(description="List of all transactions")
+
+
+class StatementHeaderFields(BaseModel):
+    """CreditCardStatement fields a StatementAnalysis does not carry (optional: not every page prints them)"""
+    customer_name: Optional[str] = Field(default=None, description="Full name of the credit card holder")
+    total_amount_due: Optional[str] = Field(default=None, description="Total amount due including currency symbol")
+    minimum_amount_due: Optional[str] = Field(default=None, description="Minimum amount due including currency symbol")
+    due_date: Optional[str] = Field(default=None, description="Payment due date in DD/MM/YYYY format")
+
+
+class UnifiedStatementAnalysis(StatementAnalysis, StatementHeaderFields):
+    """Pydantic model for one-pass extraction: statement header, summary and categorized transactions"""
+
+
+class UnifiedExtractedStatement(ExtractedStatement, StatementHeaderFields):
+    """Pydantic model for one-pass extraction without categories"""
+
+
 class CategoryRecommendation(BaseModel):
     """Pydantic model for category-wise reduction recommendation"""
     category: str = Field(description="Expense category name")
@@ -79,26 +311,380 @@ class ReductionRecommendations(BaseModel):
 
 def encode_image(image_bytes):
     """Convert image bytes to base64 string"""
-    return base64.b64encode(image_bytes).decode('utf-8')
+    with metrics.span("encode_image"):
+        return base64.b64encode(image_bytes).decode('utf-8')
+
+
+def json_output_parser(model):
+    """JsonOutputParser for a pydantic model (LangChain's parsers are imported on first use)"""
+    from langchain_core.output_parsers import JsonOutputParser
+    return JsonOutputParser(pydantic_object=model)
+
+
+def build_llm(model_name):
+    """Chat model for the configured backend"""
+    from llm_backends import create_llm
+    return create_llm(
+        LLM_BACKEND,
+        model_name,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        stub_latency=float(os.getenv("STUB_LATENCY_SECONDS", "0")),
+        stub_latency_jitter=float(os.getenv("STUB_LATENCY_JITTER_SECONDS", "0")),
+        stub_failure_rate=float(os.getenv("STUB_FAILURE_RATE", "0")),
+        stub_seed=int(os.getenv("STUB_SEED")) if os.getenv("STUB_SEED") else None,
+        stub_malformed_rate=float(os.getenv("STUB_MALFORMED_RATE", "0")),
+        stub_prefix_cache_min_tokens=int(os.getenv("STUB_PREFIX_CACHE_MIN_TOKENS", "1024"))
+    )
 
 
-def extract_statement_data(base64_image):
+def get_llm(call="analyze"):
     """
-    Extract credit card statement data using OpenAI Vision API
+    The chat model serving a call, built on first use
+    
+    Extraction calls use EXTRACTION_MODEL, everything else TEXT_MODEL; both
+    stages share one client while they name the same model.
+    """
+    global llm, text_llm
+    if call not in EXTRACTION_CALLS and TEXT_MODEL != EXTRACTION_MODEL:
+        if text_llm is None:
+            with llm_lock:
+                if text_llm is None:
+                    text_llm = build_llm(TEXT_MODEL)
+        return text_llm
+    
+    if llm is None:
+        with llm_lock:
+            if llm is None:
+                llm = build_llm(EXTRACTION_MODEL)
+    return llm
+
+
+def read_upload(image_file):
+    """Read an uploaded file's bytes"""
+    with metrics.span("upload_read"):
+        return image_file.read()
+
+
+def upload_size(image_file):
+    """Size of an uploaded file in bytes, without reading it"""
+    stream = image_file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def spool_upload(image_file):
+    """
+    Copy an upload into a temporary file that outlives the request
+    
+    Used where the upload is processed after the response has started or
+    by another worker. Only uploads up to UPLOAD_SPOOL_BYTES stay in memory.
     
     Args:
-        base64_image: Base64 encoded image string
+        image_file: Uploaded file (werkzeug FileStorage)
         
     Returns:
-        dict: Extracted statement data
+        SpooledTemporaryFile: Upload positioned at its start
     """
-    # Create parser
-    parser = JsonOutputParser(pydantic_object=CreditCardStatement)
+    with metrics.span("upload_spool"):
+        spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+        shutil.copyfileobj(image_file.stream, spool)
+        spool.seek(0)
+        return spool
+
+
+def read_spooled(spool):
+    """Read a spooled upload's bytes and delete it"""
+    with metrics.span("upload_read"):
+        with spool:
+            return spool.read()
+
+
+def invoke_model(call, messages, **options):
+    """
+    Send messages to the chat model, recording latency, tokens and payload sizes
     
-    # Create prompt
-    prompt = f"""You are a credit card statement data extraction expert.
+    Args:
+        call: Call name used as the metrics label (extract, analyze, categorize, recommend)
+        messages: Messages to send
+        **options: Extra model call arguments (e.g. response_format)
+        
+    Returns:
+        AIMessage: Model response
+    """
+    def send():
+        # One span per attempt; time spent waiting for a slot is model_queue_wait
+        with metrics.span(f"{call}_call"):
+            return get_llm(call).invoke(messages, **options)
+    
+    response = model_gateway.call(send)
+    metrics.observe_model_call(call, messages, response)
+    return response
+
+
+def structured_options(schema):
+    """Model call arguments constraining the reply to a pydantic schema (STRUCTURED_OUTPUT only)"""
+    return {"response_format": response_format(schema)} if STRUCTURED_OUTPUT else {}
+
+
+def parse_reply(schema, text, parse):
+    """Validate against the schema in structured mode, otherwise use the call's own parser"""
+    if STRUCTURED_OUTPUT:
+        return validate_output(schema, text)
+    try:
+        return parse(text)
+    except OutputParserException:
+        raise
+    except ValueError as e:
+        raise OutputParserException(f"Could not parse model reply: {e}", llm_output=text) from e
+
+
+def parse_or_repair(call, schema, text, parse, stage):
+    """
+    Parse a model reply; in structured mode an invalid reply gets one repair call
+    
+    The repair call is text-only: it sees the invalid reply and the validation
+    errors, not the original prompt or image, so it is far cheaper than
+    re-running the request.
+    
+    Args:
+        call: Call name of the reply (metrics label)
+        schema: Pydantic model the reply must match
+        text: Reply text
+        parse: Parser used outside structured mode
+        stage: Span name for parsing
+        
+    Returns:
+        dict: Parsed reply
+        
+    Raises:
+        OutputParserException: The reply (and its repair) could not be parsed
+    """
+    try:
+        with metrics.span(stage):
+            result = parse_reply(schema, text, parse)
+    except OutputParserException as error:
+        if not STRUCTURED_OUTPUT:
+            metrics.observe_parse(call, "failed")
+            raise
+        
+        repair_messages = [HumanMessage(content=build_repair_prompt(schema, text, error))]
+        response = invoke_model(f"{call}_repair", repair_messages, **structured_options(schema))
+        try:
+            with metrics.span(stage):
+                result = validate_output(schema, response.content)
+        except OutputParserException:
+            metrics.observe_parse(call, "failed")
+            raise
+        metrics.observe_parse(call, "repaired")
+        return result
+    
+    metrics.observe_parse(call, "ok")
+    return result
+
+
+def invoke_structured(call, messages, schema, parse, stage=None):
+    """
+    Invoke the model for a reply matching a pydantic schema
+    
+    Args:
+        call: Call name (metrics label)
+        messages: Messages to send
+        schema: Pydantic model the reply must match
+        parse: Parser used outside structured mode
+        stage: Span name for parsing (defaults to '<call>_parse')
+        
+    Returns:
+        dict: Parsed reply
+    """
+    response = invoke_model(call, messages, **structured_options(schema))
+    return parse_or_repair(call, schema, response.content, parse, stage or f"{call}_parse")
+
+
+def gateway_error_response(error):
+    """Answer a GatewayError with its status code and a Retry-After hint"""
+    response = jsonify({
+        "status": "error",
+        "message": str(error)
+    })
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status_code
+
+
+def request_tenant(headers):
+    """Tenant a request is queued under: its API key header (None = default tenant)"""
+    return headers.get(SCHEDULER_TENANT_HEADER) or None
+
+
+def scheduler_slot(workload, tenant=None):
+    """
+    Scheduler slot for model-bound work (a no-op without the scheduler)
+    
+    Args:
+        workload: Workload class ("extract" or "analyze")
+        tenant: Tenant to queue under (None = default tenant)
+        
+    Returns:
+        Context manager holding the slot
+    """
+    if request_scheduler is None:
+        return contextlib.nullcontext()
+    return request_scheduler.slot(workload, tenant)
+
+
+def request_slot(workload, headers):
+    """Scheduler slot for a model-bound request, queued under the tenant of its headers"""
+    return scheduler_slot(workload, request_tenant(headers))
+
+
+def arequest_slot(workload, headers):
+    """Async variant of request_slot"""
+    if request_scheduler is None:
+        return contextlib.nullcontext()
+    return request_scheduler.aslot(workload, request_tenant(headers))
+
+
+def validate_image_upload(files):
+    """
+    Validate the 'image' file of a multipart upload
+    
+    Args:
+        files: Uploaded files mapping (e.g. request.files)
+        
+    Returns:
+        tuple: (image_file, error_message) - error_message is None when valid
+    """
+    if 'image' not in files:
+        return None, "No image file provided"
+    
+    image_file = files['image']
+    error = validate_image_file(image_file)
+    if error:
+        return None, error
+    
+    return image_file, None
+
+
+def validate_image_file(image_file):
+    """
+    Validate the name, extension and size of a single uploaded file
+    
+    Args:
+        image_file: Uploaded file (werkzeug FileStorage)
+        
+    Returns:
+        str: Error message, or None when valid
+    """
+    # Validate file
+    if image_file.filename == '':
+        return "No file selected"
+    
+    # Check file extension
+    file_ext = image_file.filename.rsplit('.', 1)[1].lower() if '.' in image_file.filename else ''
+    
+    if file_ext not in ALLOWED_EXTENSIONS:
+        return f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+    
+    # Check file size (the upload is already spooled, so nothing is read here)
+    if MAX_UPLOAD_MB and upload_size(image_file) > MAX_UPLOAD_MB * 1024 * 1024:
+        return f"File too large. Maximum size: {MAX_UPLOAD_MB:g} MB"
+    
+    return None
+
+
+def parse_reduction_percentage(form):
+    """
+    Read and validate the 'reduction_percentage' field
+    
+    Args:
+        form: Form or JSON payload mapping
+        
+    Returns:
+        tuple: (reduction_percentage, error_message) - error_message is None when valid
+    """
+    if 'reduction_percentage' not in form:
+        return None, "No reduction percentage provided"
+    
+    try:
+        reduction_percentage = float(form['reduction_percentage'])
+    except (TypeError, ValueError):
+        return None, "Reduction percentage must be a number"
+    
+    # float() accepts "nan", which compares false against both bounds below
+    if not math.isfinite(reduction_percentage):
+        return None, "Reduction percentage must be a number"
+    
+    if reduction_percentage <= 0 or reduction_percentage > 100:
+        return None, "Reduction percentage must be between 1 and 100"
+    
+    return reduction_percentage, None
+
+
+def parse_history_filters(args):
+    """
+    Read and validate history query parameters (account, from, to, limit, offset)
+    
+    Args:
+        args: Query string mapping
+        
+    Returns:
+        tuple: (filters, error_message) - error_message is None when valid
+    """
+    filters = {
+        "account": args.get('account') or None,
+        "date_from": args.get('from') or None,
+        "date_to": args.get('to') or None,
+    }
+    for name in ("date_from", "date_to"):
+        if filters[name] is not None and not is_iso_date(filters[name]):
+            return None, "Dates must use the YYYY-MM-DD format"
+    
+    for name, default in (("limit", 100), ("offset", 0)):
+        try:
+            filters[name] = int(args.get(name, default))
+        except (TypeError, ValueError):
+            return None, f"{name.capitalize()} must be an integer"
+        if filters[name] < 0:
+            return None, f"{name.capitalize()} must not be negative"
+    
+    return filters, None
+
+
+def build_page_note(page):
+    """Prompt paragraph telling the model it sees one page (or tile) of a longer statement"""
+    if isinstance(page, ImageTile):
+        return f"""
+This image is slice {page.number} of {page.tile_count} cut from one tall statement image,
+top to bottom; consecutive slices overlap. Extract only what is printed on this slice,
+skip any transaction row that is cut off at the top or bottom edge, and use null for
+any field that does not appear on it.
+"""
+    if page is None or page.page_count == 1:
+        return ""
+    return f"""
+This image is page {page.number} of a {page.page_count}-page statement. Extract only
+what is printed on this page and use null for any field that does not appear on it.
+"""
 
-Analyze this credit card statement image and extract the following information:
+
+@functools.lru_cache(maxsize=None)
+def statement_prompt_prefix(source):
+    """
+    Static part of the statement header extraction prompt
+    
+    Built once per source and sent byte-identical on every call, so provider
+    prompt caching can reuse it; per-request content only ever follows it.
+    """
+    precision = (
+        "Be precise and extract exactly what you see in the image." if source == "image"
+        else "Be precise and copy every value exactly as it is printed in the text."
+    )
+    return f"""You are a credit card statement data extraction expert.
+
+Analyze this credit card statement {source} and extract the following information:
 - Customer Name
 - Card Account Number
 - Statement Date
@@ -107,10 +693,43 @@ Analyze this credit card statement image and extract the following information:
 - Due Date
 
 Return the data in the following JSON format:
-{parser.get_format_instructions()}
+{json_output_parser(CreditCardStatement).get_format_instructions()}
 
-Be precise and extract exactly what you see in the image.
+{precision}
 """
+
+
+def build_statement_prompt(source="image", page=None):
+    """
+    Build the statement header extraction prompt
+    
+    Args:
+        source: What the model is given - 'image' or 'text'
+        page: RenderedPage when the image is one page of a PDF
+        
+    Returns:
+        str: Prompt text (static prefix, then the page note)
+    """
+    return statement_prompt_prefix(source) + build_page_note(page)
+
+
+def build_statement_messages(base64_image, mime_type="image/png", page=None):
+    """
+    Build the vision prompt for statement header extraction
+    
+    Args:
+        base64_image: Base64 encoded image string
+        mime_type: MIME type of the encoded image
+        page: RenderedPage when the image is one page of a PDF
+        
+    Returns:
+        tuple: (parser, messages)
+    """
+    # Create parser
+    parser = json_output_parser(CreditCardStatement)
+    
+    # Create prompt
+    prompt = build_statement_prompt("image", page)
     
     # Create message with image
     message = HumanMessage(
@@ -118,70 +737,331 @@ Be precise and extract exactly what you see in the image.
             {"type": "text", "text": prompt},
             {
                 "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{base64_image}"}
+                "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}
             }
         ]
     )
     
+    return parser, [message]
+
+
+def extract_statement_data(base64_image, mime_type="image/png", page=None):
+    """
+    Extract credit card statement data using OpenAI Vision API
+    
+    Args:
+        base64_image: Base64 encoded image string
+        mime_type: MIME type of the encoded image
+        page: RenderedPage when the image is one page of a PDF
+        
+    Returns:
+        dict: Extracted statement data
+    """
+    parser, messages = build_statement_messages(base64_image, mime_type, page)
+    
     # Get response from AI
-    response = llm.invoke([message])
+    response = invoke_model("extract", messages)
     
     # Parse the response
-    extracted_data = parser.parse(response.content)
+    with metrics.span("extract_parse"):
+        extracted_data = parser.parse(response.content)
     
     return extracted_data
 
 
-def analyze_spending(base64_image, reduction_percentage):
+def analysis_schema(include_categories):
+    """Pydantic model the statement analysis prompt asks for"""
+    if include_categories:
+        return UnifiedStatementAnalysis if UNIFIED_EXTRACTION else StatementAnalysis
+    return UnifiedExtractedStatement if UNIFIED_EXTRACTION else ExtractedStatement
+
+
+@functools.lru_cache(maxsize=None)
+def analysis_prompt_prefix(schema, source):
     """
-    Analyze credit card spending and generate reduction recommendations
+    Static part of the statement analysis prompt
+    
+    Built once per schema and source and sent byte-identical on every call,
+    so provider prompt caching can reuse it; per-request content only ever
+    follows it.
     
     Args:
-        base64_image: Base64 encoded image string
-        reduction_percentage: Target reduction percentage (e.g., 20 for 20%)
+        schema: Pydantic model from analysis_schema()
+        source: What the model is given - 'image' or 'text'
         
     Returns:
-        dict: Analysis results with recommendations
+        str: Prompt text
     """
-    # Step 1: Extract statement data and categorize transactions
-    parser = JsonOutputParser(pydantic_object=StatementAnalysis)
+    if issubclass(schema, StatementAnalysis):
+        transaction_fields = """   - Date
+   - Description
+   - Amount (use positive for debits/spending, negative for credits)
+   - Category (categorize each transaction into: Cash Withdrawal, Shopping, Dining, Bills, Transfer, Interest, or Other)
+
+Analyze the transaction descriptions carefully and assign appropriate categories.
+"""
+    else:
+        transaction_fields = """   - Date
+   - Description (copy the text exactly as printed)
+   - Amount (use positive for debits/spending, negative for credits)
+"""
+    
+    if issubclass(schema, StatementHeaderFields):
+        summary_fields = """   - Customer Name
+   - Card Account Number
+   - Statement Date
+   - Total Amount Due (including currency symbol)
+   - Minimum Amount Due (including currency symbol)
+   - Due Date
+"""
+    else:
+        summary_fields = """   - Card Account Number
+   - Statement Date
+"""
     
-    extraction_prompt = f"""You are a credit card statement analysis expert.
+    completeness = (
+        "Be precise and extract all visible transactions." if source == "image"
+        else "Be precise and extract every transaction listed in the text."
+    )
+    return f"""You are a credit card statement analysis expert.
 
-Analyze this credit card statement image and extract:
+Analyze this credit card statement {source} and extract:
 
 1. Statement Summary:
-   - Total Debits (total spending)
+{summary_fields}   - Total Debits (total spending)
    - Total Credits (payments/refunds received)
    - Closing Balance
 
 2. All Individual Transactions:
-   - Description
-   - Amount (use positive for debits/spending, negative for credits)
-   - Category (categorize each transaction into: Cash Withdrawal, Shopping, Dining, Bills, Transfer, Interest, or Other)
-
-Analyze the transaction descriptions carefully and assign appropriate categories.
-
+{transaction_fields}
 Return data in this JSON format:
-{parser.get_format_instructions()}
+{json_output_parser(schema).get_format_instructions()}
 
-Be precise and extract all visible transactions.
+{completeness}
 """
+
+
+def build_analysis_prompt(include_categories=True, source="image", page=None):
+    """
+    Build the statement summary and transaction extraction prompt
     
-    message = HumanMessage(
-        content=[
-            {"type": "text", "text": extraction_prompt},
-            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-        ]
-    )
-    
-    response = llm.invoke([message])
-    statement_data = parser.parse(response.content)
-    
-    # Step 2: Calculate category-wise spending
-    category_spending = {}
-    for txn in statement_data['transactions']:
-        category = txn['category']
+    Args:
+        include_categories: Ask the model to categorize transactions; when
+                            False, categories are assigned locally afterwards
+        source: What the model is given - 'image' or 'text'
+        page: RenderedPage when the image is one page of a PDF
+        
+    Returns:
+        tuple: (parser, prompt text - static prefix, then the page note)
+    """
+    schema = analysis_schema(include_categories)
+    return json_output_parser(schema), analysis_prompt_prefix(schema, source) + build_page_note(page)
+
+
+def build_analysis_messages(base64_image, mime_type="image/png", include_categories=True, page=None):
+    """
+    Build the vision prompt for statement summary and transaction extraction
+    
+    Args:
+        base64_image: Base64 encoded image string
+        mime_type: MIME type of the encoded image
+        include_categories: Ask the model to categorize transactions; when
+                            False, categories are assigned locally afterwards
+        page: RenderedPage when the image is one page of a PDF
+        
+    Returns:
+        tuple: (parser, messages)
+    """
+    parser, extraction_prompt = build_analysis_prompt(include_categories, "image", page)
+    
+    message = HumanMessage(
+        content=[
+            {"type": "text", "text": extraction_prompt},
+            {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}}
+        ]
+    )
+    
+    return parser, [message]
+
+
+def extract_statement_analysis(base64_image, mime_type="image/png", page=None):
+    """
+    Extract statement summary and categorized transactions (vision step)
+    
+    Args:
+        base64_image: Base64 encoded image string
+        mime_type: MIME type of the encoded image
+        page: RenderedPage (or ImageTile) when the image is one part of the
+              statement - its transactions are categorized after merging
+        
+    Returns:
+        dict: Extracted StatementAnalysis data
+    """
+    # Step 1: Extract statement data and categorize transactions
+    parser, messages = build_analysis_messages(
+        base64_image, mime_type, include_categories=transaction_categorizer is None, page=page
+    )
+    
+    statement_data = invoke_structured("analyze", messages, parser.pydantic_object, parser.parse)
+    
+    if transaction_categorizer is not None and page is None:
+        categorize_statement(statement_data)
+    
+    return statement_data
+
+
+def extract_statement_text_data(statement_text):
+    """
+    Extract CreditCardStatement fields from a PDF text layer (text-only model call)
+    
+    Args:
+        statement_text: Text layer of the statement
+        
+    Returns:
+        dict: Extracted statement data
+    """
+    parser = json_output_parser(CreditCardStatement)
+    prompt = build_statement_prompt("text")
+    messages = [HumanMessage(content=f"{prompt}\nStatement text:\n{statement_text}\n")]
+    
+    response = invoke_model("extract_text", messages)
+    with metrics.span("extract_parse"):
+        return parser.parse(response.content)
+
+
+def extract_statement_text_analysis(statement_text):
+    """
+    Extract the statement summary and transactions from a PDF text layer
+    (text-only model call; categories are added by the caller)
+    
+    Args:
+        statement_text: Text layer of the statement
+        
+    Returns:
+        dict: Extracted StatementAnalysis data
+    """
+    parser, prompt = build_analysis_prompt(transaction_categorizer is None, "text")
+    messages = [HumanMessage(content=f"{prompt}\nStatement text:\n{statement_text}\n")]
+    
+    return invoke_structured(
+        "analyze_text", messages, parser.pydantic_object, parser.parse, stage="analyze_parse"
+    )
+
+
+def build_categorization_prompt(descriptions):
+    """
+    Build the batched text-only prompt for descriptions no local rule matched
+    
+    Args:
+        descriptions: Transaction descriptions
+        
+    Returns:
+        str: Categorization prompt
+    """
+    numbered = "\n".join(f"{index}. {description}" for index, description in enumerate(descriptions, 1))
+    
+    # Instructions first (identical on every call), the transactions last
+    return f"""Categorize each credit card transaction description below into exactly one of: {', '.join(CATEGORIES)}.
+
+Return JSON in this format, with one category per transaction in the same order:
+{{"categories": ["category for 1", "category for 2"]}}
+
+Transactions:
+{numbered}
+"""
+
+
+def apply_model_categories(transactions, response_text):
+    """
+    Assign categories returned by the fallback model call
+    
+    Unknown categories, or a response with the wrong number of entries, fall back to Other.
+    """
+    try:
+        categories = parse_json_response(response_text).get('categories', [])
+    except (ValueError, AttributeError):
+        categories = []
+    
+    if len(categories) != len(transactions):
+        categories = ["Other"] * len(transactions)
+    
+    for txn, category in zip(transactions, categories):
+        txn['category'] = category if category in CATEGORIES else "Other"
+
+
+def known_transactions_categorized(statement_data):
+    """
+    Give transactions the account's history already holds their stored category
+    
+    Args:
+        statement_data: Extracted StatementAnalysis data (updated in place)
+        
+    Returns:
+        list: Transactions that are new to the history and still need a category
+    """
+    transactions = statement_data['transactions']
+    if statement_store is None or not transactions:
+        return transactions
+    
+    try:
+        with metrics.span("categorize_history"):
+            known = statement_store.known_categories(statement_data)
+    except sqlite3.Error as e:
+        app.logger.warning("Could not look up known transactions: %s", e)
+        return transactions
+    
+    new_transactions = []
+    for txn, category in zip(transactions, known):
+        if category:
+            txn['category'] = category
+        else:
+            new_transactions.append(txn)
+    return new_transactions
+
+
+def categorize_statement(statement_data):
+    """Categorize the transactions of a statement that the history has not seen yet"""
+    categorize_transactions(known_transactions_categorized(statement_data))
+
+
+def categorize_transactions(transactions):
+    """
+    Categorize extracted transactions locally, batching leftovers into one model call
+    
+    Args:
+        transactions: Transaction dicts (updated in place with a 'category')
+    """
+    # Nothing left once the history knew every row - not a statement the rules categorized
+    if not transactions:
+        return
+    
+    with metrics.span("categorize_local"):
+        unmatched = transaction_categorizer.apply(transactions)
+    if not unmatched:
+        return
+    
+    start = time.perf_counter()
+    prompt = build_categorization_prompt([txn['description'] for txn in unmatched])
+    response = invoke_model("categorize", [HumanMessage(content=prompt)])
+    apply_model_categories(unmatched, response.content)
+    transaction_categorizer.record_model_fallback(len(unmatched), time.perf_counter() - start)
+
+
+def compute_spending_breakdown(statement_data, reduction_percentage):
+    """
+    Aggregate spending per category and compute the reduction target
+    
+    Args:
+        statement_data: Extracted StatementAnalysis data
+        reduction_percentage: Target reduction percentage (e.g., 20 for 20%)
+        
+    Returns:
+        dict: Sorted category totals and target amounts
+    """
+    # Step 2: Calculate category-wise spending
+    category_spending = {}
+    for txn in statement_data['transactions']:
+        category = txn['category']
         amount = txn['amount']
         
         # Only count debits (positive amounts) as spending
@@ -198,25 +1078,16 @@ Be precise and extract all visible transactions.
     target_reduction_amount = current_spending * (reduction_percentage / 100)
     target_spending = current_spending - target_reduction_amount
     
-    # Step 4: Generate AI-powered recommendations
-    analysis_context = f"""Credit Card Spending Analysis:
-
-Current Total Spending: INR {current_spending:,.2f}
-Target Reduction: {reduction_percentage}%
-Amount to Save: INR {target_reduction_amount:,.2f}
-
-Category-wise Spending:
-"""
-    
-    for category, amount in sorted_categories:
-        percentage = (amount / current_spending) * 100
-        analysis_context += f"- {category}: INR {amount:,.2f} ({percentage:.1f}%)\n"
-    
-    recommendation_prompt = f"""{analysis_context}
+    return {
+        "sorted_categories": sorted_categories,
+        "current_spending": current_spending,
+        "reduction_percentage": reduction_percentage,
+        "target_reduction_amount": target_reduction_amount,
+        "target_spending": target_spending
+    }
 
-Based on your spending patterns, I'll help you create a personalized plan to reduce your expenses by {reduction_percentage}% (saving INR {target_reduction_amount:,.2f}).
 
-Please analyze each spending category and provide warm, conversational, and highly specific recommendations as if you're a friendly financial advisor talking to a friend. 
+RECOMMENDATION_INSTRUCTIONS = """You are a friendly financial advisor. Please analyze each spending category in the credit card spending analysis at the end of this message and provide warm, conversational, and highly specific recommendations as if you're talking to a friend. 
 
 For each category you recommend reducing:
 1. Explain WHY this category is a good target for reduction (based on the actual spending amount)
@@ -234,28 +1105,79 @@ Guidelines:
 - Include motivational phrases and encouragement
 
 Return recommendations in JSON format:
-{{
+{
   "recommendations": [
-    {{
+    {
       "category": "category name",
       "current_spending": amount,
       "reduction_percentage": percentage,
       "amount_to_save": amount,
       "new_spending": amount,
       "advice": "Write 2-3 sentences of warm, specific, actionable advice. Start by acknowledging their current spending, then suggest specific ways to reduce it. Include real examples like 'Instead of eating out 4 times a week, try cooking at home 2-3 times - you could save around INR X per month!' or 'I noticed you're spending a lot on cash withdrawals - consider using digital payments to track your spending better and avoid unnecessary ATM fees.' Make it feel like a conversation with a helpful friend who genuinely wants to help them save money."
-    }}
+    }
   ],
-  "total_savings": {target_reduction_amount}
-}}
+  "total_savings": amount
+}
 
 Remember: Make each piece of advice feel personal, specific, and achievable. Use actual numbers from their spending when giving examples.
 """
+
+
+def build_recommendation_prompt(breakdown):
+    """
+    Build the text-only recommendation prompt
+    
+    The static instructions come first and the per-request numbers last, so
+    provider prompt caching can reuse the instructions across requests.
+    
+    Args:
+        breakdown: Result of compute_spending_breakdown
+        
+    Returns:
+        str: Recommendation prompt
+    """
+    analysis_context = f"""
+Credit Card Spending Analysis:
+
+Current Total Spending: INR {breakdown['current_spending']:,.2f}
+Target Reduction: {breakdown['reduction_percentage']}%
+Amount to Save: INR {breakdown['target_reduction_amount']:,.2f}
+
+Category-wise Spending:
+"""
+    
+    for category, amount in breakdown['sorted_categories']:
+        percentage = (amount / breakdown['current_spending']) * 100
+        analysis_context += f"- {category}: INR {amount:,.2f} ({percentage:.1f}%)\n"
     
-    recommendation_response = llm.invoke([HumanMessage(content=recommendation_prompt)])
+    return f"""{RECOMMENDATION_INSTRUCTIONS}{analysis_context}
+Create a personalized plan to reduce these expenses by {breakdown['reduction_percentage']}% (saving INR {breakdown['target_reduction_amount']:,.2f}) and set total_savings to {breakdown['target_reduction_amount']}.
+"""
+
+
+def parse_recommendations(response_text):
+    """
+    Parse recommendation JSON from a model response
     
-    # Parse JSON from response (handle markdown code blocks)
-    response_text = recommendation_response.content
+    Args:
+        response_text: Raw model output
+        
+    Returns:
+        dict: Parsed ReductionRecommendations data
+    """
+    return parse_json_response(response_text)
+
+
+def parse_json_response(response_text):
+    """
+    Parse JSON from a model response (handles markdown code blocks)
     
+    Args:
+        response_text: Raw model output
+        
+    Returns:
+        Parsed JSON value
+    """
     if "```json" in response_text:
         json_start = response_text.find("```json") + 7
         json_end = response_text.find("```", json_start)
@@ -265,10 +1187,23 @@ Remember: Make each piece of advice feel personal, specific, and achievable. Use
         json_end = response_text.find("```", json_start)
         response_text = response_text[json_start:json_end].strip()
     
-    import json
-    recommendations = json.loads(response_text)
+    return json.loads(response_text)
+
+
+def assemble_analysis(statement_data, breakdown, recommendations):
+    """
+    Combine extracted data, breakdown and recommendations into the API result
+    
+    Args:
+        statement_data: Extracted StatementAnalysis data
+        breakdown: Result of compute_spending_breakdown
+        recommendations: Parsed ReductionRecommendations data
+        
+    Returns:
+        dict: Analysis results with recommendations
+    """
+    current_spending = breakdown['current_spending']
     
-    # Return complete analysis
     return {
         "statement_summary": {
             "total_debits": statement_data['total_debits'],
@@ -281,38 +1216,1255 @@ Remember: Make each piece of advice feel personal, specific, and achievable. Use
                 "amount": amount,
                 "percentage": (amount / current_spending) * 100
             }
-            for category, amount in sorted_categories
+            for category, amount in breakdown['sorted_categories']
         ],
         "reduction_target": {
             "current_spending": current_spending,
-            "reduction_percentage": reduction_percentage,
-            "target_spending": target_spending,
-            "amount_to_save": target_reduction_amount
+            "reduction_percentage": breakdown['reduction_percentage'],
+            "target_spending": breakdown['target_spending'],
+            "amount_to_save": breakdown['target_reduction_amount']
         },
         "recommendations": recommendations['recommendations'],
         "total_projected_savings": recommendations['total_savings']
     }
 
 
-# ============================================================================
-# API ENDPOINTS
-# ============================================================================
+def cached_recommendations(breakdown):
+    """Recommendations re-scaled from a similar spending profile, or None"""
+    if recommendation_cache is None:
+        return None
+    with metrics.span("recommend_cache"):
+        return recommendation_cache.get(breakdown)
+
+
+def store_recommendations(breakdown, recommendations):
+    """Keep model recommendations as templates for similar spending profiles"""
+    if recommendation_cache is not None:
+        recommendation_cache.set(breakdown, recommendations)
+
+
+def recommend_reductions(breakdown):
+    """
+    Reduction recommendations for a breakdown: re-scaled from a similar
+    spending profile when one is cached, otherwise from the model
+    
+    Args:
+        breakdown: Result of compute_spending_breakdown
+        
+    Returns:
+        dict: ReductionRecommendations data
+    """
+    recommendations = cached_recommendations(breakdown)
+    if recommendations is None:
+        recommendation_prompt = build_recommendation_prompt(breakdown)
+        recommendations = invoke_structured(
+            "recommend", [HumanMessage(content=recommendation_prompt)],
+            ReductionRecommendations, parse_recommendations
+        )
+        store_recommendations(breakdown, recommendations)
+    return recommendations
+
+
+def plan_reduction(statement_data, reduction_percentage):
+    """
+    Compute category breakdown and reduction recommendations (text-only steps)
+    
+    Args:
+        statement_data: Extracted StatementAnalysis data
+        reduction_percentage: Target reduction percentage (e.g., 20 for 20%)
+        
+    Returns:
+        dict: Analysis results with recommendations
+    """
+    with metrics.span("aggregate"):
+        breakdown = compute_spending_breakdown(statement_data, reduction_percentage)
+    
+    # Step 4: Generate AI-powered recommendations (or re-use a similar profile's)
+    recommendations = recommend_reductions(breakdown)
+    
+    # Return complete analysis
+    return assemble_analysis(statement_data, breakdown, recommendations)
+
+
+def analyze_spending(base64_image, reduction_percentage, mime_type="image/png"):
+    """
+    Analyze credit card spending and generate reduction recommendations
+    
+    Args:
+        base64_image: Base64 encoded image string
+        reduction_percentage: Target reduction percentage (e.g., 20 for 20%)
+        mime_type: MIME type of the encoded image
+        
+    Returns:
+        dict: Analysis results with recommendations
+    """
+    statement_data = extract_statement_analysis(base64_image, mime_type)
+    return plan_reduction(statement_data, reduction_percentage)
+
+
+def prepare_image(image_bytes):
+    """
+    Preprocess an upload and base64-encode it for the vision model
+    
+    Args:
+        image_bytes: Raw uploaded image bytes
+        
+    Returns:
+        tuple: (base64_image, mime_type)
+    """
+    with metrics.span("preprocess_wait"):
+        preprocess_slots.acquire()
+    try:
+        with metrics.span("preprocess"):
+            processed_bytes, mime_type = image_preprocessor.process(image_bytes)
+    finally:
+        preprocess_slots.release()
+    return encode_image(processed_bytes), mime_type
+
+
+def render_pdf(pdf_bytes):
+    """Rasterize the pages of a PDF statement that may carry statement data"""
+    with metrics.span("pdf_render"):
+        return pdf_rasterizer.render(pdf_bytes)
+
+
+def prepare_page(page):
+    """
+    Preprocess a rendered PDF page and base64-encode it for the vision model
+    
+    Args:
+        page: RenderedPage
+        
+    Returns:
+        tuple: (base64_image, mime_type)
+    """
+    with metrics.span("preprocess"):
+        processed_bytes, mime_type = image_preprocessor.process_image(page.image)
+    return encode_image(processed_bytes), mime_type
+
+
+def map_pages(func, pages):
+    """
+    Run func over PDF pages in parallel (bounded by PDF_PAGE_CONCURRENCY)
+    
+    Args:
+        func: Callable taking a RenderedPage
+        pages: RenderedPages
+        
+    Returns:
+        list: Results in page order
+    """
+    if len(pages) == 1:
+        return [func(pages[0])]
+    
+    with ThreadPoolExecutor(max_workers=min(len(pages), PDF_PAGE_CONCURRENCY)) as pool:
+        # Each page runs in a copy of the caller's context so its stages land in the request trace
+        futures = [pool.submit(contextvars.copy_context().run, func, page) for page in pages]
+        return [future.result() for future in futures]
+
+
+def first_value(results, field):
+    """First value of a field printed on any page (non-zero numbers win over 0)"""
+    values = [result.get(field) for result in results if result.get(field) not in (None, "")]
+    return next((value for value in values if value), values[0] if values else None)
+
+
+def merge_page_analyses(results, transactions=None):
+    """
+    Merge per-page StatementAnalysis extractions into one statement
+    
+    Transactions are concatenated in page order. Each summary field is taken
+    from the page that printed it; totals missing from every page are summed
+    from the transactions.
+    
+    Args:
+        results: Per-page StatementAnalysis dicts in page order
+        transactions: Already merged transactions (e.g. tiles with their
+                      overlaps removed) instead of the concatenation
+        
+    Returns:
+        dict: Merged StatementAnalysis data
+    """
+    if transactions is None:
+        transactions = [txn for result in results for txn in result.get('transactions') or []]
+    fields = ["card_account_number", "statement_date", "total_debits", "total_credits", "closing_balance"]
+    if UNIFIED_EXTRACTION:
+        fields += list(StatementHeaderFields.model_fields)
+    merged = {field: first_value(results, field) for field in fields}
+    
+    if merged['total_debits'] is None:
+        merged['total_debits'] = round(sum(txn['amount'] for txn in transactions if txn['amount'] > 0), 2)
+    if merged['total_credits'] is None:
+        merged['total_credits'] = round(-sum(txn['amount'] for txn in transactions if txn['amount'] < 0), 2)
+    
+    merged['transactions'] = transactions
+    return merged
+
+
+def missing_header_fields(extracted_data):
+    """CreditCardStatement fields an extraction left empty"""
+    return [
+        field for field in CreditCardStatement.model_fields
+        if extracted_data.get(field) in (None, "")
+    ]
+
+
+def fill_statement_header(statement_data, header):
+    """Fill the CreditCardStatement fields an analysis left empty from a separately read header"""
+    for field in CreditCardStatement.model_fields:
+        if statement_data.get(field) in (None, ""):
+            statement_data[field] = header.get(field)
+    return statement_data
+
+
+def statement_header(statement_data):
+    """The /api/extract view of a unified analysis: CreditCardStatement fields and the extraction path"""
+    return dict(
+        {field: statement_data.get(field) for field in CreditCardStatement.model_fields},
+        extraction_path=statement_data.get('extraction_path')
+    )
+
+
+def is_usable_analysis(statement_data):
+    """Check that a text-only extraction returned transactions and numeric totals"""
+    return (
+        bool(statement_data.get('transactions'))
+        and all(isinstance(statement_data.get(field), (int, float))
+                for field in ("total_debits", "total_credits"))
+    )
+
+
+def read_pdf_text(pdf_bytes):
+    """Text layer of a PDF statement, or None (scanned PDF or fast path disabled)"""
+    if not PDF_TEXT_LAYER:
+        return None
+    with metrics.span("pdf_text"):
+        return pdf_rasterizer.read_text(pdf_bytes)
+
+
+def try_text_extraction(extract, is_complete):
+    """
+    Run a text-only extraction, returning None when its output is unusable
+    
+    Gateway errors propagate - vision would hit the same unavailable upstream.
+    """
+    try:
+        extracted_data = extract()
+    except OutputParserException:
+        return None
+    return extracted_data if isinstance(extracted_data, dict) and is_complete(extracted_data) else None
+
+
+def read_text_header(statement_text):
+    """
+    Statement header fields from a PDF text layer: deterministic parsing first,
+    then a text-only model call
+    
+    Returns:
+        dict: CreditCardStatement data, empty when neither could read it
+    """
+    with metrics.span("text_parse"):
+        header = parse_statement_header(statement_text)
+    if header is None:
+        header = try_text_extraction(
+            lambda: extract_statement_text_data(statement_text),
+            lambda data: not missing_header_fields(data)
+        )
+    return header or {}
+
+
+def extract_pdf_statement_data(pdf_bytes):
+    """
+    Extract statement header fields from a PDF
+    
+    Digital PDFs are read from their text layer: deterministic parsing first,
+    then a text-only model call. Only scanned PDFs (or text that neither
+    could read) are rendered for the vision model.
+    
+    Args:
+        pdf_bytes: Raw PDF upload
+        
+    Returns:
+        dict: Extracted statement data with its 'extraction_path'
+    """
+    statement_text = read_pdf_text(pdf_bytes)
+    if statement_text:
+        with metrics.span("text_parse"):
+            extracted_data = parse_statement_header(statement_text)
+        if extracted_data is not None:
+            return dict(extracted_data, extraction_path="text_parse")
+        
+        extracted_data = try_text_extraction(
+            lambda: extract_statement_text_data(statement_text),
+            lambda data: not missing_header_fields(data)
+        )
+        if extracted_data is not None:
+            return dict(extracted_data, extraction_path="text_model")
+    
+    return dict(extract_pdf_pages_statement_data(pdf_bytes), extraction_path="vision")
+
+
+def extract_pdf_pages_statement_data(pdf_bytes):
+    """
+    Extract statement header fields from rendered PDF pages (vision)
+    
+    The header is read from the first page; remaining pages are only sent
+    (in parallel) when some field is not printed there.
+    
+    Args:
+        pdf_bytes: Raw PDF upload
+        
+    Returns:
+        dict: Extracted statement data
+    """
+    pages = render_pdf(pdf_bytes)
+    extracted_data = extract_statement_data(*prepare_page(pages[0]), page=pages[0])
+    
+    missing = missing_header_fields(extracted_data)
+    if missing and len(pages) > 1:
+        results = map_pages(
+            lambda page: extract_statement_data(*prepare_page(page), page=page), pages[1:]
+        )
+        for field in missing:
+            extracted_data[field] = first_value(results, field)
+    
+    return extracted_data
+
+
+def extract_pdf_analysis(pdf_bytes):
+    """
+    Extract a PDF statement into one categorized StatementAnalysis
+    
+    Digital PDFs are read from their text layer: deterministic parsing first
+    (only accepted when the rows add up to the printed totals), then a
+    text-only model call. Otherwise every page is rendered and extracted by
+    the vision model in parallel.
+    
+    Args:
+        pdf_bytes: Raw PDF upload
+        
+    Returns:
+        dict: Extracted StatementAnalysis data with its 'extraction_path'
+    """
+    statement_data, extraction_path = None, "vision"
+    
+    statement_text = read_pdf_text(pdf_bytes)
+    if statement_text:
+        # Parsed rows carry no category - only usable with the local categorizer
+        if transaction_categorizer is not None:
+            with metrics.span("text_parse"):
+                statement_data = parse_statement_analysis(statement_text)
+            extraction_path = "text_parse"
+        if statement_data is not None and UNIFIED_EXTRACTION:
+            fill_statement_header(statement_data, read_text_header(statement_text))
+        if statement_data is None:
+            statement_data = try_text_extraction(
+                lambda: extract_statement_text_analysis(statement_text), is_usable_analysis
+            )
+            extraction_path = "text_model"
+    
+    if statement_data is None:
+        statement_data = extract_pdf_pages_analysis(pdf_bytes)
+        extraction_path = "vision"
+    
+    if transaction_categorizer is not None:
+        categorize_statement(statement_data)
+    
+    statement_data['extraction_path'] = extraction_path
+    return statement_data
+
+
+def extract_pdf_pages_analysis(pdf_bytes):
+    """
+    Extract rendered PDF pages in parallel (vision) and merge them into one
+    uncategorized StatementAnalysis
+    
+    Args:
+        pdf_bytes: Raw PDF upload
+        
+    Returns:
+        dict: Merged StatementAnalysis data
+    """
+    pages = render_pdf(pdf_bytes)
+    results = map_pages(
+        lambda page: extract_statement_analysis(*prepare_page(page), page=page), pages
+    )
+    
+    with metrics.span("merge_pages"):
+        return merge_page_analyses(results)
+
+
+def split_image(image_bytes):
+    """Tiles of a tall image, or an empty list (tiling disabled or image not tall)"""
+    if image_tiler is None:
+        return []
+    with metrics.span("tile_split"):
+        return image_tiler.split(image_bytes)
+
+
+def merge_tile_analyses(results):
+    """Merge per-tile StatementAnalysis extractions, dropping rows read twice in an overlap"""
+    with metrics.span("merge_tiles"):
+        transactions = merge_tile_transactions(result.get('transactions') for result in results)
+        return merge_page_analyses(results, transactions)
+
+
+def extract_tiled_analysis(tiles):
+    """
+    Extract a tall image tile by tile (in parallel) into one categorized StatementAnalysis
+    
+    Args:
+        tiles: ImageTiles top to bottom
+        
+    Returns:
+        dict: Extracted StatementAnalysis data
+    """
+    results = map_pages(
+        lambda tile: extract_statement_analysis(*prepare_page(tile), page=tile), tiles
+    )
+    statement_data = merge_tile_analyses(results)
+    
+    if transaction_categorizer is not None:
+        categorize_statement(statement_data)
+    
+    return statement_data
+
+
+def upload_signature(upload_bytes):
+    """Preprocessing settings an upload depends on (part of result cache keys)"""
+    if is_pdf(upload_bytes):
+        text_path = TEXT_PROMPT_VERSION if PDF_TEXT_LAYER else "notext"
+        return f"{image_preprocessor.signature}-{pdf_rasterizer.signature}-{PAGE_PROMPT_VERSION}-{text_path}"
+    if image_tiler is not None:
+        return f"{image_preprocessor.signature}-{image_tiler.signature}-{PAGE_PROMPT_VERSION}"
+    return image_preprocessor.signature
+
+
+def run_extraction(image_bytes):
+    """
+    Extract statement data from raw image or PDF bytes, served from cache when possible
+    
+    With UNIFIED_EXTRACTION the header is read from the statement analysis, so
+    a later /api/analyze of the same upload needs no second vision pass.
+    
+    Args:
+        image_bytes: Raw uploaded image (or PDF) bytes
+        
+    Returns:
+        tuple: (extracted data, cached)
+    """
+    if UNIFIED_EXTRACTION:
+        _, statement_data, cached = run_statement_analysis(image_bytes)
+        return statement_header(statement_data), cached
+    
+    cache_key = make_cache_key(
+        image_bytes, "extract", EXTRACTION_MODEL, EXTRACT_PROMPT_VERSION, upload_signature(image_bytes)
+    )
+    
+    def compute():
+        if is_pdf(image_bytes):
+            extracted_data = extract_pdf_statement_data(image_bytes)
+        else:
+            extracted_data = dict(extract_statement_data(*prepare_image(image_bytes)), extraction_path="vision")
+        metrics.observe_extraction_path("extract", extracted_data['extraction_path'])
+        return extracted_data
+    
+    return result_cache.get_or_compute(cache_key, compute)
+
+
+def save_statement(analysis_id, statement_data):
+    """
+    Persist an extracted statement to the history store (when enabled)
+    
+    Transactions the account already has (overlapping screenshots, rows
+    carried over from the previous statement) are not stored again.
+    
+    Returns:
+        dict: New/duplicate transaction counts, or None when nothing was stored
+    """
+    if statement_store is None:
+        return None
+    
+    try:
+        with metrics.span("store_write"):
+            return statement_store.save_analysis(analysis_id, statement_data)
+    except sqlite3.Error as e:
+        # History is best-effort - never fail the analysis over it
+        app.logger.warning("Could not store statement %s: %s", analysis_id, e)
+        return None
+
+
+def with_ingestion(statement_data, ingestion):
+    """
+    The statement data to return for a request, with its ingestion counts
+    
+    The counts describe the request that stored the statement, so they are
+    never part of the cached value: cache hits (and coalesced followers)
+    stored nothing and report no ingestion.
+    """
+    if ingestion is None:
+        return statement_data
+    return dict(statement_data, ingestion=ingestion)
+
+
+def run_statement_analysis(image_bytes):
+    """
+    Extract the StatementAnalysis from raw image or PDF bytes, served from cache when possible
+    
+    Args:
+        image_bytes: Raw uploaded image (or PDF) bytes
+        
+    Returns:
+        tuple: (analysis_id, statement data, cached) - the analysis id is the
+               cache key and is accepted by /api/replan
+    """
+    analysis_id = make_cache_key(
+        image_bytes, "analyze", EXTRACTION_MODEL, ANALYZE_PROMPT_VERSION, upload_signature(image_bytes),
+        CATEGORIZER_SIGNATURE, EXTRACTION_SIGNATURE
+    )
+    
+    ingestion = None
+    
+    def compute():
+        nonlocal ingestion
+        tiles = [] if is_pdf(image_bytes) else split_image(image_bytes)
+        if is_pdf(image_bytes):
+            statement_data = extract_pdf_analysis(image_bytes)
+        elif tiles:
+            statement_data = dict(extract_tiled_analysis(tiles), extraction_path="vision_tiled")
+        else:
+            statement_data = dict(extract_statement_analysis(*prepare_image(image_bytes)), extraction_path="vision")
+        metrics.observe_extraction_path("analyze", statement_data['extraction_path'])
+        ingestion = save_statement(analysis_id, statement_data)
+        return statement_data
+    
+    statement_data, cached = result_cache.get_or_compute(analysis_id, compute)
+    return analysis_id, with_ingestion(statement_data, ingestion), cached
+
+
+def run_analysis(image_bytes, reduction_percentage):
+    """
+    Full analysis pipeline for raw image bytes (extraction + reduction plan)
+    
+    Args:
+        image_bytes: Raw uploaded image bytes
+        reduction_percentage: Target reduction percentage
+        
+    Returns:
+        dict: 'analysis_id', 'data' (analysis results) and 'cached'
+    """
+    analysis_id, statement_data, extraction_cached = run_statement_analysis(image_bytes)
+    analysis_results, plan_cached = get_reduction_plan(
+        analysis_id, statement_data, reduction_percentage
+    )
+    return {
+        "analysis_id": analysis_id,
+        "data": analysis_results,
+        "extraction_path": statement_data.get('extraction_path'),
+        "ingestion": statement_data.get('ingestion'),
+        "cached": extraction_cached and plan_cached
+    }
+
+
+def run_full_analysis(image_bytes, reduction_percentage):
+    """
+    Statement header, transactions and reduction plan for raw image bytes
+    
+    With UNIFIED_EXTRACTION all three come from one extraction; otherwise the
+    header is a separate (cached) extraction.
+    
+    Args:
+        image_bytes: Raw uploaded image bytes
+        reduction_percentage: Target reduction percentage
+        
+    Returns:
+        dict: 'analysis_id', 'data' (statement, transactions, analysis) and 'cached'
+    """
+    analysis_id, statement_data, extraction_cached = run_statement_analysis(image_bytes)
+    if UNIFIED_EXTRACTION:
+        header = statement_header(statement_data)
+    else:
+        header, header_cached = run_extraction(image_bytes)
+        extraction_cached = extraction_cached and header_cached
+    analysis_results, plan_cached = get_reduction_plan(
+        analysis_id, statement_data, reduction_percentage
+    )
+    return {
+        "analysis_id": analysis_id,
+        "data": {
+            "statement": header,
+            "transactions": statement_data['transactions'],
+            "analysis": analysis_results
+        },
+        "extraction_path": statement_data.get('extraction_path'),
+        "ingestion": statement_data.get('ingestion'),
+        "cached": extraction_cached and plan_cached
+    }
+
+
+def run_spooled_analysis(upload, reduction_percentage, tenant=None):
+    """
+    run_analysis over a spooled upload (background jobs read it only once they start)
+    
+    The job holds an analyze scheduler slot while it runs, queued under the
+    tenant that submitted it.
+    """
+    with scheduler_slot("analyze", tenant):
+        return run_analysis(read_spooled(upload), reduction_percentage)
+
+
+def stream_analysis(image_bytes, reduction_percentage):
+    """
+    Run the analysis pipeline, yielding each stage as soon as it completes
+    
+    Stages: extraction, category_breakdown, reduction_target, one
+    recommendation event per CategoryRecommendation (parsed while the model
+    is still streaming) and finally complete with the full result.
+    
+    Args:
+        image_bytes: Raw uploaded image bytes
+        reduction_percentage: Target reduction percentage
+        
+    Yields:
+        tuple: (event name, JSON-serializable payload)
+    """
+    # Step 1: Vision extraction (cached per image)
+    analysis_id, statement_data, extraction_cached = run_statement_analysis(image_bytes)
+    yield "extraction", {
+        "analysis_id": analysis_id,
+        "statement_summary": {
+            "total_debits": statement_data['total_debits'],
+            "total_credits": statement_data['total_credits'],
+            "closing_balance": statement_data['closing_balance']
+        },
+        "transaction_count": len(statement_data['transactions']),
+        "extraction_path": statement_data.get('extraction_path'),
+        "ingestion": statement_data.get('ingestion'),
+        "cached": extraction_cached
+    }
+    
+    # Steps 2-3: Local aggregation
+    with metrics.span("aggregate"):
+        breakdown = compute_spending_breakdown(statement_data, reduction_percentage)
+    preview = assemble_analysis(
+        statement_data, breakdown, {"recommendations": [], "total_savings": None}
+    )
+    yield "category_breakdown", preview['category_breakdown']
+    yield "reduction_target", preview['reduction_target']
+    
+    # Step 4: Recommendations - replay from cache, re-scale a similar profile's,
+    # or stream from the model
+    plan_key = reduction_plan_key(analysis_id, reduction_percentage)
+    analysis_results = result_cache.get(plan_key)
+    recommendations = cached_recommendations(breakdown) if analysis_results is None else None
+    
+    if analysis_results is not None:
+        for recommendation in analysis_results['recommendations']:
+            yield "recommendation", recommendation
+    elif recommendations is not None:
+        for recommendation in recommendations['recommendations']:
+            yield "recommendation", recommendation
+        analysis_results = assemble_analysis(statement_data, breakdown, recommendations)
+        result_cache.set(plan_key, analysis_results)
+    else:
+        stream_parser = RecommendationStreamParser()
+        response = None
+        messages = [HumanMessage(content=build_recommendation_prompt(breakdown))]
+        
+        # Includes time spent by the client consuming events - negligible next to the model
+        start = time.perf_counter()
+        options = structured_options(ReductionRecommendations)
+        for chunk in model_gateway.stream(lambda: get_llm("recommend").stream(messages, **options)):
+            response = chunk if response is None else response + chunk
+            for recommendation in stream_parser.feed(chunk.content):
+                yield "recommendation", recommendation
+        metrics.observe_stage("recommend_call", time.perf_counter() - start)
+        metrics.observe_model_call("recommend", messages, response)
+        
+        recommendations = parse_or_repair(
+            "recommend", ReductionRecommendations, response.content, parse_recommendations, "recommend_parse"
+        )
+        store_recommendations(breakdown, recommendations)
+        analysis_results = assemble_analysis(statement_data, breakdown, recommendations)
+        result_cache.set(plan_key, analysis_results)
+    
+    yield "complete", {"analysis_id": analysis_id, "data": analysis_results}
+
+
+def extract_batch_item(item):
+    """
+    Extract one file of a batch, turning any failure into an error result
+    
+    Args:
+        item: dict with 'index', 'filename', 'upload' (spooled file), 'error'
+              and 'tenant' (scheduler tenant of the batch request)
+        
+    Returns:
+        dict: Per-file result
+    """
+    result = {"index": item['index'], "filename": item['filename']}
+    
+    if item['error']:
+        result.update({"status": "error", "message": item['error']})
+        return result
+    
+    try:
+        # Every file waits for its own extract slot, like a single /api/extract
+        with scheduler_slot("extract", item['tenant']):
+            extracted_data, cached = run_extraction(read_spooled(item['upload']))
+        result.update({"status": "success", "data": extracted_data, "cached": cached})
+    except GatewayError as e:
+        result.update({"status": "error", "message": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        result.update({"status": "error", "message": f"An error occurred: {str(e)}"})
+    
+    return result
+
+
+def iter_batch_results(items, concurrency):
+    """
+    Run extract_batch_item over a batch with bounded parallelism
+    
+    Args:
+        items: Batch items (see extract_batch_item)
+        concurrency: Maximum number of extractions in flight
+        
+    Yields:
+        dict: Per-file results in completion order
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Run each item in a copy of the caller's context so its stages land in the request trace
+        futures = [
+            pool.submit(contextvars.copy_context().run, extract_batch_item, item)
+            for item in items
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def reduction_plan_key(analysis_id, reduction_percentage):
+    """Cache key of the reduction plan for an extracted statement and target"""
+    return make_cache_key(
+        analysis_id.encode('utf-8'), "plan", TEXT_MODEL, RECOMMEND_PROMPT_VERSION, reduction_percentage
+    )
+
+
+def get_reduction_plan(analysis_id, statement_data, reduction_percentage):
+    """
+    Return the (cached) reduction plan for an extracted statement
+    
+    Args:
+        analysis_id: Cache key of the extracted StatementAnalysis
+        statement_data: Extracted StatementAnalysis data
+        reduction_percentage: Target reduction percentage
+        
+    Returns:
+        tuple: (analysis results, cached)
+    """
+    plan_key = reduction_plan_key(analysis_id, reduction_percentage)
+    return result_cache.get_or_compute(
+        plan_key,
+        lambda: plan_reduction(statement_data, reduction_percentage)
+    )
+
+
+# ============================================================================
+# ASYNC HELPER FUNCTIONS
+# ============================================================================
+# Same pipeline as above built on llm.ainvoke, used by the ASGI server (asgi.py)
+# so a single process can keep many model round trips in flight.
+
+async def ainvoke_model(call, messages, **options):
+    """Async variant of invoke_model"""
+    async def send():
+        with metrics.span(f"{call}_call"):
+            return await get_llm(call).ainvoke(messages, **options)
+    
+    response = await model_gateway.acall(send)
+    metrics.observe_model_call(call, messages, response)
+    return response
+
+
+async def aparse_or_repair(call, schema, text, parse, stage):
+    """Async variant of parse_or_repair"""
+    try:
+        with metrics.span(stage):
+            result = parse_reply(schema, text, parse)
+    except OutputParserException as error:
+        if not STRUCTURED_OUTPUT:
+            metrics.observe_parse(call, "failed")
+            raise
+        
+        repair_messages = [HumanMessage(content=build_repair_prompt(schema, text, error))]
+        response = await ainvoke_model(f"{call}_repair", repair_messages, **structured_options(schema))
+        try:
+            with metrics.span(stage):
+                result = validate_output(schema, response.content)
+        except OutputParserException:
+            metrics.observe_parse(call, "failed")
+            raise
+        metrics.observe_parse(call, "repaired")
+        return result
+    
+    metrics.observe_parse(call, "ok")
+    return result
+
+
+async def ainvoke_structured(call, messages, schema, parse, stage=None):
+    """Async variant of invoke_structured"""
+    response = await ainvoke_model(call, messages, **structured_options(schema))
+    return await aparse_or_repair(call, schema, response.content, parse, stage or f"{call}_parse")
+
+
+async def aextract_statement_data(base64_image, mime_type="image/png", page=None):
+    """Async variant of extract_statement_data"""
+    parser, messages = build_statement_messages(base64_image, mime_type, page)
+    response = await ainvoke_model("extract", messages)
+    with metrics.span("extract_parse"):
+        return parser.parse(response.content)
+
+
+async def aextract_statement_analysis(base64_image, mime_type="image/png", page=None):
+    """Async variant of extract_statement_analysis"""
+    parser, messages = build_analysis_messages(
+        base64_image, mime_type, include_categories=transaction_categorizer is None, page=page
+    )
+    statement_data = await ainvoke_structured("analyze", messages, parser.pydantic_object, parser.parse)
+    
+    if transaction_categorizer is not None and page is None:
+        await acategorize_statement(statement_data)
+    
+    return statement_data
+
+
+async def acategorize_statement(statement_data):
+    """Async variant of categorize_statement"""
+    await acategorize_transactions(await asyncio.to_thread(known_transactions_categorized, statement_data))
+
+
+async def acategorize_transactions(transactions):
+    """Async variant of categorize_transactions"""
+    if not transactions:
+        return
+    
+    with metrics.span("categorize_local"):
+        unmatched = transaction_categorizer.apply(transactions)
+    if not unmatched:
+        return
+    
+    start = time.perf_counter()
+    prompt = build_categorization_prompt([txn['description'] for txn in unmatched])
+    response = await ainvoke_model("categorize", [HumanMessage(content=prompt)])
+    apply_model_categories(unmatched, response.content)
+    transaction_categorizer.record_model_fallback(len(unmatched), time.perf_counter() - start)
+
+
+async def arecommend_reductions(breakdown):
+    """Async variant of recommend_reductions"""
+    recommendations = cached_recommendations(breakdown)
+    if recommendations is None:
+        recommendation_prompt = build_recommendation_prompt(breakdown)
+        recommendations = await ainvoke_structured(
+            "recommend", [HumanMessage(content=recommendation_prompt)],
+            ReductionRecommendations, parse_recommendations
+        )
+        store_recommendations(breakdown, recommendations)
+    return recommendations
+
+
+async def aplan_reduction(statement_data, reduction_percentage):
+    """Async variant of plan_reduction"""
+    with metrics.span("aggregate"):
+        breakdown = compute_spending_breakdown(statement_data, reduction_percentage)
+    
+    recommendations = await arecommend_reductions(breakdown)
+    
+    return assemble_analysis(statement_data, breakdown, recommendations)
+
+
+async def aanalyze_spending(base64_image, reduction_percentage, mime_type="image/png"):
+    """Async variant of analyze_spending"""
+    statement_data = await aextract_statement_analysis(base64_image, mime_type)
+    return await aplan_reduction(statement_data, reduction_percentage)
+
+
+async def amap_pages(func, pages):
+    """Async variant of map_pages"""
+    semaphore = asyncio.Semaphore(PDF_PAGE_CONCURRENCY)
+    
+    async def run(page):
+        async with semaphore:
+            return await func(page)
+    
+    return await asyncio.gather(*(run(page) for page in pages))
+
+
+async def aextract_statement_text_data(statement_text):
+    """Async variant of extract_statement_text_data"""
+    parser = json_output_parser(CreditCardStatement)
+    prompt = build_statement_prompt("text")
+    messages = [HumanMessage(content=f"{prompt}\nStatement text:\n{statement_text}\n")]
+    response = await ainvoke_model("extract_text", messages)
+    with metrics.span("extract_parse"):
+        return parser.parse(response.content)
+
+
+async def aextract_statement_text_analysis(statement_text):
+    """Async variant of extract_statement_text_analysis"""
+    parser, prompt = build_analysis_prompt(transaction_categorizer is None, "text")
+    messages = [HumanMessage(content=f"{prompt}\nStatement text:\n{statement_text}\n")]
+    return await ainvoke_structured(
+        "analyze_text", messages, parser.pydantic_object, parser.parse, stage="analyze_parse"
+    )
+
+
+async def atry_text_extraction(extract, is_complete):
+    """Async variant of try_text_extraction"""
+    try:
+        extracted_data = await extract()
+    except OutputParserException:
+        return None
+    return extracted_data if isinstance(extracted_data, dict) and is_complete(extracted_data) else None
+
+
+async def aread_text_header(statement_text):
+    """Async variant of read_text_header"""
+    with metrics.span("text_parse"):
+        header = parse_statement_header(statement_text)
+    if header is None:
+        header = await atry_text_extraction(
+            lambda: aextract_statement_text_data(statement_text),
+            lambda data: not missing_header_fields(data)
+        )
+    return header or {}
+
+
+async def aextract_pdf_statement_data(pdf_bytes):
+    """Async variant of extract_pdf_statement_data"""
+    statement_text = await asyncio.to_thread(read_pdf_text, pdf_bytes)
+    if statement_text:
+        with metrics.span("text_parse"):
+            extracted_data = parse_statement_header(statement_text)
+        if extracted_data is not None:
+            return dict(extracted_data, extraction_path="text_parse")
+        
+        extracted_data = await atry_text_extraction(
+            lambda: aextract_statement_text_data(statement_text),
+            lambda data: not missing_header_fields(data)
+        )
+        if extracted_data is not None:
+            return dict(extracted_data, extraction_path="text_model")
+    
+    return dict(await aextract_pdf_pages_statement_data(pdf_bytes), extraction_path="vision")
+
+
+async def aextract_pdf_pages_statement_data(pdf_bytes):
+    """Async variant of extract_pdf_pages_statement_data"""
+    pages = await asyncio.to_thread(render_pdf, pdf_bytes)
+    
+    async def extract_page(page):
+        base64_image, mime_type = await asyncio.to_thread(prepare_page, page)
+        return await aextract_statement_data(base64_image, mime_type, page=page)
+    
+    extracted_data = await extract_page(pages[0])
+    missing = missing_header_fields(extracted_data)
+    if missing and len(pages) > 1:
+        results = await amap_pages(extract_page, pages[1:])
+        for field in missing:
+            extracted_data[field] = first_value(results, field)
+    
+    return extracted_data
+
+
+async def aextract_pdf_analysis(pdf_bytes):
+    """Async variant of extract_pdf_analysis"""
+    statement_data, extraction_path = None, "vision"
+    
+    statement_text = await asyncio.to_thread(read_pdf_text, pdf_bytes)
+    if statement_text:
+        if transaction_categorizer is not None:
+            with metrics.span("text_parse"):
+                statement_data = parse_statement_analysis(statement_text)
+            extraction_path = "text_parse"
+        if statement_data is not None and UNIFIED_EXTRACTION:
+            fill_statement_header(statement_data, await aread_text_header(statement_text))
+        if statement_data is None:
+            statement_data = await atry_text_extraction(
+                lambda: aextract_statement_text_analysis(statement_text), is_usable_analysis
+            )
+            extraction_path = "text_model"
+    
+    if statement_data is None:
+        statement_data = await aextract_pdf_pages_analysis(pdf_bytes)
+        extraction_path = "vision"
+    
+    if transaction_categorizer is not None:
+        await acategorize_statement(statement_data)
+    
+    statement_data['extraction_path'] = extraction_path
+    return statement_data
+
+
+async def aextract_pdf_pages_analysis(pdf_bytes):
+    """Async variant of extract_pdf_pages_analysis"""
+    pages = await asyncio.to_thread(render_pdf, pdf_bytes)
+    
+    async def extract_page(page):
+        base64_image, mime_type = await asyncio.to_thread(prepare_page, page)
+        return await aextract_statement_analysis(base64_image, mime_type, page=page)
+    
+    results = await amap_pages(extract_page, pages)
+    with metrics.span("merge_pages"):
+        return merge_page_analyses(results)
+
+
+async def aextract_tiled_analysis(tiles):
+    """Async variant of extract_tiled_analysis"""
+    async def extract_tile(tile):
+        base64_image, mime_type = await asyncio.to_thread(prepare_page, tile)
+        return await aextract_statement_analysis(base64_image, mime_type, page=tile)
+    
+    results = await amap_pages(extract_tile, tiles)
+    statement_data = merge_tile_analyses(results)
+    
+    if transaction_categorizer is not None:
+        await acategorize_statement(statement_data)
+    
+    return statement_data
+
+
+async def arun_extraction(image_bytes):
+    """Async variant of run_extraction"""
+    if UNIFIED_EXTRACTION:
+        _, statement_data, cached = await arun_statement_analysis(image_bytes)
+        return statement_header(statement_data), cached
+    
+    cache_key = make_cache_key(
+        image_bytes, "extract", EXTRACTION_MODEL, EXTRACT_PROMPT_VERSION, upload_signature(image_bytes)
+    )
+    
+    async def compute():
+        if is_pdf(image_bytes):
+            extracted_data = await aextract_pdf_statement_data(image_bytes)
+        else:
+            # Image decoding/re-encoding is CPU-bound - keep it off the event loop
+            base64_image, mime_type = await asyncio.to_thread(prepare_image, image_bytes)
+            extracted_data = dict(await aextract_statement_data(base64_image, mime_type), extraction_path="vision")
+        metrics.observe_extraction_path("extract", extracted_data['extraction_path'])
+        return extracted_data
+    
+    return await result_cache.aget_or_compute(cache_key, compute)
+
+
+async def arun_statement_analysis(image_bytes):
+    """Async variant of run_statement_analysis"""
+    analysis_id = make_cache_key(
+        image_bytes, "analyze", EXTRACTION_MODEL, ANALYZE_PROMPT_VERSION, upload_signature(image_bytes),
+        CATEGORIZER_SIGNATURE, EXTRACTION_SIGNATURE
+    )
+    
+    ingestion = None
+    
+    async def compute():
+        nonlocal ingestion
+        tiles = [] if is_pdf(image_bytes) else await asyncio.to_thread(split_image, image_bytes)
+        if is_pdf(image_bytes):
+            statement_data = await aextract_pdf_analysis(image_bytes)
+        elif tiles:
+            statement_data = dict(await aextract_tiled_analysis(tiles), extraction_path="vision_tiled")
+        else:
+            base64_image, mime_type = await asyncio.to_thread(prepare_image, image_bytes)
+            statement_data = dict(await aextract_statement_analysis(base64_image, mime_type), extraction_path="vision")
+        metrics.observe_extraction_path("analyze", statement_data['extraction_path'])
+        ingestion = await asyncio.to_thread(save_statement, analysis_id, statement_data)
+        return statement_data
+    
+    statement_data, cached = await result_cache.aget_or_compute(analysis_id, compute)
+    return analysis_id, with_ingestion(statement_data, ingestion), cached
+
+
+async def arun_full_analysis(image_bytes, reduction_percentage):
+    """Async variant of run_full_analysis"""
+    analysis_id, statement_data, extraction_cached = await arun_statement_analysis(image_bytes)
+    if UNIFIED_EXTRACTION:
+        header = statement_header(statement_data)
+    else:
+        header, header_cached = await arun_extraction(image_bytes)
+        extraction_cached = extraction_cached and header_cached
+    analysis_results, plan_cached = await aget_reduction_plan(
+        analysis_id, statement_data, reduction_percentage
+    )
+    return {
+        "analysis_id": analysis_id,
+        "data": {
+            "statement": header,
+            "transactions": statement_data['transactions'],
+            "analysis": analysis_results
+        },
+        "extraction_path": statement_data.get('extraction_path'),
+        "ingestion": statement_data.get('ingestion'),
+        "cached": extraction_cached and plan_cached
+    }
+
+
+async def aget_reduction_plan(analysis_id, statement_data, reduction_percentage):
+    """Async variant of get_reduction_plan"""
+    plan_key = reduction_plan_key(analysis_id, reduction_percentage)
+    return await result_cache.aget_or_compute(
+        plan_key,
+        lambda: aplan_reduction(statement_data, reduction_percentage)
+    )
+
+
+# ============================================================================
+# REQUEST TRACING
+# ============================================================================
+
+@api.before_app_request
+def start_request_trace():
+    """Attribute pipeline stage timings to the current request"""
+    # Label by view name ('api.extract_statement' -> 'extract_statement'), as the ASGI server does
+    g.trace = metrics.start_request(request.endpoint.rsplit('.', 1)[-1] if request.endpoint else "unmatched")
+
+
+@api.after_app_request
+def finish_request_trace(response):
+    """Record request latency (streaming responses finish their own trace)"""
+    trace = g.pop('trace', None)
+    if trace is not None and not trace.deferred:
+        metrics.finish_request(trace, response.status_code)
+    metrics.detach()
+    return response
+
+
+@api.before_app_request
+def parse_upload():
+    """
+    Parse multipart uploads before the view runs
+    
+    Bodies over MAX_REQUEST_MB are rejected here (413) without being read,
+    instead of failing inside the view's own error handling. File parts are
+    spooled to disk by werkzeug, never held in memory whole.
+    """
+    max_length = current_app.config['MAX_CONTENT_LENGTH']
+    if max_length and request.content_length and request.content_length > max_length:
+        abort(413)
+    if request.mimetype == 'multipart/form-data':
+        request.files
+
+
+# ============================================================================
+# API ENDPOINTS
+# ============================================================================
+
+@api.route('/')
+def home():
+    """Health check endpoint"""
+    return jsonify({
+        "status": "success",
+        "message": "Credit Card Analysis API is running",
+        "version": "1.0.0",
+        "endpoints": {
+            "extract": "/api/extract",
+            "extract_batch": "/api/extract/batch",
+            "analyze": "/api/analyze",
+            "analyze_full": "/api/analyze/full",
+            "analyze_stream": "/api/analyze/stream",
+            "analyze_jobs": "/api/analyze/jobs",
+            "job_status": "/api/jobs/<job_id>",
+            "replan": "/api/replan",
+            "cache_stats": "/api/cache/stats",
+            "categorizer_stats": "/api/categorizer/stats",
+            "metrics": "/metrics",
+            "gateway_stats": "/api/gateway/stats",
+            "scheduler_stats": "/api/scheduler/stats",
+            "statements": "/api/statements",
+            "statement": "/api/statements/<analysis_id>",
+            "transactions": "/api/transactions",
+            "trends": "/api/trends",
+            "spending_totals": "/api/spending/totals"
+        }
+    })
+
+
+@api.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    Report result cache and recommendation cache hit/miss counters
+    
+    Returns: JSON with cache counters and tier sizes
+    """
+    return jsonify({
+        "status": "success",
+        "data": dict(
+            result_cache.stats(),
+            recommendations=recommendation_cache.stats() if recommendation_cache is not None else None
+        )
+    }), 200
+
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Expose request, stage and model-usage histograms for Prometheus
+    
+    Returns: Prometheus text exposition format
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@api.route('/api/gateway/stats', methods=['GET'])
+def gateway_stats():
+    """
+    Report model gateway limiter, retry and circuit breaker state
+    
+    Returns: JSON with in-flight/waiting calls, queue wait, retries and breaker state
+    """
+    return jsonify({
+        "status": "success",
+        "data": model_gateway.stats()
+    }), 200
+
+
+@api.route('/api/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    """
+    Report request scheduler slots, queues and queue wait per workload class
+    
+    Returns: JSON with active/queued requests and admission counters
+    """
+    if request_scheduler is None:
+        return jsonify({
+            "status": "error",
+            "message": "Request scheduler is disabled (REQUEST_SCHEDULER=false)"
+        }), 404
+    
+    return jsonify({
+        "status": "success",
+        "data": request_scheduler.stats()
+    }), 200
+
 
-@app.route('/')
-def home():
-    """Health check endpoint"""
+@api.route('/api/categorizer/stats', methods=['GET'])
+def categorizer_stats():
+    """
+    Report how many transactions the local categorizer resolved without the model
+    
+    Returns: JSON with local-resolution share and latency figures
+    """
+    if transaction_categorizer is None:
+        return jsonify({
+            "status": "error",
+            "message": "Local categorizer is disabled (LOCAL_CATEGORIZER=false)"
+        }), 404
+    
     return jsonify({
         "status": "success",
-        "message": "Credit Card Analysis API is running",
-        "version": "1.0.0",
-        "endpoints": {
-            "extract": "/api/extract",
-            "analyze": "/api/analyze (Coming in Phase 2)"
-        }
-    })
+        "data": transaction_categorizer.stats()
+    }), 200
 
 
-@app.route('/api/extract', methods=['POST'])
+@api.route('/api/extract', methods=['POST'])
 def extract_statement():
     """
     Extract credit card statement data from uploaded image
@@ -322,43 +2474,117 @@ def extract_statement():
     """
     try:
         # Validate request
-        if 'image' not in request.files:
+        image_file, error = validate_image_upload(request.files)
+        if error:
             return jsonify({
                 "status": "error",
-                "message": "No image file provided"
+                "message": error
             }), 400
         
-        image_file = request.files['image']
+        # Read image and extract data using AI (only on a cache miss)
+        image_bytes = read_upload(image_file)
+        with request_slot("extract", request.headers):
+            extracted_data, cached = run_extraction(image_bytes)
+        
+        # Return success response
+        return jsonify({
+            "status": "success",
+            "message": "Statement data extracted successfully",
+            "data": extracted_data,
+            "cached": cached
+        }), 200
+        
+    except PdfError as e:
+        # Unreadable or oversized PDF upload
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
         
-        # Validate file
-        if image_file.filename == '':
+    except GatewayError as e:
+        # Upstream rate limited/unavailable - tell the client when to retry
+        return gateway_error_response(e)
+        
+    except Exception as e:
+        # Handle errors
+        return jsonify({
+            "status": "error",
+            "message": f"An error occurred: {str(e)}"
+        }), 500
+
+
+@api.route('/api/extract/batch', methods=['POST'])
+def extract_statement_batch():
+    """
+    Extract statement data from many uploaded images in one request
+    
+    Files are processed in parallel (bounded by BATCH_CONCURRENCY, or the
+    optional 'concurrency' form field up to that limit). A failing file only
+    marks its own result as an error.
+    
+    Expected: multipart/form-data with one or more 'images' files;
+              add ?stream=1 to receive NDJSON lines as each file finishes
+    Returns: JSON with per-file results (in upload order)
+    """
+    try:
+        # Validate request
+        image_files = request.files.getlist('images')
+        if not image_files:
             return jsonify({
                 "status": "error",
-                "message": "No file selected"
+                "message": "No image files provided"
             }), 400
         
-        # Check file extension
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'webp'}
-        file_ext = image_file.filename.rsplit('.', 1)[1].lower() if '.' in image_file.filename else ''
+        if len(image_files) > BATCH_MAX_FILES:
+            return jsonify({
+                "status": "error",
+                "message": f"Too many files. Maximum per batch: {BATCH_MAX_FILES}"
+            }), 400
         
-        if file_ext not in allowed_extensions:
+        try:
+            concurrency = int(request.form.get('concurrency', BATCH_CONCURRENCY))
+        except ValueError:
             return jsonify({
                 "status": "error",
-                "message": f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+                "message": "Concurrency must be an integer"
             }), 400
+        concurrency = max(1, min(concurrency, BATCH_CONCURRENCY))
         
-        # Read and encode image
-        image_bytes = image_file.read()
-        base64_image = encode_image(image_bytes)
+        # Spool every upload up front - the request stream is gone once streaming
+        # starts; each file is only read into memory when its worker picks it up
+        tenant = request_tenant(request.headers)
+        items = []
+        for index, image_file in enumerate(image_files):
+            error = validate_image_file(image_file)
+            items.append({
+                "index": index,
+                "filename": image_file.filename,
+                "upload": None if error else spool_upload(image_file),
+                "error": error,
+                "tenant": tenant
+            })
         
-        # Extract data using AI
-        extracted_data = extract_statement_data(base64_image)
+        results = iter_batch_results(items, concurrency)
+        
+        # Stream one JSON line per finished file
+        if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+            return Response(
+                (json.dumps(result) + "\n" for result in results),
+                mimetype='application/x-ndjson'
+            )
+        
+        ordered = sorted(results, key=lambda result: result['index'])
+        failed = sum(1 for result in ordered if result['status'] == 'error')
         
         # Return success response
         return jsonify({
             "status": "success",
-            "message": "Statement data extracted successfully",
-            "data": extracted_data
+            "message": f"Processed {len(ordered)} statements ({failed} failed)",
+            "data": {
+                "results": ordered,
+                "succeeded": len(ordered) - failed,
+                "failed": failed
+            }
         }), 200
         
     except Exception as e:
@@ -369,7 +2595,7 @@ def extract_statement():
         }), 500
 
 
-@app.route('/api/analyze', methods=['POST'])
+@api.route('/api/analyze', methods=['POST'])
 def analyze_statement():
     """
     Analyze credit card spending and provide reduction recommendations
@@ -379,59 +2605,450 @@ def analyze_statement():
     """
     try:
         # Validate request
-        if 'image' not in request.files:
+        image_file, error = validate_image_upload(request.files)
+        if error:
+            return jsonify({
+                "status": "error",
+                "message": error
+            }), 400
+        
+        reduction_percentage, error = parse_reduction_percentage(request.form)
+        if error:
+            return jsonify({
+                "status": "error",
+                "message": error
+            }), 400
+        
+        # Read image, extract statement data (only on a cache miss) and plan reductions
+        image_bytes = read_upload(image_file)
+        with request_slot("analyze", request.headers):
+            analysis = run_analysis(image_bytes, reduction_percentage)
+        
+        # Return success response
+        return jsonify({
+            "status": "success",
+            "message": "Spending analysis completed successfully",
+            **analysis
+        }), 200
+        
+    except PdfError as e:
+        # Unreadable or oversized PDF upload
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+        
+    except GatewayError as e:
+        # Upstream rate limited/unavailable - tell the client when to retry
+        return gateway_error_response(e)
+        
+    except Exception as e:
+        # Handle errors
+        return jsonify({
+            "status": "error",
+            "message": f"An error occurred: {str(e)}"
+        }), 500
+
+
+@api.route('/api/analyze/full', methods=['POST'])
+def analyze_statement_full():
+    """
+    Extract the statement header and transactions and analyze spending in one request
+    
+    Expected: multipart/form-data with 'image' file and 'reduction_percentage' field
+    Returns: JSON with the statement header, transactions and spending analysis
+    """
+    try:
+        # Validate request
+        image_file, error = validate_image_upload(request.files)
+        if error:
             return jsonify({
                 "status": "error",
-                "message": "No image file provided"
+                "message": error
             }), 400
         
-        if 'reduction_percentage' not in request.form:
+        reduction_percentage, error = parse_reduction_percentage(request.form)
+        if error:
             return jsonify({
                 "status": "error",
-                "message": "No reduction percentage provided"
+                "message": error
             }), 400
         
-        image_file = request.files['image']
-        reduction_percentage = float(request.form['reduction_percentage'])
+        # One extraction (only on a cache miss) serves the header, transactions and plan
+        image_bytes = read_upload(image_file)
+        with request_slot("analyze", request.headers):
+            analysis = run_full_analysis(image_bytes, reduction_percentage)
+        
+        # Return success response
+        return jsonify({
+            "status": "success",
+            "message": "Statement extracted and analyzed successfully",
+            **analysis
+        }), 200
+        
+    except PdfError as e:
+        # Unreadable or oversized PDF upload
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+        
+    except GatewayError as e:
+        # Upstream rate limited/unavailable - tell the client when to retry
+        return gateway_error_response(e)
+        
+    except Exception as e:
+        # Handle errors
+        return jsonify({
+            "status": "error",
+            "message": f"An error occurred: {str(e)}"
+        }), 500
+
+
+@api.route('/api/analyze/stream', methods=['POST'])
+def stream_analyze_statement():
+    """
+    Analyze spending and stream each stage as a server-sent event
+    
+    Expected: multipart/form-data with 'image' file and 'reduction_percentage' field
+    Returns: text/event-stream with extraction, category_breakdown,
+             reduction_target, recommendation (repeated), complete or error events
+    """
+    # Validate request
+    image_file, error = validate_image_upload(request.files)
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 400
+    
+    reduction_percentage, error = parse_reduction_percentage(request.form)
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 400
+    
+    # Spool the upload now - the request stream is gone once the response starts
+    upload = spool_upload(image_file)
+    # The slot is taken when the body starts streaming, outside the request context
+    slot = request_slot("analyze", request.headers)
+    
+    def generate():
+        try:
+            image_bytes = read_spooled(upload)
+            with slot:
+                for event, data in stream_analysis(image_bytes, reduction_percentage):
+                    yield format_sse(event, data)
+        except GatewayError as e:
+            yield format_sse("error", {"message": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield format_sse("error", {"message": f"An error occurred: {str(e)}"})
+    
+    # Keep the request trace open until the last event has been sent
+    g.trace.deferred = True
+    
+    return Response(
+        metrics.traced_stream(g.trace, 200, generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@api.route('/api/analyze/jobs', methods=['POST'])
+def submit_analysis_job():
+    """
+    Queue a spending analysis and return immediately
+    
+    Expected: multipart/form-data with 'image' file and 'reduction_percentage' field
+    Returns: 202 with a job id to poll at /api/jobs/<job_id>,
+             or 429 when the job queue is full
+    """
+    try:
+        # Validate request
+        image_file, error = validate_image_upload(request.files)
+        if error:
+            return jsonify({
+                "status": "error",
+                "message": error
+            }), 400
         
-        # Validate file
-        if image_file.filename == '':
+        reduction_percentage, error = parse_reduction_percentage(request.form)
+        if error:
             return jsonify({
                 "status": "error",
-                "message": "No file selected"
+                "message": error
             }), 400
         
-        # Validate reduction percentage
-        if reduction_percentage <= 0 or reduction_percentage > 100:
+        # Queue the analysis; the upload waits in a spooled file until a worker reads it
+        upload = spool_upload(image_file)
+        try:
+            job_id = job_queue.submit(
+                run_spooled_analysis, upload, reduction_percentage, request_tenant(request.headers)
+            )
+        except QueueFullError as e:
+            upload.close()
+            response = jsonify({
+                "status": "error",
+                "message": f"Server is busy: {str(e)}. Please retry shortly."
+            })
+            response.headers['Retry-After'] = str(JOB_RETRY_AFTER_SECONDS)
+            return response, 429
+        
+        # Return accepted response
+        return jsonify({
+            "status": "success",
+            "message": "Spending analysis queued",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}"
+        }), 202
+        
+    except Exception as e:
+        # Handle errors
+        return jsonify({
+            "status": "error",
+            "message": f"An error occurred: {str(e)}"
+        }), 500
+
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Report the state of a background analysis job
+    
+    Returns: JSON with the job state (queued, running, succeeded, failed)
+             and, once finished, its result or error
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": "Job not found or expired"
+        }), 404
+    
+    return jsonify({
+        "status": "success",
+        "data": job
+    }), 200
+
+
+@api.route('/api/statements', methods=['GET'])
+def list_statements():
+    """
+    List stored statements, newest first
+    
+    Query: account, from, to (YYYY-MM-DD statement dates), limit, offset
+    Returns: JSON with a page of statements and the total count
+    """
+    if statement_store is None:
+        return jsonify({
+            "status": "error",
+            "message": "Statement history is disabled (STATEMENT_DB is empty)"
+        }), 404
+    
+    filters, error = parse_history_filters(request.args)
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 400
+    
+    return jsonify({
+        "status": "success",
+        "data": statement_store.list_statements(**filters)
+    }), 200
+
+
+@api.route('/api/statements/<analysis_id>', methods=['GET'])
+def get_statement(analysis_id):
+    """
+    Return one stored statement with its transactions
+    
+    Returns: JSON with the statement summary and transactions
+    """
+    statement = statement_store.get_statement(analysis_id) if statement_store else None
+    if statement is None:
+        return jsonify({
+            "status": "error",
+            "message": "Statement not found"
+        }), 404
+    
+    return jsonify({
+        "status": "success",
+        "data": statement
+    }), 200
+
+
+@api.route('/api/transactions', methods=['GET'])
+def query_transactions():
+    """
+    Query stored transactions without any model calls
+    
+    Query: account, category, from, to (YYYY-MM-DD transaction dates), limit, offset
+    Returns: JSON with a page of transactions plus count and debit/credit totals
+             over every matching transaction
+    """
+    if statement_store is None:
+        return jsonify({
+            "status": "error",
+            "message": "Statement history is disabled (STATEMENT_DB is empty)"
+        }), 404
+    
+    filters, error = parse_history_filters(request.args)
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 400
+    
+    return jsonify({
+        "status": "success",
+        "data": statement_store.query_transactions(category=request.args.get('category') or None, **filters)
+    }), 200
+
+
+@api.route('/api/trends', methods=['GET'])
+def spending_trends():
+    """
+    Month-over-month spending trends across stored statements
+    
+    Loads the matching transactions into columnar arrays once and computes
+    category totals, monthly deltas, rolling averages and top merchants
+    with vectorized operations. No model calls are involved.
+    
+    Query: account, from, to (YYYY-MM-DD transaction dates), window (rolling
+           average months, default 3), top (number of merchants, default 10)
+    Returns: JSON trend report
+    """
+    if statement_store is None:
+        return jsonify({
+            "status": "error",
+            "message": "Statement history is disabled (STATEMENT_DB is empty)"
+        }), 404
+    
+    filters, error = parse_history_filters(request.args)
+    if error:
+        return jsonify({
+            "status": "error",
+            "message": error
+        }), 400
+    
+    options = {}
+    for name, default, maximum in (("window", 3, 24), ("top", 10, 100)):
+        try:
+            options[name] = int(request.args.get(name, default))
+        except (TypeError, ValueError):
+            return jsonify({
+                "status": "error",
+                "message": f"{name.capitalize()} must be an integer"
+            }), 400
+        if not 1 <= options[name] <= maximum:
+            return jsonify({
+                "status": "error",
+                "message": f"{name.capitalize()} must be between 1 and {maximum}"
+            }), 400
+    
+    with metrics.span("store_read"):
+        rows = statement_store.transaction_rows(
+            account=filters['account'], date_from=filters['date_from'], date_to=filters['date_to']
+        )
+    # NumPy is only needed here, so it is imported on first use (see preload_modules)
+    from analytics import TransactionFrame, trend_report
+    with metrics.span("trends"):
+        report = trend_report(TransactionFrame.from_rows(rows), **options)
+    
+    return jsonify({
+        "status": "success",
+        "data": report
+    }), 200
+
+
+@api.route('/api/spending/totals', methods=['GET'])
+def spending_totals():
+    """
+    Running per-category totals over every transaction ingested so far
+    
+    The totals are kept up to date as statements are stored, counting each
+    transaction once even when it appears on several uploads, so answering
+    reads one row per category rather than the transaction history.
+    
+    Query: account (optional; all accounts when omitted)
+    Returns: JSON with per-category debits/credits/counts and overall totals
+    """
+    if statement_store is None:
+        return jsonify({
+            "status": "error",
+            "message": "Statement history is disabled (STATEMENT_DB is empty)"
+        }), 404
+    
+    account = request.args.get('account') or None
+    return jsonify({
+        "status": "success",
+        "data": dict(statement_store.category_totals(account), account=account)
+    }), 200
+
+
+@api.route('/api/replan', methods=['POST'])
+def replan_statement():
+    """
+    Recompute recommendations for a previously analyzed statement
+    
+    Reuses the statement extracted by /api/analyze, so only the category
+    breakdown and the text-only recommendation call are re-run.
+    
+    Expected: JSON (or form data) with 'analysis_id' and 'reduction_percentage'
+    Returns: JSON with spending analysis and recommendations
+    """
+    try:
+        payload = request.get_json(silent=True) or request.form
+        if not isinstance(payload, dict):
             return jsonify({
                 "status": "error",
-                "message": "Reduction percentage must be between 1 and 100"
+                "message": "Request body must be a JSON object"
             }), 400
+        analysis_id = str(payload.get('analysis_id', ''))
         
-        # Check file extension
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'webp'}
-        file_ext = image_file.filename.rsplit('.', 1)[1].lower() if '.' in image_file.filename else ''
+        # Validate request
+        if not analysis_id:
+            return jsonify({
+                "status": "error",
+                "message": "No analysis id provided"
+            }), 400
         
-        if file_ext not in allowed_extensions:
+        reduction_percentage, error = parse_reduction_percentage(payload)
+        if error:
             return jsonify({
                 "status": "error",
-                "message": f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+                "message": error
             }), 400
         
-        # Read and encode image
-        image_bytes = image_file.read()
-        base64_image = encode_image(image_bytes)
+        # Look up the extracted statement
+        statement_data = result_cache.get(analysis_id) if is_valid_key(analysis_id) else None
+        if statement_data is None:
+            return jsonify({
+                "status": "error",
+                "message": "Analysis not found or expired. Please upload the statement again."
+            }), 404
         
-        # Analyze spending using AI
-        analysis_results = analyze_spending(base64_image, reduction_percentage)
+        # Generate recommendations for the new target
+        with request_slot("analyze", request.headers):
+            analysis_results, cached = get_reduction_plan(
+                analysis_id, statement_data, reduction_percentage
+            )
         
         # Return success response
         return jsonify({
             "status": "success",
             "message": "Spending analysis completed successfully",
-            "data": analysis_results
+            "analysis_id": analysis_id,
+            "data": analysis_results,
+            "cached": cached
         }), 200
         
+    except GatewayError as e:
+        # Upstream rate limited/unavailable - tell the client when to retry
+        return gateway_error_response(e)
+        
     except Exception as e:
         # Handle errors
         return jsonify({
@@ -444,7 +3061,7 @@ def analyze_statement():
 # ERROR HANDLERS
 # ============================================================================
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
     return jsonify({
@@ -453,7 +3070,16 @@ def not_found(error):
     }), 404
 
 
-@app.errorhandler(500)
+@api.app_errorhandler(413)
+def request_too_large(error):
+    """Handle request bodies over MAX_REQUEST_MB"""
+    return jsonify({
+        "status": "error",
+        "message": f"Request too large. Maximum request size: {MAX_REQUEST_MB:g} MB"
+    }), 413
+
+
+@api.app_errorhandler(500)
 def internal_error(error):
     """Handle 500 errors"""
     return jsonify({
@@ -462,13 +3088,69 @@ def internal_error(error):
     }), 500
 
 
+# ============================================================================
+# APP FACTORY
+# ============================================================================
+
+def create_app(config=None):
+    """
+    Build a Flask app serving the API
+    
+    Pipeline settings (model, cache, limits, ...) come from the environment and
+    are shared by every app built in this process.
+    
+    Args:
+        config: Optional Flask settings applied last (e.g. {"TESTING": True})
+        
+    Returns:
+        Flask: Configured app
+    """
+    flask_app = Flask(__name__)
+    flask_app.config['MAX_CONTENT_LENGTH'] = int(MAX_REQUEST_MB * 1024 * 1024) or None
+    if config:
+        flask_app.config.update(config)
+    
+    CORS(flask_app)  # Enable CORS for frontend communication
+    flask_app.register_blueprint(api)
+    return flask_app
+
+
+def preload_modules():
+    """
+    Import the modules otherwise loaded on first use (model SDK, output parsers, NumPy)
+    
+    A pre-fork server calls this in its master so every worker shares the
+    imported code copy-on-write instead of importing it on its first request.
+    No client or connection is created.
+    """
+    from llm_backends import backend_class
+    backend_class(LLM_BACKEND)
+    import langchain_core.output_parsers
+    import analytics
+
+
+def after_fork():
+    """Drop per-process state inherited from a pre-fork master"""
+    global llm, text_llm
+    llm = text_llm = None
+    if statement_store is not None:
+        statement_store.reset_connections()
+
+
+app = create_app()
+
+
 # ============================================================================
 # MAIN
 # ============================================================================
 
 if __name__ == '__main__':
+    PORT = int(os.getenv("PORT", "5000"))
+    
     # Check if API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if LLM_BACKEND == "stub":
+        print("🧪 Using the offline stub model (LLM_BACKEND=stub) - responses are canned")
+    elif not os.getenv("OPENAI_API_KEY"):
         print("⚠️  WARNING: OPENAI_API_KEY not found in environment variables!")
         print("Please create a .env file with your OpenAI API key.")
         print("See .env.example for reference.")
@@ -479,8 +3161,8 @@ if __name__ == '__main__':
     print("🚀 Credit Card Analysis API Server")
     print("="*60)
     print("Phase 1: Statement Data Extraction")
-    print("Server running on: http://localhost:5000")
+    print(f"Server running on: http://localhost:{PORT}")
     print("="*60 + "\n")
     
-    # Run Flask app
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Run the Flask development server (use gunicorn.conf.py in production)
+    app.run(debug=env_flag("FLASK_DEBUG", True), host=os.getenv("HOST", "0.0.0.0"), port=PORT)
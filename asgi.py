@@ -0,0 +1,297 @@
+"""
+Credit Card Analysis Web Application - ASGI entry point
+
+Serves the model-bound endpoints (/api/extract, /api/analyze,
+/api/analyze/full, /api/replan) natively on asyncio using llm.ainvoke, so a single process can hold hundreds
+of in-flight statement requests instead of pinning one worker per model round
+trip. They queue for the same request scheduler slots as the Flask views.
+Every other route is delegated to the Flask app through asgiref.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+
+import json
+import tempfile
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.wrappers import Request
+
+import app as backend
+from cache import is_valid_key
+from gateway import GatewayError
+from pdf_pages import PdfError
+
+
+# Flask app for every route without a native async handler
+flask_application = WsgiToAsgi(backend.app)
+
+
+# ============================================================================
+# REQUEST / RESPONSE HELPERS
+# ============================================================================
+
+class RequestTooLarge(Exception):
+    """The request body is over MAX_REQUEST_MB"""
+
+
+def declared_length(scope):
+    """Content-Length header of a request, or None"""
+    for name, value in scope.get("headers", []):
+        if name.lower() == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def read_body(scope, receive):
+    """
+    Collect the request body from ASGI receive events into a spooled temporary file
+
+    Bodies over MAX_REQUEST_MB are refused, without reading them when the
+    Content-Length header already says so.
+
+    Returns:
+        tuple: (body file positioned at its start, body length)
+
+    Raises:
+        RequestTooLarge: The body is over the request size limit
+    """
+    max_length = backend.app.config['MAX_CONTENT_LENGTH']
+    if max_length and (declared_length(scope) or 0) > max_length:
+        raise RequestTooLarge()
+
+    body = tempfile.SpooledTemporaryFile(max_size=backend.UPLOAD_SPOOL_BYTES)
+    length = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        length += len(chunk)
+        if max_length and length > max_length:
+            body.close()
+            raise RequestTooLarge()
+        body.write(chunk)
+        more_body = message.get("more_body", False)
+    body.seek(0)
+    return body, length
+
+
+def build_request(scope, body, length):
+    """
+    Build a werkzeug Request from an ASGI scope so form parsing and
+    validation are shared with the Flask views
+    """
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "CONTENT_LENGTH": str(length),
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "0",
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.input": body,
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+    }
+
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            environ[f"HTTP_{name}"] = value
+
+    return Request(environ)
+
+
+async def send_json(send, payload, status, headers=None):
+    """Send a JSON response (with the same CORS header flask-cors adds)"""
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"access-control-allow-origin", b"*"),
+        ] + [(name.encode("latin-1"), value.encode("latin-1")) for name, value in (headers or {}).items()],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def error_response(message, status):
+    return {"status": "error", "message": message}, status
+
+
+# ============================================================================
+# ASYNC API ENDPOINTS
+# ============================================================================
+
+async def extract_statement(request):
+    """Async equivalent of app.extract_statement"""
+    image_file, error = backend.validate_image_upload(request.files)
+    if error:
+        return error_response(error, 400)
+
+    image_bytes = backend.read_upload(image_file)
+    async with backend.arequest_slot("extract", request.headers):
+        extracted_data, cached = await backend.arun_extraction(image_bytes)
+
+    return {
+        "status": "success",
+        "message": "Statement data extracted successfully",
+        "data": extracted_data,
+        "cached": cached
+    }, 200
+
+
+async def analyze_statement(request):
+    """Async equivalent of app.analyze_statement"""
+    image_file, error = backend.validate_image_upload(request.files)
+    if error:
+        return error_response(error, 400)
+
+    reduction_percentage, error = backend.parse_reduction_percentage(request.form)
+    if error:
+        return error_response(error, 400)
+
+    image_bytes = backend.read_upload(image_file)
+    async with backend.arequest_slot("analyze", request.headers):
+        analysis_id, statement_data, extraction_cached = await backend.arun_statement_analysis(image_bytes)
+
+        analysis_results, plan_cached = await backend.aget_reduction_plan(
+            analysis_id, statement_data, reduction_percentage
+        )
+
+    return {
+        "status": "success",
+        "message": "Spending analysis completed successfully",
+        "analysis_id": analysis_id,
+        "data": analysis_results,
+        "extraction_path": statement_data.get('extraction_path'),
+        "ingestion": statement_data.get('ingestion'),
+        "cached": extraction_cached and plan_cached
+    }, 200
+
+
+async def analyze_statement_full(request):
+    """Async equivalent of app.analyze_statement_full"""
+    image_file, error = backend.validate_image_upload(request.files)
+    if error:
+        return error_response(error, 400)
+
+    reduction_percentage, error = backend.parse_reduction_percentage(request.form)
+    if error:
+        return error_response(error, 400)
+
+    image_bytes = backend.read_upload(image_file)
+    async with backend.arequest_slot("analyze", request.headers):
+        analysis = await backend.arun_full_analysis(image_bytes, reduction_percentage)
+
+    return {
+        "status": "success",
+        "message": "Statement extracted and analyzed successfully",
+        **analysis
+    }, 200
+
+
+async def replan_statement(request):
+    """Async equivalent of app.replan_statement"""
+    payload = request.get_json(silent=True) or request.form
+    if not isinstance(payload, dict):
+        return error_response("Request body must be a JSON object", 400)
+    analysis_id = str(payload.get('analysis_id', ''))
+
+    if not analysis_id:
+        return error_response("No analysis id provided", 400)
+
+    reduction_percentage, error = backend.parse_reduction_percentage(payload)
+    if error:
+        return error_response(error, 400)
+
+    statement_data = backend.result_cache.get(analysis_id) if is_valid_key(analysis_id) else None
+    if statement_data is None:
+        return error_response(
+            "Analysis not found or expired. Please upload the statement again.", 404
+        )
+
+    async with backend.arequest_slot("analyze", request.headers):
+        analysis_results, cached = await backend.aget_reduction_plan(
+            analysis_id, statement_data, reduction_percentage
+        )
+
+    return {
+        "status": "success",
+        "message": "Spending analysis completed successfully",
+        "analysis_id": analysis_id,
+        "data": analysis_results,
+        "cached": cached
+    }, 200
+
+
+ASYNC_ROUTES = {
+    "/api/extract": extract_statement,
+    "/api/analyze": analyze_statement,
+    "/api/analyze/full": analyze_statement_full,
+    "/api/replan": replan_statement,
+}
+
+
+# ============================================================================
+# ASGI APPLICATION
+# ============================================================================
+
+async def lifespan(receive, send):
+    """Acknowledge server startup/shutdown events"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI callable: native async handlers first, Flask for everything else"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    handler = ASYNC_ROUTES.get(scope.get("path")) if scope["type"] == "http" else None
+    if handler is None or scope["method"] != "POST":
+        await flask_application(scope, receive, send)
+        return
+
+    # Same endpoint names as the Flask views, so both servers share metric series
+    trace = backend.metrics.start_request(handler.__name__)
+    headers = {}
+    body = None
+    try:
+        body, length = await read_body(scope, receive)
+        payload, status = await handler(build_request(scope, body, length))
+    except RequestTooLarge:
+        payload, status = error_response(
+            f"Request too large. Maximum request size: {backend.MAX_REQUEST_MB:g} MB", 413
+        )
+    except PdfError as e:
+        payload, status = error_response(str(e), 400)
+    except GatewayError as e:
+        payload, status = error_response(str(e), e.status_code)
+        if e.retry_after:
+            headers["retry-after"] = str(e.retry_after)
+    except Exception as e:
+        payload, status = error_response(f"An error occurred: {str(e)}", 500)
+    finally:
+        if body is not None:
+            body.close()
+
+    await send_json(send, payload, status, headers)
+    backend.metrics.finish_request(trace, status)
+    backend.metrics.detach()
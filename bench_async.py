@@ -0,0 +1,96 @@
+"""
+Benchmark: concurrent-request throughput of the sync (Flask/WSGI) and async
+(ASGI + llm.ainvoke) request paths against a stubbed slow model.
+
+No API key or network is needed - the app runs on the offline stub backend
+(llm_backends.StubChatModel) with a fixed latency and canned JSON.
+
+Usage:
+    python bench_async.py [--requests 200] [--latency 0.5] [--workers 8]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["LLM_BACKEND"] = "stub"
+
+import httpx
+
+import app as backend
+import asgi
+from llm_backends import create_llm
+
+
+def unique_image(index):
+    """Distinct payload per request so every request misses the result cache"""
+    return f"benchmark-statement-{index}-{time.time_ns()}".encode("utf-8")
+
+
+def run_sync(total_requests, workers):
+    """Fire requests at the Flask app from a fixed pool of worker threads"""
+    def one_request(index):
+        client = backend.app.test_client()
+        response = client.post(
+            "/api/extract",
+            data={"image": (io.BytesIO(unique_image(index)), "statement.png")}
+        )
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(one_request, range(total_requests)))
+    return time.perf_counter() - start, statuses
+
+
+async def run_async(total_requests):
+    """Fire all requests concurrently at the ASGI app in one event loop"""
+    transport = httpx.ASGITransport(app=asgi.application)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_request(index):
+            response = await client.post(
+                "/api/extract",
+                files={"image": ("statement.png", unique_image(index), "image/png")}
+            )
+            return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(one_request(i) for i in range(total_requests)))
+    return time.perf_counter() - start, statuses
+
+
+def report(label, elapsed, statuses):
+    ok = sum(1 for status in statuses if status == 200)
+    print(f"{label:<28} {elapsed:>8.2f}s {len(statuses) / elapsed:>10.1f} req/s   {ok}/{len(statuses)} ok")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Concurrent requests per mode")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub model latency in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="Sync worker threads (WSGI workers)")
+    args = parser.parse_args()
+
+    backend.llm = create_llm("stub", backend.MODEL_NAME, stub_latency=args.latency)
+
+    print("\n" + "="*60)
+    print("⏱️  SYNC vs ASYNC REQUEST PATH")
+    print("="*60)
+    print(f"Requests: {args.requests}   Model latency: {args.latency}s   Sync workers: {args.workers}")
+    print("-" * 60)
+    print(f"{'Mode':<28} {'Wall':>9} {'Throughput':>14}")
+
+    elapsed, statuses = run_sync(args.requests, args.workers)
+    report(f"sync ({args.workers} workers)", elapsed, statuses)
+
+    elapsed, statuses = asyncio.run(run_async(args.requests))
+    report("async (1 process, ASGI)", elapsed, statuses)
+
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
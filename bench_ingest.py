@@ -0,0 +1,136 @@
+"""
+Benchmark: incremental ingestion of overlapping statements into the SQLite store
+
+Builds a synthetic history per account: monthly statements that repeat
+--carry-over of the previous statement's rows (carried-over transactions),
+each also uploaded as --screenshots overlapping screenshots. Every upload is
+saved to a temporary store, and reports:
+
+- rows extracted vs rows stored, and the debits a plain sum over every
+  upload would have counted
+- the mean time to save one upload (fingerprinting, the index lookup and
+  the running-total update for its new rows)
+- answering per-category totals from the running totals vs recomputing them
+  with a GROUP BY over the transaction history
+
+No model calls are involved.
+
+Usage:
+    python bench_ingest.py [--accounts 20] [--months 12] [--transactions 150]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from store import StatementStore
+
+
+CATEGORIES = ["Cash Withdrawal", "Shopping", "Dining", "Bills", "Transfer", "Interest", "Other"]
+
+
+def new_transaction(rng, month):
+    return {
+        "date": f"{rng.randint(1, 28):02d}/{month:02d}/2024",
+        "description": f"MERCHANT {rng.randint(1, 500)}",
+        "amount": round(rng.uniform(-500, 2500), 2),
+        "category": rng.choice(CATEGORIES)
+    }
+
+
+def account_uploads(rng, account, args):
+    """Every upload of one account: each month's statement, as overlapping screenshots"""
+    uploads = []
+    previous = []
+    for month in range(1, args.months + 1):
+        carried = previous[len(previous) - int(len(previous) * args.carry_over):]
+        transactions = carried + [
+            new_transaction(rng, month) for _ in range(args.transactions - len(carried))
+        ]
+        previous = transactions
+
+        # Screenshots of consecutive slices that share a few rows at each edge
+        step = max(1, len(transactions) // args.screenshots)
+        for shot in range(args.screenshots):
+            start = max(0, shot * step - args.overlap)
+            end = len(transactions) if shot == args.screenshots - 1 else (shot + 1) * step + args.overlap
+            uploads.append((f"{account:016x}{month:08x}{shot:08x}", {
+                "card_account_number": f"4375 XXXX XXXX {account:04d}",
+                "statement_date": f"28/{month:02d}/2024",
+                "total_debits": 0.0,
+                "total_credits": 0.0,
+                "closing_balance": 0.0,
+                "transactions": transactions[start:end]
+            }))
+    return uploads
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=20, help="Card accounts")
+    parser.add_argument("--months", type=int, default=12, help="Statements per account")
+    parser.add_argument("--transactions", type=int, default=150, help="Transactions per statement")
+    parser.add_argument("--carry-over", type=float, default=0.1,
+                        help="Share of the previous statement's rows repeated on the next")
+    parser.add_argument("--screenshots", type=int, default=3, help="Screenshots each statement is uploaded as")
+    parser.add_argument("--overlap", type=int, default=5, help="Rows shared by neighbouring screenshots")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per totals query")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    uploads = [upload for account in range(args.accounts) for upload in account_uploads(rng, account, args)]
+    extracted = sum(len(statement['transactions']) for _, statement in uploads)
+    naive_debits = sum(
+        txn['amount'] for _, statement in uploads for txn in statement['transactions'] if txn['amount'] > 0
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        store = StatementStore(path)
+
+        start = time.perf_counter()
+        new_rows = 0
+        for analysis_id, statement in uploads:
+            new_rows += store.save_analysis(analysis_id, statement)['new_transactions']
+        save_seconds = time.perf_counter() - start
+
+        totals = store.category_totals()
+        connection = sqlite3.connect(path)
+        recompute = lambda: connection.execute(
+            """SELECT category, SUM(CASE WHEN amount > 0 THEN amount END), COUNT(*)
+               FROM transactions GROUP BY category"""
+        ).fetchall()
+        running_ms = median_ms(store.category_totals, args.repeat)
+        recompute_ms = median_ms(recompute, args.repeat)
+        connection.close()
+
+    print("\n" + "="*72)
+    print(f"📥 INCREMENTAL INGESTION ({len(uploads)} uploads: {args.accounts} accounts x {args.months} months "
+          f"x {args.screenshots} screenshots)")
+    print("="*72)
+    print(f"Rows extracted:            {extracted:>12,}")
+    print(f"Rows stored (new):         {new_rows:>12,}   ({extracted - new_rows:,} duplicates skipped)")
+    print(f"Debits, plain sum:         {naive_debits:>12,.2f}")
+    print(f"Debits, deduplicated:      {totals['total_debits']:>12,.2f}   "
+          f"({naive_debits / totals['total_debits'] - 1:.0%} double-counted by the plain sum)")
+    print("-" * 72)
+    print(f"Save per upload:           {save_seconds * 1000 / len(uploads):>12.2f} ms")
+    print(f"Category totals, running:  {running_ms:>12.2f} ms")
+    print(f"Category totals, GROUP BY: {recompute_ms:>12.2f} ms   (over {new_rows:,} stored rows)")
+    print("="*72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: image preprocessing on the sample statements
+
+Reports upload bytes and estimated vision image tokens before and after the
+preprocessing stage. With --parity (requires a real OPENAI_API_KEY), it also
+runs extraction on the original and the preprocessed image and compares the
+extracted fields.
+
+Usage:
+    python bench_preprocess.py [--parity] [--format WEBP] [--max-edge 1600] [--autocrop]
+"""
+
+import argparse
+import glob
+import io
+import math
+import os
+import time
+
+from PIL import Image
+
+from preprocessing import ImagePreprocessor, detect_mime_type
+
+
+def estimate_image_tokens(width, height):
+    """
+    Estimate vision input tokens for a high-detail image
+
+    Follows the published tiling rule: fit within 2048x2048, scale the
+    shortest side down to 768, then 170 tokens per 512px tile plus 85.
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 85 + 170 * tiles
+
+
+def image_size(image_bytes):
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return image.size
+
+
+def compare_extraction(original_bytes, processed_bytes, processed_mime):
+    """Extract with the real model from both images and list differing fields"""
+    import app as backend
+
+    original = backend.extract_statement_data(
+        backend.encode_image(original_bytes), detect_mime_type(original_bytes)
+    )
+    processed = backend.extract_statement_data(
+        backend.encode_image(processed_bytes), processed_mime
+    )
+    return [field for field in original if original.get(field) != processed.get(field)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", default="WEBP", help="Output format: WEBP, JPEG or PNG")
+    parser.add_argument("--max-edge", type=int, default=1600, help="Longest edge in pixels")
+    parser.add_argument("--quality", type=int, default=85, help="Lossy encoder quality")
+    parser.add_argument("--color", action="store_true", help="Keep colour (default: grayscale)")
+    parser.add_argument("--autocrop", action="store_true", help="Trim uniform margins")
+    parser.add_argument("--parity", action="store_true", help="Compare real extractions (needs OPENAI_API_KEY)")
+    parser.add_argument("--images", default="sample_statements/*", help="Glob of images to process")
+    args = parser.parse_args()
+
+    preprocessor = ImagePreprocessor(
+        max_edge=args.max_edge,
+        grayscale=not args.color,
+        output_format=args.format,
+        quality=args.quality,
+        autocrop=args.autocrop
+    )
+
+    print("\n" + "="*78)
+    print("🖼️  IMAGE PREPROCESSING BENCHMARK")
+    print("="*78)
+    print(f"Settings: {preprocessor.signature}")
+    print("-" * 78)
+    print(f"{'Image':<18} {'Bytes in':>10} {'Bytes out':>10} {'Saved':>7} {'Tokens in':>10} {'Tokens out':>11} {'ms':>6}")
+
+    total_in = total_out = tokens_in = tokens_out = 0
+    parity_failures = []
+
+    for path in sorted(glob.glob(args.images)):
+        with open(path, 'rb') as f:
+            original = f.read()
+
+        start = time.perf_counter()
+        processed, mime_type = preprocessor.process(original)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        before = estimate_image_tokens(*image_size(original))
+        after = estimate_image_tokens(*image_size(processed))
+        saved = 100 * (1 - len(processed) / len(original))
+
+        total_in += len(original)
+        total_out += len(processed)
+        tokens_in += before
+        tokens_out += after
+
+        print(f"{os.path.basename(path):<18} {len(original):>10,} {len(processed):>10,} {saved:>6.1f}% "
+              f"{before:>10} {after:>11} {elapsed_ms:>6.1f}")
+
+        if args.parity:
+            differing = compare_extraction(original, processed, mime_type)
+            status = "✅ identical" if not differing else f"❌ differs: {', '.join(differing)}"
+            print(f"{'':<18} parity: {status}")
+            if differing:
+                parity_failures.append(path)
+
+    print("-" * 78)
+    if total_in:
+        print(f"{'TOTAL':<18} {total_in:>10,} {total_out:>10,} {100 * (1 - total_out / total_in):>6.1f}% "
+              f"{tokens_in:>10} {tokens_out:>11}")
+    if args.parity:
+        print(f"Extraction parity: {'all identical' if not parity_failures else f'{len(parity_failures)} differing'}")
+    else:
+        print("Extraction parity: skipped (run with --parity and a real OPENAI_API_KEY)")
+    print("="*78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark: prompt tokens per request and provider prompt-cache hits
+
+Runs the standard flow for --statements distinct statements in-process
+against the offline stub model: /api/extract, /api/analyze and a /api/replan
+to a second reduction target. Each statement's amounts are scaled by its
+own factor, so (like real statements) the numbers in the prompts differ.
+
+The stub counts tokens (about 4 characters per token, text parts only - the
+statement image is not counted) and simulates a provider prefix cache: a
+prompt whose first --cache-min-tokens tokens (then whole 128-token blocks)
+were already sent is billed those tokens as cached.
+
+Reports, per model call and per endpoint, the prompt tokens sent and the
+share of them served from the prefix cache.
+
+Usage:
+    python bench_prompt_cache.py [--statements 50] [--cache-min-tokens 1024]
+"""
+
+import argparse
+import io
+import os
+from collections import Counter, defaultdict
+
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["STATEMENT_DB"] = ""
+os.environ["CACHE_DIR"] = ""
+
+import app as backend
+from llm_backends import create_llm
+
+
+SAMPLE_IMAGE = "sample_statements/statement1.png"
+REDUCTIONS = (10, 15, 20, 25, 30, 35, 40)
+
+
+def ratio(part, whole):
+    return part / whole if whole else 0.0
+
+
+def scaled_statement(statement_data, factor):
+    """A statement with every amount multiplied by factor"""
+    scaled = dict(statement_data, transactions=[
+        dict(txn, amount=round(txn['amount'] * factor, 2)) for txn in statement_data['transactions']
+    ])
+    for field in ("total_debits", "total_credits", "closing_balance"):
+        scaled[field] = round(statement_data[field] * factor, 2)
+    return scaled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statements", type=int, default=50, help="Distinct statements to run through the flow")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024,
+                        help="Shortest cacheable prompt prefix (1024 for OpenAI; 0 disables the cache)")
+    args = parser.parse_args()
+
+    stub = create_llm("stub", backend.MODEL_NAME, stub_prefix_cache_min_tokens=args.cache_min_tokens)
+    backend.llm = backend.text_llm = stub
+    # Every analysis makes its own recommend call (no re-scaled templates)
+    backend.recommendation_cache = None
+
+    calls = Counter()
+    prompt_tokens = defaultdict(Counter)
+    request_tokens = defaultdict(Counter)
+    endpoint = None
+    invoke_model = backend.invoke_model
+
+    def counting_invoke_model(call, messages, **options):
+        response = invoke_model(call, messages, **options)
+        usage = response.usage_metadata or {}
+        cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+        calls[call] += 1
+        prompt_tokens[call].update(input=usage.get("input_tokens", 0), cached=cached)
+        request_tokens[endpoint].update(input=usage.get("input_tokens", 0), cached=cached)
+        return response
+
+    extract_statement_analysis = backend.extract_statement_analysis
+    factors = iter(0.5 + 0.0173 * index for index in range(args.statements))
+
+    def varied_extract_statement_analysis(*extract_args, **extract_kwargs):
+        return scaled_statement(extract_statement_analysis(*extract_args, **extract_kwargs), next(factors))
+
+    backend.invoke_model = counting_invoke_model
+    backend.extract_statement_analysis = varied_extract_statement_analysis
+    client = backend.app.test_client()
+
+    with open(SAMPLE_IMAGE, "rb") as f:
+        image = f.read()
+
+    requests_sent = Counter()
+    try:
+        for index in range(args.statements):
+            # Trailing bytes after the PNG end chunk change the hash, not the picture
+            image_bytes = image + f"bench-{index}".encode("utf-8")
+            first, second = REDUCTIONS[index % len(REDUCTIONS)], REDUCTIONS[(index + 3) % len(REDUCTIONS)]
+
+            endpoint = "extract"
+            response = client.post("/api/extract", data={"image": (io.BytesIO(image_bytes), "statement.png")})
+            assert response.status_code == 200, response.get_json()
+            requests_sent[endpoint] += 1
+
+            endpoint = "analyze"
+            response = client.post("/api/analyze", data={
+                "image": (io.BytesIO(image_bytes), "statement.png"), "reduction_percentage": str(first)
+            })
+            assert response.status_code == 200, response.get_json()
+            requests_sent[endpoint] += 1
+
+            endpoint = "replan"
+            response = client.post("/api/replan", json={
+                "analysis_id": response.get_json()["analysis_id"], "reduction_percentage": second
+            })
+            assert response.status_code == 200, response.get_json()
+            requests_sent[endpoint] += 1
+    finally:
+        backend.invoke_model = invoke_model
+        backend.extract_statement_analysis = extract_statement_analysis
+
+    print("\n" + "="*78)
+    print(f"🧮 PROMPT TOKENS AND PREFIX CACHE (stub, {args.statements} statements, "
+          f"cache from {args.cache_min_tokens} tokens)")
+    print(f"   extraction model: {backend.EXTRACTION_MODEL}   text model: {backend.TEXT_MODEL}")
+    print("="*78)
+    print(f"{'Model call':<14} {'Calls':>7} {'Prompt tok/call':>16} {'Cached tok/call':>16} {'Cached':>8}")
+    print("-" * 78)
+    for call in sorted(calls):
+        tokens = prompt_tokens[call]
+        print(f"{call:<14} {calls[call]:>7} {tokens['input'] / calls[call]:>16.0f} "
+              f"{tokens['cached'] / calls[call]:>16.0f} {ratio(tokens['cached'], tokens['input']):>8.1%}")
+
+    print("-" * 78)
+    print(f"{'Endpoint':<14} {'Requests':>7} {'Prompt tok/req':>16} {'Cached tok/req':>16} {'Cached':>8}")
+    print("-" * 78)
+    for name in ("extract", "analyze", "replan"):
+        tokens, count = request_tokens[name], max(1, requests_sent[name])
+        print(f"{name:<14} {requests_sent[name]:>7} {tokens['input'] / count:>16.0f} "
+              f"{tokens['cached'] / count:>16.0f} {ratio(tokens['cached'], tokens['input']):>8.1%}")
+
+    total_input = sum(tokens["input"] for tokens in prompt_tokens.values())
+    total_cached = sum(tokens["cached"] for tokens in prompt_tokens.values())
+    print("-" * 78)
+    print(f"Overall cached-prefix ratio: {ratio(total_cached, total_input):.1%} "
+          f"({total_cached} of {total_input} prompt tokens)")
+    print("="*78)
+
+
+if __name__ == "__main__":
+    main()
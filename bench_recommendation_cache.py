@@ -0,0 +1,120 @@
+"""
+Benchmark: recommendation calls saved by the spending-profile template cache
+
+Plans reductions for --statements synthetic statements in-process against the
+offline stub model. Statements follow a few spending archetypes (commuter,
+shopper, foodie, ...) with random noise on every category's share and random
+total spending; the reduction percentage is usually 10, 20, 25 or 30 and
+otherwise anything from 5 to 50 - the clustering seen in real traffic.
+
+Runs once without the recommendation cache and once per --share-steps bucket
+width, and reports the cache hit rate, recommendation model calls per
+statement and the mean planning time at the given stub latency.
+
+Usage:
+    python bench_recommendation_cache.py [--statements 1000] [--share-steps 5,10,20] [--latency 0.05]
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["STATEMENT_DB"] = ""
+os.environ["CACHE_DIR"] = ""
+
+import app as backend
+from llm_backends import create_llm
+from recommendation_cache import RecommendationCache
+
+
+# Category -> share of spending for each archetype
+ARCHETYPES = [
+    {"Shopping": 0.45, "Dining": 0.25, "Bills": 0.2, "Other": 0.1},
+    {"Cash Withdrawal": 0.5, "Bills": 0.3, "Dining": 0.2},
+    {"Dining": 0.5, "Shopping": 0.2, "Bills": 0.2, "Interest": 0.1},
+    {"Bills": 0.6, "Shopping": 0.25, "Other": 0.15},
+    {"Shopping": 0.3, "Dining": 0.3, "Cash Withdrawal": 0.3, "Interest": 0.1},
+    {"Cash Withdrawal": 0.35, "Shopping": 0.35, "Bills": 0.2, "Dining": 0.1},
+]
+COMMON_REDUCTIONS = (10, 20, 25, 30)
+
+
+def synthetic_statement(rng, noise):
+    """A statement drawn from one archetype, with noisy shares and a random total"""
+    archetype = rng.choice(ARCHETYPES)
+    weights = {category: share * rng.lognormvariate(0, noise) for category, share in archetype.items()}
+    total = rng.uniform(5000, 100000)
+    scale = total / sum(weights.values())
+    transactions = [
+        {"date": None, "description": category.upper(), "amount": round(weight * scale, 2), "category": category}
+        for category, weight in weights.items()
+    ]
+    debits = round(sum(txn["amount"] for txn in transactions), 2)
+    return {"total_debits": debits, "total_credits": 0.0, "closing_balance": debits, "transactions": transactions}
+
+
+def reduction(rng):
+    return rng.choice(COMMON_REDUCTIONS) if rng.random() < 0.85 else rng.randint(5, 50)
+
+
+def run(cache, workload):
+    """Plan every statement and return (recommend calls, seconds)"""
+    backend.recommendation_cache = cache
+    calls = 0
+    invoke_structured = backend.invoke_structured
+
+    def counting_invoke_structured(call, *args, **kwargs):
+        nonlocal calls
+        calls += call == "recommend"
+        return invoke_structured(call, *args, **kwargs)
+
+    backend.invoke_structured = counting_invoke_structured
+    start = time.perf_counter()
+    try:
+        for statement_data, percentage in workload:
+            backend.plan_reduction(statement_data, percentage)
+    finally:
+        backend.invoke_structured = invoke_structured
+    return calls, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statements", type=int, default=1000, help="Synthetic statements to plan")
+    parser.add_argument("--share-steps", default="5,10,20", help="Comma-separated share bucket widths (points)")
+    parser.add_argument("--noise", type=float, default=0.25, help="Log-normal sigma applied to category shares")
+    parser.add_argument("--entries", type=int, default=1024, help="Recommendation cache size")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub model latency (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    backend.llm = backend.text_llm = create_llm("stub", backend.MODEL_NAME, stub_latency=args.latency)
+    rng = random.Random(args.seed)
+    workload = [(synthetic_statement(rng, args.noise), reduction(rng)) for _ in range(args.statements)]
+
+    print("\n" + "="*80)
+    print(f"♻️  RECOMMENDATION TEMPLATE CACHE ({args.statements} statements, stub latency {args.latency:g}s)")
+    print("="*80)
+    print(f"{'Mode':<18} {'Hit rate':>9} {'Profiles':>9} {'Recommend calls/stmt':>21} {'ms/stmt':>9}")
+    print("-" * 80)
+
+    calls, seconds = run(None, workload)
+    print(f"{'no cache':<18} {'-':>9} {'-':>9} {calls / args.statements:>21.3f} "
+          f"{seconds * 1000 / args.statements:>9.1f}")
+
+    for step in (float(value) for value in args.share_steps.split(",")):
+        cache = RecommendationCache(max_entries=args.entries, share_step=step, signature="bench")
+        calls, seconds = run(cache, workload)
+        stats = cache.stats()
+        print(f"{f'share step {step:g}':<18} {stats['hit_rate']:>9.1%} {stats['entries']:>9} "
+              f"{calls / args.statements:>21.3f} {seconds * 1000 / args.statements:>9.1f}")
+
+    print("-" * 80)
+    print("Profiles: distinct (category set, share buckets, reduction) keys stored")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark: extract latency during an analyze spike, FIFO workers vs the request scheduler
+
+Replays an open-loop load in-process against the offline stub model: a
+steady Poisson stream of /api/extract requests and a trickle of /api/analyze
+requests from a "quiet" tenant, plus - between --spike-start and
+--spike-end - a burst of /api/analyze requests from a "noisy" tenant
+(X-API-Key header). The recommend call is made --recommend-latency seconds
+slower than the vision call, so an analysis holds its slot several times as
+long as an extraction.
+
+Runs the same arrival schedule in each mode:
+
+- no spike: the schedule without the noisy tenant, FIFO workers (reference)
+- fifo: no scheduler; --slots worker threads take requests first come first
+  served (what a fixed pool of gunicorn threads does)
+- scheduled: plenty of threads, with the request scheduler admitting --slots
+  requests at a time (REQUEST_SCHEDULER defaults: weights extract=4,analyze=1,
+  extract=2 slots reserved, tenants round robin)
+
+Latency is measured from the request's scheduled arrival, so time spent
+queued for a worker counts. Reports p50/p99 per endpoint and the quiet
+tenant's analyze p99.
+
+Usage:
+    python bench_scheduler.py [--duration 8] [--slots 8] [--latency 0.2] [--recommend-latency 0.8]
+"""
+
+import argparse
+import io
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["STATEMENT_DB"] = ""
+os.environ["CACHE_DIR"] = ""
+os.environ["SLOW_REQUEST_SECONDS"] = "0"
+
+import app as backend
+from llm_backends import create_llm
+from scheduler import RequestScheduler
+
+
+SAMPLE_IMAGE = "sample_statements/statement1.png"
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def poisson_arrivals(rng, rate, start, end):
+    """Arrival times of a Poisson process between start and end"""
+    arrivals = []
+    moment = start
+    while rate > 0:
+        moment += rng.expovariate(rate)
+        if moment >= end:
+            break
+        arrivals.append(moment)
+    return arrivals
+
+
+def build_schedule(args):
+    """(arrival second, endpoint, tenant) for every request, in arrival order"""
+    rng = random.Random(args.seed)
+    schedule = [(t, "extract", "quiet") for t in poisson_arrivals(rng, args.extract_rate, 0, args.duration)]
+    schedule += [(t, "analyze", "quiet") for t in poisson_arrivals(rng, args.analyze_rate, 0, args.duration)]
+    schedule += [
+        (t, "analyze", "noisy") for t in poisson_arrivals(rng, args.spike_rate, args.spike_start, args.spike_end)
+    ]
+    return sorted(schedule)
+
+
+def run_mode(scheduler, schedule, image, args):
+    """Replay the schedule and return ([(endpoint, tenant, seconds, status)], elapsed)"""
+    backend.result_cache.clear()
+    backend.request_scheduler = scheduler
+    # FIFO: the thread pool is the only queue. Scheduled: threads are cheap, slots are not
+    threads = len(schedule) if scheduler is not None else args.slots
+    results = []
+    lock = threading.Lock()
+
+    def one_request(index, arrival, endpoint, tenant):
+        # Trailing bytes after the PNG end chunk change the hash, not the picture
+        data = {"image": (io.BytesIO(image + f"bench-{index}".encode("utf-8")), "statement.png")}
+        if endpoint == "analyze":
+            data["reduction_percentage"] = "20"
+        response = backend.app.test_client().post(f"/api/{endpoint}", data=data, headers={"X-API-Key": tenant})
+        with lock:
+            results.append((endpoint, tenant, time.perf_counter() - arrival, response.status_code))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for index, (offset, endpoint, tenant) in enumerate(schedule):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one_request, index, start + offset, endpoint, tenant)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=8.0, help="Seconds of arrivals")
+    parser.add_argument("--slots", type=int, default=8, help="Worker threads (fifo) / scheduler slots")
+    parser.add_argument("--extract-rate", type=float, default=5.0, help="Extract requests per second")
+    parser.add_argument("--analyze-rate", type=float, default=1.0, help="Quiet-tenant analyze requests per second")
+    parser.add_argument("--spike-rate", type=float, default=20.0, help="Noisy-tenant analyze requests per second")
+    parser.add_argument("--spike-start", type=float, default=1.0)
+    parser.add_argument("--spike-end", type=float, default=4.0)
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub model latency per call (s)")
+    parser.add_argument("--recommend-latency", type=float, default=0.8,
+                        help="Extra latency of the recommendation call (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    backend.llm = backend.text_llm = create_llm("stub", backend.MODEL_NAME, stub_latency=args.latency)
+    # Every analysis makes its own recommend call (no re-scaled templates)
+    backend.recommendation_cache = None
+    # Only the worker pool (fifo) or the scheduler (scheduled) limits concurrency
+    backend.model_gateway.max_concurrency = 0
+    # The app's weights and reservations (its defaults when REQUEST_SCHEDULER=false)
+    settings = backend.request_scheduler or RequestScheduler(
+        weights={"extract": 4, "analyze": 1}, reserved={"extract": 2}
+    )
+
+    invoke_model = backend.invoke_model
+
+    def slow_recommend_invoke_model(call, messages, **options):
+        if call == "recommend":
+            time.sleep(args.recommend_latency)
+        return invoke_model(call, messages, **options)
+
+    backend.invoke_model = slow_recommend_invoke_model
+
+    with open(SAMPLE_IMAGE, "rb") as f:
+        image = f.read()
+    schedule = build_schedule(args)
+    counts = {
+        name: sum(1 for _, endpoint, tenant in schedule if (endpoint, tenant) == name)
+        for name in (("extract", "quiet"), ("analyze", "quiet"), ("analyze", "noisy"))
+    }
+
+    print("\n" + "="*92)
+    print(f"🚦 EXTRACT vs ANALYZE UNDER AN ANALYZE SPIKE ({args.slots} slots, stub {args.latency:g}s/call, "
+          f"recommend +{args.recommend_latency:g}s)")
+    print(f"   {counts[('extract', 'quiet')]} extract, {counts[('analyze', 'quiet')]} quiet analyze, "
+          f"{counts[('analyze', 'noisy')]} noisy analyze ({args.spike_rate:g}/s from "
+          f"{args.spike_start:g}s to {args.spike_end:g}s)")
+    print("="*92)
+    print(f"{'Mode':<10} {'extract p50':>12} {'extract p99':>12} {'analyze p50':>12} {'analyze p99':>12} "
+          f"{'quiet analyze p99':>18} {'errors':>7} {'seconds':>8}")
+    print("-" * 92)
+
+    try:
+        scheduler = RequestScheduler(
+            max_active=args.slots, weights=settings.weights, reserved=settings.reserved,
+            max_queued=0, max_queued_per_tenant=0, queue_timeout=settings.queue_timeout
+        )
+        baseline = [arrival for arrival in schedule if arrival[2] != "noisy"]
+        modes = (("no spike", None, baseline), ("fifo", None, schedule), ("scheduled", scheduler, schedule))
+        for name, mode_scheduler, mode_schedule in modes:
+            results, elapsed = run_mode(mode_scheduler, mode_schedule, image, args)
+            extract = [seconds for endpoint, _, seconds, _ in results if endpoint == "extract"]
+            analyze = [seconds for endpoint, _, seconds, _ in results if endpoint == "analyze"]
+            quiet = [
+                seconds for endpoint, tenant, seconds, _ in results if endpoint == "analyze" and tenant == "quiet"
+            ]
+            errors = sum(1 for *_, status in results if status != 200)
+            print(f"{name:<10} {statistics.median(extract):>11.2f}s {percentile(extract, 0.99):>11.2f}s "
+                  f"{statistics.median(analyze):>11.2f}s {percentile(analyze, 0.99):>11.2f}s "
+                  f"{percentile(quiet, 0.99):>17.2f}s {errors:>7} {elapsed:>8.1f}")
+    finally:
+        backend.invoke_model = invoke_model
+
+    print("-" * 92)
+    print("Latency counts from the scheduled arrival (queueing for a worker included)")
+    print("="*92)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark: server startup - import time, first request and pre-fork worker boot
+
+Each measurement runs in fresh processes, so nothing is warm:
+
+- import: time to `import app`, then to a ready model client and to the
+  first and second /api/extract requests (Flask test client). The requests
+  use the offline stub model; --backend openai (a placeholder key is enough,
+  no call is made) times building the real client instead of the requests.
+- prefork: gunicorn with --workers workers, with the repo's gunicorn.conf.py
+  (app preloaded in the master, workers forked from it) or without
+  (--no-preload: every worker imports the app itself). Reports the time until
+  every worker can serve and the proportional memory (PSS, shared pages split
+  between processes) of all gunicorn processes. Needs gunicorn and Linux.
+
+Usage:
+    python bench_startup.py [--runs 5] [--backend stub] [--workers 4] [--no-preload]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+
+IMPORT_PROBE = """
+import io, json, time
+start = time.perf_counter()
+import app as backend
+imported = time.perf_counter()
+backend.get_llm()
+client = time.perf_counter()
+result = {"import": imported - start, "client": client - imported}
+if backend.LLM_BACKEND == "stub":
+    with open("sample_statements/statement1.png", "rb") as f:
+        image = f.read()
+    test_client = backend.app.test_client()
+    for name, payload in (("first_request", image), ("second_request", image + b"second")):
+        start = time.perf_counter()
+        response = test_client.post("/api/extract", data={"image": (io.BytesIO(payload), "statement.png")})
+        result[name] = time.perf_counter() - start
+        assert response.status_code == 200, response.get_json()
+print(json.dumps(result))
+"""
+
+BOOT_HOOK = """
+def post_worker_init(worker):
+    with open({path!r}, "a") as f:
+        f.write("%d\\n" % worker.pid)
+"""
+
+
+def probe_env(backend):
+    return dict(
+        os.environ, LLM_BACKEND=backend, STATEMENT_DB="", CACHE_DIR="",
+        OPENAI_API_KEY=os.getenv("OPENAI_API_KEY") or "sk-placeholder"
+    )
+
+
+def measure_import(backend, runs):
+    """Median of each timing over fresh interpreter runs"""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE], env=probe_env(backend),
+            capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def pss_kb(pid):
+    """Proportional set size of a process in kB"""
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_prefork(backend, workers, preload):
+    """Seconds until all workers are up, and total PSS of the gunicorn processes"""
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        booted = os.path.join(directory, "booted")
+        config = os.path.join(directory, "bench.conf.py")
+        with open(config, "w") as f:
+            if preload:
+                # The repo's settings, plus a hook that reports each booted worker
+                f.write(open("gunicorn.conf.py").read())
+            f.write(BOOT_HOOK.format(path=booted))
+
+        env = dict(probe_env(backend), WEB_CONCURRENCY=str(workers))
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", config, "-w", str(workers),
+             "-b", f"127.0.0.1:{port}", "app:app"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            pids = []
+            while len(pids) < workers:
+                if server.poll() is not None:
+                    raise RuntimeError("gunicorn exited during startup")
+                if os.path.exists(booted):
+                    with open(booted) as f:
+                        pids = [int(line) for line in f if line.strip()]
+                time.sleep(0.01)
+            ready = time.perf_counter() - start
+
+            requests.get(f"http://127.0.0.1:{port}/", timeout=10).raise_for_status()
+            memory = pss_kb(server.pid) + sum(pss_kb(pid) for pid in pids)
+        finally:
+            server.terminate()
+            server.wait()
+    return ready, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--backend", default="stub", choices=("stub", "openai"))
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers (0 skips the pre-fork test)")
+    parser.add_argument("--no-preload", action="store_true", help="Boot workers without the repo's gunicorn.conf.py")
+    args = parser.parse_args()
+
+    timings = measure_import(args.backend, args.runs)
+
+    print("\n" + "="*64)
+    print(f"🚀 STARTUP (LLM_BACKEND={args.backend}, median of {args.runs} fresh processes)")
+    print("="*64)
+    print(f"import app:            {timings['import'] * 1000:8.0f} ms")
+    print(f"model client ready:    {timings['client'] * 1000:8.0f} ms")
+    if "first_request" in timings:
+        print(f"first /api/extract:    {timings['first_request'] * 1000:8.0f} ms")
+        print(f"second /api/extract:   {timings['second_request'] * 1000:8.0f} ms")
+        total = timings['import'] + timings['client'] + timings['first_request']
+        print(f"import -> 1st answer:  {total * 1000:8.0f} ms")
+
+    if args.workers:
+        ready, memory = measure_prefork(args.backend, args.workers, not args.no_preload)
+        mode = "no preload" if args.no_preload else "gunicorn.conf.py"
+        print("-" * 64)
+        print(f"gunicorn, {args.workers} workers ({mode})")
+        print(f"all workers ready:     {ready * 1000:8.0f} ms")
+        print(f"total PSS:             {memory / 1024:8.0f} MB")
+    print("="*64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: statement history queries on the SQLite store
+
+Fills a temporary store with a year of synthetic statements (one per account
+per month) and times the history queries behind /api/statements and
+/api/transactions. No model calls are involved.
+
+Usage:
+    python bench_store.py [--accounts 50] [--transactions 200] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from store import StatementStore
+
+
+CATEGORIES = ["Cash Withdrawal", "Shopping", "Dining", "Bills", "Transfer", "Interest", "Other"]
+
+
+def synthetic_statement(rng, account, month, transactions):
+    """StatementAnalysis-shaped dict for one account and month of 2024"""
+    return {
+        "card_account_number": f"4375 XXXX XXXX {account:04d}",
+        "statement_date": f"23/{month:02d}/2024",
+        "total_debits": 0.0,
+        "total_credits": 0.0,
+        "closing_balance": 0.0,
+        "transactions": [
+            {
+                "date": f"{rng.randint(1, 28):02d}/{month:02d}/2024",
+                "description": f"MERCHANT {rng.randint(1, 500)}",
+                "amount": round(rng.uniform(-500, 2500), 2),
+                "category": rng.choice(CATEGORIES)
+            }
+            for _ in range(transactions)
+        ]
+    }
+
+
+def time_query(func, repeat):
+    """Median wall time (ms) of func() over repeat runs, with its last result"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=50, help="Card accounts")
+    parser.add_argument("--transactions", type=int, default=200, help="Transactions per statement")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        store = StatementStore(os.path.join(directory, "bench.db"))
+
+        start = time.perf_counter()
+        for account in range(args.accounts):
+            for month in range(1, 13):
+                store.save_analysis(
+                    f"{account:032x}{month:032x}",
+                    synthetic_statement(rng, account, month, args.transactions)
+                )
+        load_seconds = time.perf_counter() - start
+        stats = store.stats()
+
+        print("\n" + "="*72)
+        print("🗄️  STATEMENT STORE QUERIES (one year of history)")
+        print("="*72)
+        print(f"Statements: {stats['statements']}   Transactions: {stats['transactions']:,}   "
+              f"Load: {load_seconds:.2f}s")
+        print("-" * 72)
+        print(f"{'Query':<48} {'Rows':>9} {'Median ms':>12}")
+
+        queries = [
+            ("One account, full year", lambda: store.query_transactions(
+                account="4375 XXXX XXXX 0007", date_from="2024-01-01", date_to="2024-12-31")),
+            ("One account + category, one quarter", lambda: store.query_transactions(
+                account="4375 XXXX XXXX 0007", category="Dining",
+                date_from="2024-04-01", date_to="2024-06-30")),
+            ("One category, one month, all accounts", lambda: store.query_transactions(
+                category="Dining", date_from="2024-03-01", date_to="2024-03-31")),
+            ("All accounts, one month", lambda: store.query_transactions(
+                date_from="2024-06-01", date_to="2024-06-30")),
+            ("List statements for one account", lambda: store.list_statements(
+                account="4375 XXXX XXXX 0007")),
+        ]
+
+        for label, query in queries:
+            median_ms, result = time_query(query, args.repeat)
+            print(f"{label:<48} {result['total_count']:>9,} {median_ms:>12.2f}")
+
+        print("="*72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Benchmark suite: drives the Flask app in-process against the offline stub model
+
+For each endpoint it reports p50/p95/p99 latency and throughput under
+concurrent load, plus peak Python memory allocated per request (measured in
+a separate sequential pass with tracemalloc).
+
+No API key or network is needed. Every request uses a distinct image so the
+result cache does not hide the pipeline cost (pass --cache-hits to measure the
+cached path instead).
+
+Usage:
+    python bench_suite.py [--requests 50] [--concurrency 8] [--latency 0.2]
+                          [--endpoints extract,analyze,replan,stream,batch]
+"""
+
+import argparse
+import io
+import itertools
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["LLM_BACKEND"] = "stub"
+
+import app as backend
+from llm_backends import create_llm
+
+
+SAMPLE_IMAGE = "sample_statements/statement1.png"
+
+
+# ============================================================================
+# STATISTICS
+# ============================================================================
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize_latencies(latencies, elapsed):
+    """p50/p95/p99 (ms) and throughput (req/s) for one run"""
+    return {
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+    }
+
+
+# ============================================================================
+# SCENARIOS
+# ============================================================================
+
+class Scenario:
+    """Builds one request per call against a Flask test client"""
+
+    def __init__(self, base_image, cache_hits):
+        self.base_image = base_image
+        self.cache_hits = cache_hits
+        self._counter = itertools.count()
+        self._analysis_id = None
+        self._lock = threading.Lock()
+
+    def image(self):
+        """Sample image, made unique per call unless cache hits are wanted"""
+        if self.cache_hits:
+            return self.base_image
+        # Trailing bytes after the PNG end chunk change the hash, not the picture
+        return self.base_image + f"bench-{next(self._counter)}".encode("utf-8")
+
+    def analysis_id(self, client):
+        with self._lock:
+            if self._analysis_id is None:
+                response = client.post("/api/analyze", data={
+                    "image": (io.BytesIO(self.base_image), "statement.png"),
+                    "reduction_percentage": "20"
+                })
+                self._analysis_id = response.get_json()["analysis_id"]
+            return self._analysis_id
+
+    def extract(self, client):
+        return client.post("/api/extract", data={
+            "image": (io.BytesIO(self.image()), "statement.png")
+        })
+
+    def analyze(self, client):
+        return client.post("/api/analyze", data={
+            "image": (io.BytesIO(self.image()), "statement.png"),
+            "reduction_percentage": "20"
+        })
+
+    def replan(self, client):
+        # Distinct targets miss the plan cache; the extraction is always reused
+        percentage = 20 if self.cache_hits else 1 + (next(self._counter) % 9000) / 100
+        return client.post("/api/replan", json={
+            "analysis_id": self.analysis_id(client),
+            "reduction_percentage": percentage
+        })
+
+    def stream(self, client):
+        response = client.post("/api/analyze/stream", data={
+            "image": (io.BytesIO(self.image()), "statement.png"),
+            "reduction_percentage": "20"
+        })
+        response.get_data()  # Drain the event stream
+        return response
+
+    def batch(self, client):
+        files = [(io.BytesIO(self.image()), f"statement{i}.png") for i in range(4)]
+        return client.post("/api/extract/batch", data={"images": files})
+
+
+ENDPOINTS = {
+    "extract": "POST /api/extract",
+    "analyze": "POST /api/analyze",
+    "replan": "POST /api/replan",
+    "stream": "POST /api/analyze/stream",
+    "batch": "POST /api/extract/batch (4 files)",
+}
+
+
+# ============================================================================
+# RUNNERS
+# ============================================================================
+
+def run_load(scenario, name, total_requests, concurrency):
+    """Fire total_requests at one endpoint from concurrency threads"""
+    request = getattr(scenario, name)
+    if name == "replan":
+        # Create the analysis being replanned outside the timed window
+        scenario.analysis_id(backend.app.test_client())
+
+    def one_request(_):
+        client = backend.app.test_client()
+        start = time.perf_counter()
+        response = request(client)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one_request, range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in outcomes]
+    ok = sum(1 for _, status in outcomes if status == 200)
+    return {**summarize_latencies(latencies, elapsed), "ok": ok, "requests": total_requests}
+
+
+def measure_memory(scenario, name, samples):
+    """Mean and max peak traced allocation (KB) of sequential requests"""
+    request = getattr(scenario, name)
+    client = backend.app.test_client()
+    peaks = []
+
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            request(client)
+            peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    return {"mem_mean_kb": sum(peaks) / len(peaks), "mem_max_kb": max(peaks)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub model latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Stub latency jitter (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Stub failure probability")
+    parser.add_argument("--memory-samples", type=int, default=5, help="Sequential requests for memory")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated endpoints")
+    parser.add_argument("--cache-hits", action="store_true", help="Reuse one image (measure cached path)")
+    args = parser.parse_args()
+
+    backend.llm = create_llm(
+        "stub", backend.MODEL_NAME,
+        stub_latency=args.latency,
+        stub_latency_jitter=args.jitter,
+        stub_failure_rate=args.failure_rate,
+        stub_seed=42
+    )
+
+    with open(SAMPLE_IMAGE, "rb") as f:
+        scenario = Scenario(f.read(), args.cache_hits)
+
+    print("\n" + "="*100)
+    print("📊 IN-PROCESS BENCHMARK SUITE (stub model)")
+    print("="*100)
+    print(f"Requests/endpoint: {args.requests}   Concurrency: {args.concurrency}   "
+          f"Stub latency: {args.latency}s ±{args.jitter}s   Failure rate: {args.failure_rate:.0%}   "
+          f"Cache hits: {'yes' if args.cache_hits else 'no'}")
+    print("-" * 100)
+    print(f"{'Endpoint':<36} {'OK':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} "
+          f"{'mem KB/req':>11} {'max KB':>9}")
+
+    for name in [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]:
+        if name not in ENDPOINTS:
+            print(f"⚠️  Unknown endpoint '{name}', skipping")
+            continue
+
+        load = run_load(scenario, name, args.requests, args.concurrency)
+        memory = measure_memory(scenario, name, args.memory_samples)
+
+        print(f"{ENDPOINTS[name]:<36} {load['ok']:>3}/{load['requests']:<3} {load['p50_ms']:>9.1f} "
+              f"{load['p95_ms']:>9.1f} {load['p99_ms']:>9.1f} {load['throughput']:>8.1f} "
+              f"{memory['mem_mean_kb']:>11.1f} {memory['mem_max_kb']:>9.1f}")
+
+    print("="*100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Benchmark: tiled vs single-shot extraction of tall statement images
+
+Draws synthetic tall statements (long scrolled screenshots) with known
+transactions and compares extracting them as one image against the tiled
+path (ImageTiler + merge_tile_transactions).
+
+By default no model is called. Each image sent is read by a simulated
+provider: the image is downscaled like the preprocessing stage and the
+provider would (fit 2048x2048, shortest side 768), and a row is read only
+when its text is still at least --legible-px tall and the row is inside the
+image. Rows cut by a tile edge are read with a garbled description when
+mostly visible, so the overlap deduplication is exercised. Legibility fades
+out linearly within 2px of --legible-px (rows are dropped at random).
+Wall-clock is the measured local work (tiling, preprocessing, merging) plus a
+modeled model latency of --base-latency + --row-latency per returned row,
+with the tiles extracted concurrently. Images too short to tile are sent as
+one image on both paths, as the app does.
+
+With --live (requires a real OPENAI_API_KEY) both paths run through the app's
+vision extraction instead and wall-clock is measured end to end.
+
+Usage:
+    python bench_tiling.py [--rows 60 150 300] [--width 1080] [--live]
+"""
+
+import argparse
+import io
+import random
+import time
+from collections import Counter
+
+from PIL import Image, ImageDraw, ImageFont
+
+from preprocessing import ImagePreprocessor
+from tiling import ImageTiler, merge_tile_transactions, transaction_key
+
+
+ROW_HEIGHT = 44
+FONT_SIZE = 22
+HEADER_HEIGHT = 260
+MERCHANTS = ["SWIGGY", "AMAZON PAY", "UBER TRIP", "BIGBASKET", "AIRTEL BILL", "ZOMATO", "FLIPKART",
+             "SHELL FUEL", "APOLLO PHARMACY", "BOOKMYSHOW", "IRCTC", "STARBUCKS", "DMART", "MYNTRA"]
+
+
+# ============================================================================
+# SYNTHETIC STATEMENTS
+# ============================================================================
+
+def load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 has a single fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def synthetic_statement(rows, width, seed=7):
+    """
+    Draw a tall statement screenshot
+
+    Returns:
+        tuple: (PNG bytes, transactions with their 'top'/'bottom' pixel rows)
+    """
+    rng = random.Random(seed)
+    height = HEADER_HEIGHT + rows * ROW_HEIGHT + 80
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = load_font(FONT_SIZE)
+
+    draw.text((40, 40), "CREDIT CARD STATEMENT", fill="black", font=load_font(36))
+    draw.text((40, 120), "Card Number: 4375 XXXX XXXX 8007   Statement Date: 23/04/2018", fill="black", font=font)
+    draw.text((40, 180), "Date        Description                               Amount", fill="black", font=font)
+
+    transactions = []
+    for index in range(rows):
+        top = HEADER_HEIGHT + index * ROW_HEIGHT
+        txn = {
+            "date": f"{rng.randint(1, 28):02d}/04/2018",
+            "description": f"{rng.choice(MERCHANTS)} {rng.choice('ABCDEFGH')}{rng.choice('KLMNPRST')}",
+            "amount": round(rng.uniform(50, 5000), 2) if rng.random() > 0.1 else -round(rng.uniform(500, 9000), 2),
+        }
+        amount = f"{abs(txn['amount']):,.2f}{' Cr' if txn['amount'] < 0 else ''}"
+        draw.text((40, top + 10), txn["date"], fill="black", font=font)
+        draw.text((200, top + 10), txn["description"], fill="black", font=font)
+        draw.text((width - 260, top + 10), amount, fill="black", font=font)
+        draw.line((40, top + ROW_HEIGHT - 2, width - 40, top + ROW_HEIGHT - 2), fill=(220, 220, 220))
+        transactions.append(dict(txn, top=top + 10, bottom=top + 10 + FONT_SIZE))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue(), transactions
+
+
+# ============================================================================
+# SIMULATED PROVIDER
+# ============================================================================
+
+def provider_scale(width, height, max_edge):
+    """Overall downscale of a width x height image: preprocessing, then the provider"""
+    scale = min(1.0, max_edge / max(width, height)) if max_edge else 1.0
+    width, height = width * scale, height * scale
+    provider = min(1.0, 2048 / max(width, height))
+    width, height = width * provider, height * provider
+    provider *= min(1.0, 768 / min(width, height))
+    return scale * provider
+
+
+def simulated_read(transactions, top, bottom, width, max_edge, legible_px, seed=11):
+    """Rows the simulated provider returns for the image region [top, bottom)"""
+    rng = random.Random(seed + top)
+    text_px = FONT_SIZE * provider_scale(width, bottom - top, max_edge)
+    # Legibility fades out over +/-2px around legible_px
+    read_probability = min(1.0, max(0.0, (text_px - legible_px + 2) / 4))
+
+    read = []
+    for txn in transactions:
+        visible = min(bottom, txn["bottom"]) - max(top, txn["top"])
+        if visible > 0 and rng.random() >= read_probability:
+            continue
+        if visible >= FONT_SIZE:
+            read.append({key: txn[key] for key in ("date", "description", "amount")})
+        elif visible >= FONT_SIZE * 0.6:
+            # A row cut by the edge is misread instead of skipped
+            read.append({"date": txn["date"], "description": txn["description"][:3], "amount": txn["amount"]})
+    return read
+
+
+def accuracy(expected, extracted):
+    """(recall, precision) of extracted rows against the ground truth (duplicates count as wrong)"""
+    truth = Counter(transaction_key(txn) for txn in expected)
+    found = Counter(transaction_key(txn) for txn in extracted)
+    matched = sum((truth & found).values())
+    return matched / max(1, len(expected)), matched / max(1, len(extracted))
+
+
+def simulated_run(image_bytes, transactions, width, tiler, preprocessor, args):
+    """Both paths against the simulated provider: {path: (recall, precision, seconds, calls)}"""
+    height = transactions[-1]["bottom"] + 80
+
+    start = time.perf_counter()
+    preprocessor.process(image_bytes)
+    single_rows = simulated_read(transactions, 0, height, width, preprocessor.max_edge, args.legible_px)
+    single_local = time.perf_counter() - start
+    single_model = args.base_latency + args.row_latency * len(single_rows)
+    single = (*accuracy(transactions, single_rows), single_local + single_model, 1)
+
+    start = time.perf_counter()
+    tiles = tiler.split(image_bytes)
+    if not tiles:
+        return {"single": single, "tiled": single}
+    for tile in tiles:
+        preprocessor.process_image(tile.image)
+    tile_rows = [
+        simulated_read(transactions, tile.top, tile.bottom, width, preprocessor.max_edge, args.legible_px)
+        for tile in tiles
+    ]
+    tiled = merge_tile_transactions(tile_rows)
+    tiled_local = time.perf_counter() - start
+    tiled_model = max(args.base_latency + args.row_latency * len(rows) for rows in tile_rows)
+
+    return {
+        "single": single,
+        "tiled": (*accuracy(transactions, tiled), tiled_local + tiled_model, len(tiles)),
+    }
+
+
+def live_run(image_bytes, transactions, tiler):
+    """Both paths through the app's vision extraction: {path: (recall, precision, seconds, calls)}"""
+    import app as backend
+
+    start = time.perf_counter()
+    single = backend.extract_statement_analysis(*backend.prepare_image(image_bytes))
+    single_seconds = time.perf_counter() - start
+
+    single = (*accuracy(transactions, single["transactions"]), single_seconds, 1)
+
+    start = time.perf_counter()
+    tiles = tiler.split(image_bytes)
+    if not tiles:
+        return {"single": single, "tiled": single}
+    tiled = backend.extract_tiled_analysis(tiles)
+    tiled_seconds = time.perf_counter() - start
+
+    return {
+        "single": single,
+        "tiled": (*accuracy(transactions, tiled["transactions"]), tiled_seconds, len(tiles)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[60, 150, 300], help="Transactions per statement")
+    parser.add_argument("--width", type=int, default=1080, help="Screenshot width in pixels")
+    parser.add_argument("--max-edge", type=int, default=1600, help="Preprocessing IMAGE_MAX_EDGE")
+    parser.add_argument("--overlap", type=float, default=0.15, help="Tile overlap fraction")
+    parser.add_argument("--legible-px", type=float, default=8.0, help="Simulated: smallest readable text height")
+    parser.add_argument("--base-latency", type=float, default=2.0, help="Simulated: seconds per model call")
+    parser.add_argument("--row-latency", type=float, default=0.12, help="Simulated: seconds per returned row")
+    parser.add_argument("--live", action="store_true", help="Use the real model through the app")
+    args = parser.parse_args()
+
+    tiler = ImageTiler(overlap=args.overlap)
+    preprocessor = ImagePreprocessor(max_edge=args.max_edge)
+
+    print("\n" + "="*88)
+    print(f"🧩 TILED vs SINGLE-SHOT EXTRACTION ({'live model' if args.live else 'simulated provider'})")
+    print("="*88)
+    print(f"{'Rows':>6} {'Size':>12} {'Path':>8} {'Calls':>6} {'Recall':>8} {'Precision':>10} {'Wall-clock':>11}")
+    print("-" * 88)
+
+    for rows in args.rows:
+        image_bytes, transactions = synthetic_statement(rows, args.width)
+        height = transactions[-1]["bottom"] + 80
+        if args.live:
+            results = live_run(image_bytes, transactions, tiler)
+        else:
+            results = simulated_run(image_bytes, transactions, args.width, tiler, preprocessor, args)
+
+        for path, (recall, precision, seconds, calls) in results.items():
+            print(f"{rows:>6} {f'{args.width}x{height}':>12} {path:>8} {calls:>6} "
+                  f"{recall:>8.1%} {precision:>10.1%} {seconds:>10.2f}s")
+
+    print("-" * 88)
+    if not args.live:
+        print("Wall-clock = measured local work + modeled model latency (tiles run concurrently)")
+    print("Recall: ground-truth rows extracted; Precision: extracted rows that are real (duplicates are errors)")
+    print("="*88)
+
+
+if __name__ == "__main__":
+    main()
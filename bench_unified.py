@@ -0,0 +1,112 @@
+"""
+Benchmark: separate vs unified statement extraction in the standard flow
+
+Runs the flow the web UI drives for every statement - /api/extract, then
+/api/analyze of the same upload - in-process against the offline stub model,
+once per mode:
+
+- split (UNIFIED_EXTRACTION=false): /api/extract sends the image with the
+  header prompt, /api/analyze sends it again with the analysis prompt.
+- unified (UNIFIED_EXTRACTION=true): one analysis prompt that also asks for
+  the header; the extraction it caches serves both endpoints.
+
+Reports model calls per statement split into vision calls (statement image
+attached) and text calls, the bytes sent to the model and the wall-clock
+time per statement at the given stub latency.
+
+Usage:
+    python bench_unified.py [--statements 50] [--latency 0.2]
+"""
+
+import argparse
+import io
+import os
+import time
+from collections import Counter
+
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["STATEMENT_DB"] = ""
+os.environ["CACHE_DIR"] = ""
+
+import app as backend
+from llm_backends import create_llm
+from metrics import message_payload_bytes
+
+
+SAMPLE_IMAGE = "sample_statements/statement1.png"
+VISION_CALLS = ("analyze", "extract")
+
+
+def run_mode(unified, image, args):
+    """Run the extract -> analyze flow for every statement in one mode and return its counters"""
+    backend.UNIFIED_EXTRACTION = unified
+    backend.EXTRACTION_SIGNATURE = backend.UNIFIED_PROMPT_VERSION if unified else "split"
+    backend.result_cache.clear()
+    # Every analysis makes its own recommend call (no re-scaled templates)
+    backend.recommendation_cache = None
+    backend.llm = create_llm("stub", backend.MODEL_NAME, stub_latency=args.latency)
+
+    calls = Counter()
+    sent_bytes = Counter()
+    invoke_model = backend.invoke_model
+
+    def counting_invoke_model(call, messages, **options):
+        calls[call] += 1
+        sent_bytes[call] += message_payload_bytes(messages)
+        return invoke_model(call, messages, **options)
+
+    backend.invoke_model = counting_invoke_model
+    client = backend.app.test_client()
+
+    start = time.perf_counter()
+    try:
+        for index in range(args.statements):
+            # Trailing bytes after the PNG end chunk change the hash, not the picture
+            image_bytes = image + f"bench-{index}".encode("utf-8")
+            extracted = client.post("/api/extract", data={"image": (io.BytesIO(image_bytes), "statement.png")})
+            analyzed = client.post("/api/analyze", data={
+                "image": (io.BytesIO(image_bytes), "statement.png"), "reduction_percentage": "20"
+            })
+            assert extracted.status_code == 200 and analyzed.status_code == 200
+    finally:
+        backend.invoke_model = invoke_model
+    elapsed = time.perf_counter() - start
+
+    return {"calls": calls, "sent_bytes": sent_bytes, "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statements", type=int, default=50, help="Distinct statements to extract and analyze")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub model latency per call (s)")
+    args = parser.parse_args()
+
+    with open(SAMPLE_IMAGE, "rb") as f:
+        image = f.read()
+
+    print("\n" + "="*88)
+    print(f"🧾 SPLIT vs UNIFIED EXTRACTION (/api/extract then /api/analyze, stub latency {args.latency:g}s)")
+    print("="*88)
+    print(f"{'Mode':<10} {'Vision/stmt':>12} {'Text/stmt':>10} {'Calls/stmt':>11} "
+          f"{'Vision KB/stmt':>15} {'Sent KB/stmt':>13} {'ms/stmt':>9}")
+    print("-" * 88)
+
+    for name, unified in (("split", False), ("unified", True)):
+        result = run_mode(unified, image, args)
+        calls, sent_bytes = result["calls"], result["sent_bytes"]
+        vision = sum(count for call, count in calls.items() if call in VISION_CALLS)
+        vision_bytes = sum(size for call, size in sent_bytes.items() if call in VISION_CALLS)
+        total = sum(calls.values())
+
+        print(f"{name:<10} {vision / args.statements:>12.2f} {(total - vision) / args.statements:>10.2f} "
+              f"{total / args.statements:>11.2f} {vision_bytes / 1024 / args.statements:>15.1f} "
+              f"{sum(sent_bytes.values()) / 1024 / args.statements:>13.1f} "
+              f"{result['elapsed'] * 1000 / args.statements:>9.0f}")
+
+    print("-" * 88)
+    print("Vision calls carry the statement image; text calls are categorization and recommendations")
+    print("="*88)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark: server memory under concurrent large uploads
+
+Starts the Flask app in a child process (threaded WSGI server, offline stub
+model) and fires concurrent uploads of a large synthetic statement photo
+(a JPEG of about --size-mb MB, each made unique so the result cache does
+not help). Reports the server's resident memory before the load and its
+peak (VmHWM) during it, plus how an oversized upload is answered.
+
+Peak RSS is read from /proc, so this benchmark needs Linux.
+
+Usage:
+    python bench_upload.py [--uploads 50] [--size-mb 10] [--endpoint extract] [--latency 1.0]
+"""
+
+import argparse
+import io
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image, ImageDraw
+
+
+SERVER = """
+import app as backend
+from werkzeug.serving import make_server
+make_server("127.0.0.1", {port}, backend.app, threaded=True).serve_forever()
+"""
+
+
+def statement_photo(size_mb):
+    """A noisy statement 'photo' JPEG of roughly size_mb megabytes"""
+    rng = random.Random(3)
+    width, height = 3000, 4000
+    image = Image.effect_noise((width, height), 30).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for row in range(120):
+        draw.text((150, 200 + row * 30), f"{rng.randint(1, 28):02d}/04 MERCHANT {row:03d}   1,{row:03d}.00",
+                  fill="black")
+
+    # Raise the quality until the file is big enough (noise keeps it from compressing well)
+    for quality in (70, 80, 90, 95):
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality)
+        if buffer.tell() >= size_mb * 1024 * 1024:
+            break
+    data = buffer.getvalue()
+    # Pad with trailing bytes (ignored by decoders) to the exact size
+    return data + b"\0" * max(0, int(size_mb * 1024 * 1024) - len(data))
+
+
+def memory_kb(pid, field):
+    """VmRSS / VmHWM of a process in kB"""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, latency):
+    env = dict(
+        os.environ, LLM_BACKEND="stub", STUB_LATENCY_SECONDS=str(latency),
+        STATEMENT_DB="", CACHE_DIR="", OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "unused")
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER.format(port=port)], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Server did not start")
+
+
+def upload(url, endpoint, image):
+    data = {"reduction_percentage": "20"} if endpoint == "analyze" else {}
+    response = requests.post(
+        f"{url}/api/{endpoint}", files={"image": ("statement.jpg", image, "image/jpeg")}, data=data
+    )
+    return response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=50, help="Concurrent uploads")
+    parser.add_argument("--size-mb", type=float, default=10, help="Upload size in MB")
+    parser.add_argument("--endpoint", default="extract", choices=("extract", "analyze"))
+    parser.add_argument("--latency", type=float, default=1.0, help="Stub model latency (s)")
+    parser.add_argument("--oversized-mb", type=float, default=128, help="Size of the oversized upload probe")
+    args = parser.parse_args()
+
+    image = statement_photo(args.size_mb)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = start_server(port, args.latency)
+
+    try:
+        # Warm up imports and lazy initialisation with one small request
+        small = io.BytesIO()
+        Image.new("RGB", (800, 1000), "white").save(small, format="JPEG")
+        upload(url, args.endpoint, small.getvalue())
+        idle_kb = memory_kb(server.pid, "VmRSS")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.uploads) as pool:
+            statuses = list(pool.map(
+                lambda index: upload(url, args.endpoint, image + f"bench-{index}".encode()),
+                range(args.uploads)
+            ))
+        elapsed = time.perf_counter() - start
+        peak_kb = memory_kb(server.pid, "VmHWM")
+
+        oversized_status = upload(url, args.endpoint, b"\xff\xd8\xff" + b"\0" * int(args.oversized_mb * 1024 * 1024))
+    finally:
+        server.kill()
+        server.wait()
+
+    ok = sum(1 for status in statuses if status == 200)
+    print("\n" + "="*72)
+    print(f"📦 UPLOAD MEMORY ({args.uploads} concurrent x {len(image) / 1024 / 1024:.1f} MB to /api/{args.endpoint})")
+    print("="*72)
+    print(f"Succeeded:               {ok}/{args.uploads}  (statuses: {sorted(set(statuses))})")
+    print(f"Wall-clock:              {elapsed:.2f}s")
+    print(f"RSS idle:                {idle_kb / 1024:.0f} MB")
+    print(f"Peak RSS:                {peak_kb / 1024:.0f} MB")
+    print(f"Peak over idle / upload: {(peak_kb - idle_kb) / 1024 / args.uploads:.1f} MB")
+    print(f"{args.oversized_mb:.0f} MB upload:          HTTP {oversized_status}")
+    print("="*72)
+
+
+if __name__ == "__main__":
+    main()
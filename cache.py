@@ -0,0 +1,415 @@
+"""
+Content-addressed result cache for statement extraction and analysis
+
+Results are keyed by a hash of the uploaded image bytes together with the
+model name and prompt version, so a re-uploaded statement is answered from
+cache while a prompt or model change naturally invalidates old entries.
+
+Two tiers are available:
+- In-memory LRU (always on, bounded by entry count)
+- On-disk JSON store (optional, bounded by TTL and total size)
+
+Misses are coalesced (single-flight): while one caller computes a key, other
+callers of the same key - sync threads, worker pools or asyncio tasks - wait
+for that computation instead of starting their own model call.
+"""
+
+import asyncio
+import concurrent.futures
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def hash_image(image_bytes):
+    """Return the SHA-256 hex digest of raw image bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def is_valid_key(key):
+    """Check that a client-supplied key looks like one produced by make_cache_key"""
+    return isinstance(key, str) and KEY_PATTERN.fullmatch(key) is not None
+
+
+def make_cache_key(image_bytes, operation, model_name, prompt_version, *extra):
+    """
+    Build a content-addressed cache key
+
+    Args:
+        image_bytes: Raw uploaded image bytes
+        operation: Pipeline operation name (e.g. "extract", "analyze")
+        model_name: Name of the model producing the result
+        prompt_version: Version tag of the prompt used for the operation
+        *extra: Additional parameters that change the result (e.g. reduction percentage)
+
+    Returns:
+        str: Hex digest identifying the result
+    """
+    parts = [operation, model_name, prompt_version, hash_image(image_bytes)]
+    parts.extend(str(value) for value in extra)
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Share one in-progress computation among concurrent callers of the same key"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def join(self, key):
+        """
+        Join the computation of key, starting one if none is in flight
+
+        Returns:
+            tuple: (future, leader) - the leader must compute and call land()
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._flights[key] = concurrent.futures.Future()
+            return future, True
+
+    def land(self, key, future, value=None, error=None, cancelled=False):
+        """Publish the leader's outcome to every waiter"""
+        with self._lock:
+            self._flights.pop(key, None)
+        if cancelled:
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache for JSON-serializable results"""
+
+    def __init__(self, max_entries=256, disk_dir=None, ttl_seconds=86400,
+                 max_disk_bytes=100 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Maximum number of results kept in memory
+            disk_dir: Directory for the on-disk tier (None disables it)
+            ttl_seconds: Lifetime of on-disk entries
+            max_disk_bytes: Size budget of the on-disk tier; oldest entries are evicted first
+        """
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            The cached result (a private copy), or None on a miss
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return copy.deepcopy(self._memory[key])
+
+        value = self._read_disk(key)
+        if value is not None:
+            with self._lock:
+                self._counters["disk_hits"] += 1
+                self._store_memory(key, value)
+            return copy.deepcopy(value)
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def set(self, key, value):
+        """
+        Store a result in every enabled tier
+
+        Args:
+            key: Cache key from make_cache_key
+            value: JSON-serializable result
+        """
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._counters["stores"] += 1
+            self._store_memory(key, value)
+        self._write_disk(key, value)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached result for key, computing and storing it on a miss
+
+        Concurrent misses for the same key share a single compute() call.
+
+        Args:
+            key: Cache key from make_cache_key
+            compute: Zero-argument callable producing the result
+
+        Returns:
+            tuple: (result, cached) where cached tells whether the result came
+                   from cache or from another caller's in-flight computation
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value, True
+
+            future, leader = self._flights.join(key)
+            if not leader:
+                try:
+                    return copy.deepcopy(future.result()), True
+                except concurrent.futures.CancelledError:
+                    continue  # The leader gave up - retry (and maybe lead)
+
+            return self._lead(key, future, compute)
+
+    async def aget_or_compute(self, key, compute):
+        """
+        Async variant of get_or_compute
+
+        Args:
+            key: Cache key from make_cache_key
+            compute: Zero-argument callable returning an awaitable result
+
+        Returns:
+            tuple: (result, cached) where cached tells whether the result came
+                   from cache or from another caller's in-flight computation
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value, True
+
+            future, leader = self._flights.join(key)
+            if not leader:
+                try:
+                    return copy.deepcopy(await asyncio.wrap_future(future)), True
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise  # This task itself was cancelled
+                    continue
+
+            return await self._alead(key, future, compute)
+
+    def clear(self):
+        """Drop every entry from both tiers (counters are kept)"""
+        with self._lock:
+            self._memory.clear()
+        if self.disk_dir:
+            for entry in self._disk_entries():
+                self._remove_file(entry.path)
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes"""
+        with self._lock:
+            counters = dict(self._counters)
+            memory_entries = len(self._memory)
+
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+
+        stats = {
+            **counters,
+            "coalesced": self._flights.coalesced,
+            "in_flight": self._flights.in_flight(),
+            "hits": hits,
+            "lookups": lookups,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "max_entries": self.max_entries,
+            "disk_enabled": bool(self.disk_dir),
+        }
+
+        if self.disk_dir:
+            entries = self._disk_entries()
+            stats["disk_entries"] = len(entries)
+            stats["disk_bytes"] = sum(entry.stat().st_size for entry in entries)
+
+        return stats
+
+    # ------------------------------------------------------------------
+    # Single-flight
+    # ------------------------------------------------------------------
+
+    def _landed_meanwhile(self, key):
+        """Catch a result stored between our miss and becoming leader"""
+        with self._lock:
+            if key in self._memory:
+                return copy.deepcopy(self._memory[key])
+        return None
+
+    def _lead(self, key, future, compute):
+        value = self._landed_meanwhile(key)
+        if value is not None:
+            self._flights.land(key, future, value)
+            return value, True
+
+        try:
+            value = compute()
+        except Exception as e:
+            self._flights.land(key, future, error=e)
+            raise
+        except BaseException:
+            self._flights.land(key, future, cancelled=True)
+            raise
+
+        self.set(key, value)
+        self._flights.land(key, future, copy.deepcopy(value))
+        return value, False
+
+    async def _alead(self, key, future, compute):
+        value = self._landed_meanwhile(key)
+        if value is not None:
+            self._flights.land(key, future, value)
+            return value, True
+
+        try:
+            value = await compute()
+        except Exception as e:
+            self._flights.land(key, future, error=e)
+            raise
+        except BaseException:
+            # Cancelled (e.g. client went away) - waiters retry instead of failing
+            self._flights.land(key, future, cancelled=True)
+            raise
+
+        self.set(key, value)
+        self._flights.land(key, future, copy.deepcopy(value))
+        return value, False
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+
+    def _store_memory(self, key, value):
+        """Insert into the LRU tier (caller holds the lock)"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _disk_path(self, key):
+        if not is_valid_key(key):
+            raise ValueError(f"Invalid cache key: {key!r}")
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_entries(self):
+        try:
+            return [entry for entry in os.scandir(self.disk_dir)
+                    if entry.is_file() and entry.name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _read_disk(self, key):
+        if not self.disk_dir or not is_valid_key(key):
+            return None
+
+        path = self._disk_path(key)
+        try:
+            written_at = os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+
+        if time.time() - written_at > self.ttl_seconds:
+            self._remove_file(path)
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            # Corrupt or concurrently removed entry - treat as a miss
+            self._remove_file(path)
+            return None
+
+        # Touch the file so size-based eviction prefers least recently used entries
+        os.utime(path, (time.time(), written_at))
+        return value
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            self._remove_file(tmp_path)
+            return
+
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove expired entries, then least recently used ones until under budget"""
+        now = time.time()
+        live = []
+        for entry in self._disk_entries():
+            info = entry.stat()
+            if now - info.st_mtime > self.ttl_seconds:
+                self._remove_file(entry.path)
+                with self._lock:
+                    self._counters["disk_evictions"] += 1
+            else:
+                live.append((info.st_atime, info.st_size, entry.path))
+
+        total = sum(size for _, size, _ in live)
+        for _, size, path in sorted(live):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove_file(path)
+            total -= size
+            with self._lock:
+                self._counters["disk_evictions"] += 1
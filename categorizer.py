@@ -0,0 +1,233 @@
+"""
+Local rule-based transaction categorizer
+
+Keyword rules (category -> merchant/keyword list) are compiled into a single
+Aho-Corasick automaton, so categorizing a description is one linear scan over
+its characters regardless of how many rules exist. Descriptions that match no
+rule are left for the caller to resolve (e.g. one batched model call).
+
+Matching rules:
+- Descriptions and keywords are normalized to uppercase alphanumerics and single spaces
+- Keywords shorter than EMBEDDED_MIN_LENGTH only match whole words ("ATM" does
+  not match "BATMAN"); longer keywords also match inside words ("SWIGGY" matches
+  "SWIGGYBANGALORE")
+- When several keywords match, the longest wins; ties go to the later rules file
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_rules.json")
+
+EMBEDDED_MIN_LENGTH = 5
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+
+
+def normalize_description(text):
+    """Uppercase and collapse everything but letters/digits to single spaces"""
+    return _NON_ALNUM.sub(" ", str(text).upper()).strip()
+
+
+def load_rules(*paths):
+    """
+    Load and merge rule files
+
+    Args:
+        *paths: JSON files mapping category name to a list of keywords;
+                missing or empty paths are skipped
+
+    Returns:
+        list[tuple]: (category, keyword, priority) with later files at higher priority
+    """
+    rules = []
+    for priority, path in enumerate(paths):
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            mapping = json.load(f)
+        for category, keywords in mapping.items():
+            for keyword in keywords:
+                rules.append((category, keyword, priority))
+    return rules
+
+
+class TransactionCategorizer:
+    """Aho-Corasick keyword index over transaction descriptions"""
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules: Iterable of (category, keyword, priority) tuples
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self.categories = set()
+
+        digest = hashlib.sha256()
+        for category, keyword, priority in rules:
+            normalized = normalize_description(keyword)
+            if not normalized:
+                continue
+            self._add(normalized, category, priority)
+            self.categories.add(category)
+            digest.update(f"{category}|{normalized}|{priority}\n".encode("utf-8"))
+
+        self.signature = f"rules-{digest.hexdigest()[:12]}"
+        self.rule_count = sum(len(outputs) for outputs in self._output)
+        self._build_failure_links()
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "transactions": 0,
+            "resolved_locally": 0,
+            "sent_to_model": 0,
+            "local_seconds": 0.0,
+            "model_calls": 0,
+            "model_seconds": 0.0,
+            "statements": 0,
+            "statements_fully_local": 0,
+        }
+
+    @classmethod
+    def from_files(cls, *paths):
+        """Build a categorizer from the bundled rules plus optional user rule files"""
+        return cls(load_rules(DEFAULT_RULES_FILE, *paths))
+
+    # ------------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------------
+
+    def categorize(self, description):
+        """
+        Categorize one description
+
+        Args:
+            description: Transaction description
+
+        Returns:
+            str: Category name, or None when no rule matches
+        """
+        text = normalize_description(description)
+        best = None
+        state = 0
+
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+
+            for category, length, priority in self._output[state]:
+                if length < EMBEDDED_MIN_LENGTH and not self._is_whole_word(text, index, length):
+                    continue
+                rank = (length, priority)
+                if best is None or rank > best[0]:
+                    best = (rank, category)
+
+        return best[1] if best else None
+
+    def apply(self, transactions):
+        """
+        Fill in 'category' for every transaction a rule matches
+
+        Args:
+            transactions: List of transaction dicts with a 'description'
+
+        Returns:
+            list[dict]: Transactions left uncategorized (for model fallback)
+        """
+        start = time.perf_counter()
+        unmatched = []
+        for txn in transactions:
+            category = self.categorize(txn.get('description', ''))
+            if category is None:
+                unmatched.append(txn)
+            else:
+                txn['category'] = category
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._counters["transactions"] += len(transactions)
+            self._counters["resolved_locally"] += len(transactions) - len(unmatched)
+            self._counters["local_seconds"] += elapsed
+            self._counters["statements"] += 1
+            if not unmatched:
+                self._counters["statements_fully_local"] += 1
+
+        return unmatched
+
+    def record_model_fallback(self, transaction_count, seconds):
+        """Record one batched model call that categorized the leftovers"""
+        with self._lock:
+            self._counters["sent_to_model"] += transaction_count
+            self._counters["model_calls"] += 1
+            self._counters["model_seconds"] += seconds
+
+    def stats(self):
+        """Return local-resolution share and latency figures"""
+        with self._lock:
+            counters = dict(self._counters)
+
+        transactions = counters["transactions"]
+        model_calls = counters["model_calls"]
+        avg_model_call = counters["model_seconds"] / model_calls if model_calls else None
+
+        return {
+            **counters,
+            "rule_count": self.rule_count,
+            "signature": self.signature,
+            "local_share": counters["resolved_locally"] / transactions if transactions else 0.0,
+            "avg_local_microseconds": (
+                1e6 * counters["local_seconds"] / transactions if transactions else 0.0
+            ),
+            "avg_model_call_seconds": avg_model_call,
+            # Each statement resolved entirely by rules skipped one fallback model call
+            "estimated_seconds_saved": (
+                counters["statements_fully_local"] * avg_model_call if avg_model_call else None
+            ),
+        }
+
+    # ------------------------------------------------------------------
+    # Automaton construction
+    # ------------------------------------------------------------------
+
+    def _add(self, keyword, category, priority):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((category, len(keyword), priority))
+
+    def _build_failure_links(self):
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    @staticmethod
+    def _is_whole_word(text, end_index, length):
+        start = end_index - length + 1
+        before_ok = start == 0 or text[start - 1] == " "
+        after_ok = end_index + 1 == len(text) or text[end_index + 1] == " "
+        return before_ok and after_ok
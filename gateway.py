@@ -0,0 +1,414 @@
+"""
+Shared gateway around every upstream model call
+
+- Concurrency limit: at most max_concurrency calls in flight, process-wide
+- Token bucket: at most rate_per_second call starts (bursts up to burst)
+- Retries: retryable errors (429, 408, 5xx, timeouts, connection errors) are
+  retried up to max_retries times with full-jitter exponential backoff,
+  honouring the provider's Retry-After when given. The call slot is released
+  while backing off so waiting retries do not starve other requests.
+- Circuit breaker: after breaker_threshold consecutive retryable failures the
+  breaker opens and calls fail fast with CircuitOpenError; after
+  breaker_reset_seconds one trial call is let through (half-open) and its
+  outcome closes or re-opens the breaker.
+
+Sync callers block on a condition variable; async callers poll with
+asyncio.sleep, so both paths share the same limits.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# openai SDK errors that carry no status code
+RETRYABLE_ERROR_NAMES = {"APITimeoutError", "APIConnectionError"}
+
+ASYNC_POLL_SECONDS = 0.01
+
+
+class GatewayError(Exception):
+    """Model call rejected or failed upstream; carries the HTTP status to answer with"""
+
+    status_code = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(GatewayError):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+
+class QueueTimeoutError(GatewayError):
+    """Raised when no call slot became free within the queue timeout"""
+
+
+class UpstreamError(GatewayError):
+    """Raised when a retryable upstream error persists after all retries"""
+
+    def __init__(self, message, retry_after=None, rate_limited=False):
+        super().__init__(message, retry_after)
+        self.status_code = 429 if rate_limited else 503
+
+
+def error_status(error):
+    """HTTP status carried by an upstream exception, if any"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error):
+    """Whether an upstream exception is worth retrying"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def retry_after_hint(error):
+    """Seconds from a Retry-After header on the upstream response, if present"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ModelGateway:
+    """Concurrency/rate limiter, retry policy and circuit breaker for model calls"""
+
+    def __init__(self, max_concurrency=8, rate_per_second=0.0, burst=None, queue_timeout=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 breaker_threshold=5, breaker_reset_seconds=30.0, on_queue_wait=None, seed=None):
+        """
+        Args:
+            max_concurrency: Maximum calls in flight (0 = unlimited)
+            rate_per_second: Token bucket refill rate (0 = unlimited)
+            burst: Token bucket capacity (defaults to max(1, rate_per_second))
+            queue_timeout: Longest a call waits for a slot before QueueTimeoutError
+            max_retries: Retries after the first attempt for retryable errors
+            backoff_base: First backoff ceiling in seconds (doubles per retry)
+            backoff_max: Backoff ceiling in seconds
+            breaker_threshold: Consecutive retryable failures that open the breaker (0 = never)
+            breaker_reset_seconds: How long the breaker stays open before a trial call
+            on_queue_wait: Optional callback(seconds) for every slot acquisition
+            seed: Seed for the backoff jitter
+        """
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.burst = burst if burst else max(1.0, rate_per_second)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.on_queue_wait = on_queue_wait
+
+        self._rng = random.Random(seed)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+
+        self._breaker_state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_started_at = None
+
+        self._counters = {
+            "attempts": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "rejected_open": 0,
+            "queue_timeouts": 0,
+            "breaker_opened": 0,
+            "queue_wait_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def call(self, func):
+        """
+        Run func() (one upstream call) under the gateway
+
+        Raises:
+            GatewayError: When the breaker is open, no slot frees up in time,
+                          or a retryable error outlives the retries
+        """
+        attempt = 0
+        while True:
+            self._enter_breaker()
+            self._acquire()
+            try:
+                result = func()
+            except Exception as e:
+                delay = self._attempt_failed(e, attempt)
+            else:
+                self._attempt_succeeded()
+                return result
+            finally:
+                self._release()
+
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, func):
+        """Async variant of call: func() returns an awaitable"""
+        attempt = 0
+        while True:
+            self._enter_breaker()
+            await self._aacquire()
+            try:
+                result = await func()
+            except Exception as e:
+                delay = self._attempt_failed(e, attempt)
+            else:
+                self._attempt_succeeded()
+                return result
+            finally:
+                self._release()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stream(self, func):
+        """
+        Iterate func() (a chunk iterator) under the gateway
+
+        The slot is held until the stream ends. Only failures before the
+        first chunk are retried - after that the partial output is already
+        with the caller.
+        """
+        attempt = 0
+        while True:
+            self._enter_breaker()
+            self._acquire()
+            started = False
+            try:
+                for chunk in func():
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                self._attempt_succeeded()
+                raise
+            except Exception as e:
+                if started:
+                    self._record_failure(e)
+                    raise
+                delay = self._attempt_failed(e, attempt)
+            else:
+                self._attempt_succeeded()
+                return
+            finally:
+                self._release()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        """Return limiter, retry and breaker counters"""
+        with self._cond:
+            counters = dict(self._counters)
+            state = self._current_state()
+            snapshot = {
+                "breaker_state": state,
+                "breaker_open": 1 if state == "open" else 0,
+                "consecutive_failures": self._consecutive_failures,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+            }
+
+        return {
+            **snapshot,
+            **counters,
+            "avg_queue_wait_seconds": (
+                counters["queue_wait_seconds"] / counters["attempts"] if counters["attempts"] else 0.0
+            ),
+            "max_concurrency": self.max_concurrency,
+            "rate_per_second": self.rate_per_second,
+        }
+
+    # ------------------------------------------------------------------
+    # Circuit breaker
+    # ------------------------------------------------------------------
+
+    def _current_state(self):
+        if self._breaker_state == "open" and time.monotonic() - self._opened_at >= self.breaker_reset_seconds:
+            return "half_open"
+        return self._breaker_state
+
+    def _trial_available(self):
+        # A trial that never reported back (timed out in the queue, cancelled)
+        # is given up after another reset period
+        return (
+            self._trial_started_at is None
+            or time.monotonic() - self._trial_started_at >= self.breaker_reset_seconds
+        )
+
+    def _enter_breaker(self):
+        with self._cond:
+            state = self._current_state()
+            if state == "half_open" and self._trial_available():
+                self._breaker_state = "half_open"
+                self._trial_started_at = time.monotonic()
+                return
+            if state == "closed":
+                return
+
+            self._counters["rejected_open"] += 1
+            remaining = max(0.0, self._opened_at + self.breaker_reset_seconds - time.monotonic())
+        raise CircuitOpenError(
+            "Model provider is unavailable (circuit breaker open)",
+            retry_after=max(1, round(remaining))
+        )
+
+    def _attempt_succeeded(self):
+        with self._cond:
+            self._counters["succeeded"] += 1
+            self._consecutive_failures = 0
+            self._breaker_state = "closed"
+            self._trial_started_at = None
+
+    def _record_failure(self, error):
+        """Count a failed call; retryable failures feed the breaker. Returns retryable"""
+        retryable = is_retryable(error)
+        with self._cond:
+            self._counters["failed"] += 1
+            self._trial_started_at = None
+            if not retryable:
+                # The upstream answered (e.g. 400) - it is reachable
+                self._consecutive_failures = 0
+                if self._breaker_state == "half_open":
+                    self._breaker_state = "closed"
+                return False
+
+            self._consecutive_failures += 1
+            should_open = self._breaker_state == "half_open" or (
+                self.breaker_threshold and self._consecutive_failures >= self.breaker_threshold
+            )
+            if should_open and self._breaker_state != "open":
+                self._counters["breaker_opened"] += 1
+            if should_open:
+                self._breaker_state = "open"
+                self._opened_at = time.monotonic()
+        return True
+
+    def _attempt_failed(self, error, attempt):
+        """
+        Record a failed attempt and return the backoff before the next one
+
+        Raises:
+            Exception: The original error when it is not retryable
+            UpstreamError: When retries are exhausted or the breaker just opened
+        """
+        if not self._record_failure(error):
+            raise error
+
+        hint = retry_after_hint(error)
+        rate_limited = error_status(error) == 429 or type(error).__name__ == "RateLimitError"
+        if attempt >= self.max_retries:
+            raise UpstreamError(
+                f"Model provider {'rate limit exceeded' if rate_limited else 'unavailable'} "
+                f"after {attempt + 1} attempts: {error}",
+                retry_after=round(hint) if hint else None,
+                rate_limited=rate_limited
+            ) from error
+
+        with self._cond:
+            self._counters["retries"] += 1
+            # Full jitter spreads simultaneous retries apart
+            delay = self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if hint:
+            delay = max(delay, min(hint, self.backoff_max))
+        return delay
+
+    # ------------------------------------------------------------------
+    # Slots (semaphore + token bucket)
+    # ------------------------------------------------------------------
+
+    def _try_take(self):
+        """Take a slot and a token if both are available; else return seconds to wait"""
+        if self.max_concurrency and self._in_flight >= self.max_concurrency:
+            return ASYNC_POLL_SECONDS
+
+        if self.rate_per_second:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_second)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate_per_second
+            self._tokens -= 1
+
+        self._in_flight += 1
+        return 0
+
+    def _acquired(self, waited):
+        self._counters["queue_wait_seconds"] += waited
+        self._counters["max_queue_wait_seconds"] = max(self._counters["max_queue_wait_seconds"], waited)
+        if self.on_queue_wait:
+            self.on_queue_wait(waited)
+
+    def _timed_out(self):
+        self._counters["queue_timeouts"] += 1
+        return QueueTimeoutError(
+            f"No model call slot became free within {self.queue_timeout:g}s",
+            retry_after=max(1, round(self.queue_timeout / 2))
+        )
+
+    def _acquire(self):
+        start = time.monotonic()
+        with self._cond:
+            self._counters["attempts"] += 1
+            self._waiting += 1
+            try:
+                while True:
+                    wait = self._try_take()
+                    if wait == 0:
+                        break
+                    remaining = start + self.queue_timeout - time.monotonic()
+                    if remaining <= 0:
+                        raise self._timed_out()
+                    self._cond.wait(min(wait, remaining))
+            finally:
+                self._waiting -= 1
+            self._acquired(time.monotonic() - start)
+
+    async def _aacquire(self):
+        start = time.monotonic()
+        with self._cond:
+            self._counters["attempts"] += 1
+            self._waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take()
+                    if wait == 0:
+                        self._acquired(time.monotonic() - start)
+                        return
+                    remaining = start + self.queue_timeout - time.monotonic()
+                    if remaining <= 0:
+                        raise self._timed_out()
+                await asyncio.sleep(min(wait, remaining, ASYNC_POLL_SECONDS))
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
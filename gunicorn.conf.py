@@ -0,0 +1,47 @@
+"""
+Gunicorn settings: pre-fork multi-process deployment of the Flask app
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The master imports the app once (preload_app) together with the modules the
+app otherwise loads lazily, then forks the workers. Workers share those
+pages copy-on-write and boot in milliseconds instead of each importing
+LangChain and the provider SDK. Each worker builds its own model client on
+its first model call.
+
+Settings come from the environment:
+- WEB_CONCURRENCY: worker processes (default: CPU count)
+- GUNICORN_THREADS: threads per worker; requests mostly wait on the model or for
+  a request scheduler slot. Keep it well above SCHEDULER_SLOTS so requests queue
+  in the scheduler (by workload and tenant) rather than FIFO for a thread (default 32)
+- GUNICORN_BIND: listen address (default 0.0.0.0:5000)
+- GUNICORN_TIMEOUT: seconds a request may take before its worker is restarted (default 120)
+"""
+
+import gc
+import multiprocessing
+import os
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+preload_app = True
+
+
+def when_ready(server):
+    """Master: load the lazy imports, then freeze the heap before forking"""
+    import app as backend
+    backend.preload_modules()
+    # Objects in the permanent generation are never visited by the collector,
+    # so workers do not write to (and copy) the pages they share with the master
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Worker: drop state that must not be shared with the master"""
+    import app as backend
+    backend.after_fork()
@@ -0,0 +1,161 @@
+"""
+In-process background job queue for long-running statement analyses
+
+Jobs are executed by a fixed pool of worker threads (the work is dominated by
+waiting on the model API, so threads are sufficient and no external broker is
+needed). The queue is bounded: when it is full, submit() raises QueueFullError
+so the API can answer 429 instead of accepting unbounded work.
+"""
+
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class JobQueue:
+    """Bounded FIFO job queue served by a pool of worker threads"""
+
+    def __init__(self, workers=4, max_queued=32, result_ttl_seconds=600):
+        """
+        Args:
+            workers: Number of worker threads
+            max_queued: Maximum number of jobs waiting to start
+            result_ttl_seconds: How long finished jobs remain pollable
+        """
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl_seconds = result_ttl_seconds
+
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._counters = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"job-worker-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) for background execution
+
+        Returns:
+            str: Job id to poll with get()
+
+        Raises:
+            QueueFullError: When max_queued jobs are already waiting
+        """
+        self.start()
+        self._prune()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "state": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+
+        with self._lock:
+            try:
+                self._queue.put_nowait((job_id, func, args, kwargs))
+            except queue.Full:
+                self._counters["rejected"] += 1
+                raise QueueFullError(f"Job queue is full ({self.max_queued} jobs waiting)")
+            self._jobs[job_id] = job
+            self._counters["submitted"] += 1
+
+        return job_id
+
+    def get(self, job_id):
+        """
+        Return a snapshot of a job, or None if unknown or expired
+
+        Args:
+            job_id: Id returned by submit()
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+
+        if snapshot["state"] == "queued":
+            snapshot["queue_position"] = self._queue_position(job_id)
+        return snapshot
+
+    def stats(self):
+        """Return queue depth and lifetime counters"""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["state"] == "running")
+            return {
+                **self._counters,
+                "queued": self._queue.qsize(),
+                "running": running,
+                "workers": self.workers,
+                "max_queued": self.max_queued,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _queue_position(self, job_id):
+        with self._queue.mutex:
+            for position, (queued_id, *_rest) in enumerate(self._queue.queue):
+                if queued_id == job_id:
+                    return position
+        return 0
+
+    def _work(self):
+        while True:
+            job_id, func, args, kwargs = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    job["state"] = "running"
+                    job["started_at"] = time.time()
+
+            try:
+                result = func(*args, **kwargs)
+                update = {"state": "succeeded", "result": result}
+                counter = "succeeded"
+            except Exception as e:
+                update = {"state": "failed", "error": str(e)}
+                counter = "failed"
+
+            with self._lock:
+                if job is not None:
+                    job.update(update)
+                    job["finished_at"] = time.time()
+                self._counters[counter] += 1
+
+            self._queue.task_done()
+
+    def _prune(self):
+        """Forget finished jobs older than the result TTL"""
+        cutoff = time.time() - self.result_ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished_at"] is not None and job["finished_at"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
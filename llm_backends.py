@@ -0,0 +1,377 @@
+"""
+Pluggable chat model backends
+
+The backend is selected by configuration (LLM_BACKEND):
+- openai: ChatOpenAI (default, needs OPENAI_API_KEY)
+- stub:   StubChatModel, an offline deterministic model for load tests,
+          profiling and local development without a key or spend
+
+The stub is a regular LangChain chat model, so invoke/ainvoke/stream behave
+exactly as they do for the real client. It counts tokens (about 4 characters
+each, text parts only) and reports the prompt prefix a provider-side prompt
+cache would have served as cache_read input tokens.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+BACKENDS = ("openai", "stub")
+
+
+class StubModelError(Exception):
+    """Failure injected by StubChatModel (stands in for an upstream API error)"""
+
+    # Treated like a provider 503, so gateway retries and the breaker see it
+    status_code = 503
+
+
+# ============================================================================
+# CANNED RESPONSES
+# ============================================================================
+
+STUB_STATEMENT = {
+    "customer_name": "MR. STUB CUSTOMER",
+    "card_account_number": "4375 XXXX XXXX 8007",
+    "statement_date": "23/04/2018",
+    "total_amount_due": "₹ 8,795.59",
+    "minimum_amount_due": "₹ 6,620.00",
+    "due_date": "11/05/2018"
+}
+
+STUB_TRANSACTIONS = [
+    {"date": "27/03/2018", "description": "ATM CASH WDL MUMBAI", "amount": 3000.0, "category": "Cash Withdrawal"},
+    {"date": "29/03/2018", "description": "AMAZON PAY INDIA", "amount": 1899.0, "category": "Shopping"},
+    {"date": "02/04/2018", "description": "SWIGGY BANGALORE", "amount": 645.5, "category": "Dining"},
+    {"date": "05/04/2018", "description": "ZOMATO ONLINE ORDER", "amount": 420.0, "category": "Dining"},
+    {"date": "09/04/2018", "description": "AIRTEL POSTPAID BILL", "amount": 799.0, "category": "Bills"},
+    {"date": "12/04/2018", "description": "FINANCE CHARGES", "amount": 312.09, "category": "Interest"},
+    {"date": "15/04/2018", "description": "PAYMENT RECEIVED - THANK YOU", "amount": -5000.0, "category": "Transfer"},
+    {"date": "20/04/2018", "description": "CORNER STREET VENDOR 221", "amount": 250.0, "category": "Other"},
+]
+
+REPAIR_PROMPT = "Your previous reply could not be used"
+PREVIOUS_REPLY = re.compile(r"^Previous reply:\n(?P<reply>.*)", re.MULTILINE | re.DOTALL)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+CATEGORY_LINE = re.compile(r"^- (?P<category>.+?): INR (?P<amount>[\d,]+\.\d+)", re.MULTILINE)
+NUMBERED_LINE = re.compile(r"^\d+\. ", re.MULTILINE)
+
+# Token accounting and the simulated provider prompt cache (OpenAI-style: prefixes
+# of at least prefix_cache_min_tokens, matched in 128-token blocks)
+CHARS_PER_TOKEN = 4
+PREFIX_CACHE_BLOCK_TOKENS = 128
+PREFIX_CACHE_MAX_ENTRIES = 100000
+
+
+def _message_text(messages):
+    """Concatenate the text parts of every message"""
+    parts = []
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(part.get("text", "") for part in content if isinstance(part, dict))
+    return "\n".join(parts)
+
+
+def _statement_analysis(include_categories):
+    transactions = [dict(txn) for txn in STUB_TRANSACTIONS]
+    if not include_categories:
+        for txn in transactions:
+            del txn["category"]
+    debits = sum(txn["amount"] for txn in STUB_TRANSACTIONS if txn["amount"] > 0)
+    credits = -sum(txn["amount"] for txn in STUB_TRANSACTIONS if txn["amount"] < 0)
+    return {
+        "card_account_number": STUB_STATEMENT["card_account_number"],
+        "statement_date": STUB_STATEMENT["statement_date"],
+        "total_debits": round(debits, 2),
+        "total_credits": round(credits, 2),
+        "closing_balance": round(debits - credits, 2),
+        "transactions": transactions
+    }
+
+
+def _recommendations(prompt):
+    """Derive proportionate recommendations from the category lines in the prompt"""
+    recommendations = []
+    for match in CATEGORY_LINE.finditer(prompt):
+        category = match.group("category")
+        current = float(match.group("amount").replace(",", ""))
+        reduction = 10.0 if category in ("Bills", "Interest") else 25.0
+        saving = round(current * reduction / 100, 2)
+        recommendations.append({
+            "category": category,
+            "current_spending": current,
+            "reduction_percentage": reduction,
+            "amount_to_save": saving,
+            "new_spending": round(current - saving, 2),
+            "advice": f"You spent INR {current:,.2f} on {category}. Try trimming it by {reduction:.0f}% "
+                      f"this month - that alone saves INR {saving:,.2f}."
+        })
+    return {
+        "recommendations": recommendations,
+        "total_savings": round(sum(rec["amount_to_save"] for rec in recommendations), 2)
+    }
+
+
+def malformed(text):
+    """Corrupt a JSON reply the way free-form model output breaks: chatter and a trailing comma"""
+    return f"Sure! Here is the data you asked for:\n{text.rstrip()[:-1].rstrip()},\n}}\nLet me know if you need anything else."
+
+
+def _repaired(prompt):
+    """Fix the quoted reply of a repair prompt (undoes malformed())"""
+    match = PREVIOUS_REPLY.search(prompt)
+    reply = match.group("reply") if match else "{}"
+    reply = reply[reply.find("{"):reply.rfind("}") + 1]
+    return TRAILING_COMMA.sub(r"\1", reply)
+
+
+def canned_response(messages):
+    """
+    Pick the canned JSON matching the prompt that was sent
+
+    Args:
+        messages: Chat messages sent to the model
+
+    Returns:
+        str: JSON response text
+    """
+    prompt = _message_text(messages)
+
+    if prompt.startswith(REPAIR_PROMPT):
+        return _repaired(prompt)
+    if prompt.startswith("Categorize each"):
+        count = len(NUMBERED_LINE.findall(prompt))
+        return json.dumps({"categories": ["Other"] * count})
+    if "closing_balance" in prompt:
+        statement = _statement_analysis(include_categories='"category"' in prompt)
+        if "customer_name" in prompt:
+            # Unified extraction also asks for the statement header
+            statement = dict(STUB_STATEMENT, **statement)
+        return json.dumps(statement)
+    if "customer_name" in prompt:
+        return json.dumps(STUB_STATEMENT)
+    return json.dumps(_recommendations(prompt), indent=2)
+
+
+# ============================================================================
+# STUB MODEL
+# ============================================================================
+
+class StubChatModel(BaseChatModel):
+    """Offline chat model returning canned JSON with injectable latency, failures and malformed replies"""
+
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    failure_rate: float = 0.0
+    malformed_rate: float = 0.0
+    stream_chunk_size: int = 16
+    prefix_cache_min_tokens: int = 1024
+    seed: Optional[int] = None
+    model_name: str = "stub"
+
+    _rng: Any = PrivateAttr(default=None)
+    _rng_lock: Any = PrivateAttr(default=None)
+    _prefixes: Any = PrivateAttr(default=None)
+    _prefix_lock: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+        self._prefixes = OrderedDict()
+        self._prefix_lock = threading.Lock()
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    # ------------------------------------------------------------------
+    # Simulation
+    # ------------------------------------------------------------------
+
+    def _draw(self):
+        """Return (delay, should_fail, is_malformed) for one call"""
+        with self._rng_lock:
+            jitter = self._rng.uniform(-self.latency_jitter, self.latency_jitter)
+            should_fail = self._rng.random() < self.failure_rate
+            is_malformed = self._rng.random() < self.malformed_rate
+        return max(0.0, self.latency + jitter), should_fail, is_malformed
+
+    def _cached_tokens(self, prompt):
+        """
+        Leading prompt tokens a provider prompt cache would serve, remembering
+        this prompt's prefixes for later calls
+
+        Args:
+            prompt: Prompt text
+
+        Returns:
+            int: Cached input tokens (0, or prefix_cache_min_tokens plus whole blocks)
+        """
+        if self.prefix_cache_min_tokens <= 0:
+            return 0
+
+        digest = hashlib.sha1()
+        position = cached = 0
+        matching = True
+        with self._prefix_lock:
+            for boundary in range(self.prefix_cache_min_tokens, len(prompt) // CHARS_PER_TOKEN + 1,
+                                  PREFIX_CACHE_BLOCK_TOKENS):
+                end = boundary * CHARS_PER_TOKEN
+                digest.update(prompt[position:end].encode("utf-8"))
+                position = end
+                key = digest.hexdigest()
+                if key in self._prefixes:
+                    self._prefixes.move_to_end(key)
+                    if matching:
+                        cached = boundary
+                else:
+                    matching = False
+                    self._prefixes[key] = None
+            while len(self._prefixes) > PREFIX_CACHE_MAX_ENTRIES:
+                self._prefixes.popitem(last=False)
+        return cached
+
+    def _message(self, messages, is_malformed=False):
+        text = canned_response(messages)
+        prompt = _message_text(messages)
+        # Repair replies are always clean, so one repair call fixes a malformed reply
+        if is_malformed and not prompt.startswith(REPAIR_PROMPT):
+            text = malformed(text)
+        input_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+        output_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+        usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": self._cached_tokens(prompt)}
+        }
+        return text, usage
+
+    # ------------------------------------------------------------------
+    # BaseChatModel hooks
+    # ------------------------------------------------------------------
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, should_fail, is_malformed = self._draw()
+        time.sleep(delay)
+        if should_fail:
+            raise StubModelError("Stub model injected failure")
+
+        text, usage = self._message(messages, is_malformed)
+        message = AIMessage(content=text, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, should_fail, is_malformed = self._draw()
+        await asyncio.sleep(delay)
+        if should_fail:
+            raise StubModelError("Stub model injected failure")
+
+        text, usage = self._message(messages, is_malformed)
+        message = AIMessage(content=text, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, should_fail, is_malformed = self._draw()
+        text, usage = self._message(messages, is_malformed)
+        pieces = [text[i:i + self.stream_chunk_size] for i in range(0, len(text), self.stream_chunk_size)]
+
+        # Spread the latency across the stream like a real token stream
+        time.sleep(delay / 2)
+        if should_fail:
+            raise StubModelError("Stub model injected failure")
+
+        for index, piece in enumerate(pieces):
+            time.sleep(delay / 2 / max(1, len(pieces)))
+            is_last = index == len(pieces) - 1
+            chunk = AIMessageChunk(content=piece, usage_metadata=usage if is_last else None)
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+
+# ============================================================================
+# FACTORY
+# ============================================================================
+
+def create_llm(backend, model_name, api_key=None, stub_latency=0.0, stub_latency_jitter=0.0,
+               stub_failure_rate=0.0, stub_seed=None, stub_malformed_rate=0.0,
+               stub_prefix_cache_min_tokens=1024):
+    """
+    Build the chat model for the configured backend
+
+    Args:
+        backend: "openai" or "stub"
+        model_name: Model name (reported by the stub, used by OpenAI)
+        api_key: OpenAI API key
+        stub_latency: Stub round-trip latency in seconds
+        stub_latency_jitter: Uniform +/- jitter added to the stub latency
+        stub_failure_rate: Probability (0-1) that a stub call raises StubModelError
+        stub_seed: Seed for the stub's jitter/failure draws
+        stub_malformed_rate: Probability (0-1) that a stub reply is malformed JSON
+        stub_prefix_cache_min_tokens: Shortest prompt prefix the stub's simulated
+                                      provider cache serves (0 disables it)
+
+    Returns:
+        BaseChatModel: Chat model instance
+    """
+    backend = (backend or "openai").strip().lower()
+    model_class = backend_class(backend)
+
+    if backend == "stub":
+        return model_class(
+            latency=stub_latency,
+            latency_jitter=stub_latency_jitter,
+            failure_rate=stub_failure_rate,
+            malformed_rate=stub_malformed_rate,
+            prefix_cache_min_tokens=stub_prefix_cache_min_tokens,
+            seed=stub_seed,
+            model_name=model_name
+        )
+
+    return model_class(
+        model=model_name,
+        temperature=0,
+        openai_api_key=api_key,
+        # Retries are owned by the model gateway (gateway.py)
+        max_retries=0
+    )
+
+
+def backend_class(backend):
+    """
+    Chat model class of a backend, importing its SDK without building a client
+
+    Args:
+        backend: "openai" or "stub"
+
+    Returns:
+        type: BaseChatModel subclass
+    """
+    backend = (backend or "openai").strip().lower()
+
+    if backend == "stub":
+        return StubChatModel
+
+    if backend == "openai":
+        # The provider SDK is the slowest import of the app - load it only when used
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI
+
+    raise ValueError(f"Unknown LLM backend: {backend}. Allowed: {', '.join(BACKENDS)}")
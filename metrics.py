@@ -0,0 +1,352 @@
+"""
+Per-stage latency instrumentation and Prometheus metrics
+
+Each request gets a RequestTrace stored in a context variable. span() times
+one pipeline stage (upload read, preprocessing, encode, model call, parse,
+aggregation, ...) into a histogram and into the active trace. Context
+variables follow asyncio tasks and asyncio.to_thread, so the async path is
+traced the same way as the sync one.
+
+Model responses additionally record token counts (from usage_metadata,
+including input tokens served from the provider's prompt cache) and
+request/response payload sizes. Requests slower than the configured
+threshold are logged with their per-stage breakdown.
+
+Everything is exposed in the Prometheus text format by render().
+"""
+
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+BYTE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000)
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def message_payload_bytes(messages):
+    """Approximate request payload size: text plus inline (base64) image URLs"""
+    total = 0
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            total += len(content.encode("utf-8"))
+            continue
+        for part in content:
+            if not isinstance(part, dict):
+                continue
+            if part.get("type") == "image_url":
+                total += len(part["image_url"]["url"])
+            else:
+                total += len(part.get("text", "").encode("utf-8"))
+    return total
+
+
+# ============================================================================
+# METRIC TYPES
+# ============================================================================
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus format"""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    "counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0
+                }
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: dict(series, counts=list(series["counts"]))
+                        for labels, series in sorted(self._series.items())}
+
+        for labels, series in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series["counts"]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{label_text} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in Prometheus format"""
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        """Current value of one labelled series (0 when never incremented)"""
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class GaugeSet:
+    """Gauges read from a stats() snapshot at scrape time (numeric values only)"""
+
+    def __init__(self, prefix, documentation, collect):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.collect = collect
+
+    def render(self):
+        lines = []
+        for key, value in self.collect().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            lines.append(f"# HELP {name} {self.documentation}: {key}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+        return lines
+
+
+# ============================================================================
+# REQUEST TRACES
+# ============================================================================
+
+class RequestTrace:
+    """Per-request accumulation of stage timings and model usage"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.duration = None
+        self.deferred = False
+        self.stages = {}
+        self.tokens = {"input": 0, "cached_input": 0, "output": 0}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        # Batch items run on worker threads that share one trace
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_tokens(self, kind, count):
+        with self._lock:
+            self.tokens[kind] += count
+
+    def breakdown(self):
+        """Stage timings in milliseconds, slowest first"""
+        with self._lock:
+            ordered = sorted(self.stages.items(), key=lambda item: item[1], reverse=True)
+        return {stage: round(seconds * 1000, 1) for stage, seconds in ordered}
+
+
+class PipelineMetrics:
+    """Stage spans, model usage and request latency for the statement pipeline"""
+
+    def __init__(self, slow_request_seconds=5.0):
+        """
+        Args:
+            slow_request_seconds: Requests slower than this are logged with their
+                                  stage breakdown (0 disables the log)
+        """
+        self.slow_request_seconds = slow_request_seconds
+
+        self.request_seconds = Histogram(
+            "cardmgmt_request_duration_seconds", "End-to-end request latency",
+            ("endpoint", "status"), LATENCY_BUCKETS
+        )
+        self.stage_seconds = Histogram(
+            "cardmgmt_stage_duration_seconds", "Latency of one pipeline stage",
+            ("stage",), LATENCY_BUCKETS
+        )
+        self.model_tokens = Histogram(
+            "cardmgmt_model_tokens", "Tokens per model call",
+            ("call", "kind"), TOKEN_BUCKETS
+        )
+        self.model_payload_bytes = Histogram(
+            "cardmgmt_model_payload_bytes", "Model request/response payload size",
+            ("call", "direction"), BYTE_BUCKETS
+        )
+        self.slow_requests = Counter(
+            "cardmgmt_slow_requests_total", "Requests slower than the slow-request threshold",
+            ("endpoint",)
+        )
+        self.extraction_paths = Counter(
+            "cardmgmt_extraction_path_total", "Statement extractions by the path that produced them",
+            ("call", "path")
+        )
+        self.model_parses = Counter(
+            "cardmgmt_model_parse_total", "Model replies by parse outcome (ok, repaired, failed)",
+            ("call", "outcome")
+        )
+        self._metrics = [
+            self.request_seconds, self.stage_seconds, self.model_tokens,
+            self.model_payload_bytes, self.slow_requests, self.extraction_paths,
+            self.model_parses
+        ]
+
+    def register(self, metric):
+        """Add another metric (anything with render()) to the exposition"""
+        self._metrics.append(metric)
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def start_request(self, endpoint):
+        """Begin tracing a request in the current context"""
+        trace = RequestTrace(endpoint)
+        _current_trace.set(trace)
+        return trace
+
+    def detach(self):
+        """Stop attributing stages in the current context to any request"""
+        _current_trace.set(None)
+
+    def finish_request(self, trace, status):
+        """Record the request latency and log it when it was slow"""
+        trace.duration = time.perf_counter() - trace.started
+        self.request_seconds.observe(trace.duration, trace.endpoint, str(status))
+
+        if self.slow_request_seconds and trace.duration >= self.slow_request_seconds:
+            self.slow_requests.inc(trace.endpoint)
+            logger.warning(
+                "Slow request %s (status %s) took %.3fs - stages (ms): %s, tokens: %s",
+                trace.endpoint, status, trace.duration, trace.breakdown(), trace.tokens
+            )
+        return trace
+
+    def traced_stream(self, trace, status, events):
+        """
+        Iterate a streaming response body inside its request trace
+
+        The trace is finished when the stream ends instead of when the view returns.
+        """
+        _current_trace.set(trace)
+        try:
+            yield from events
+        finally:
+            self.finish_request(trace, status)
+            _current_trace.set(None)
+
+    # ------------------------------------------------------------------
+    # Stages and model calls
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def span(self, stage):
+        """Time a pipeline stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def observe_stage(self, stage, seconds):
+        self.stage_seconds.observe(seconds, stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(stage, seconds)
+
+    def observe_model_call(self, call, messages, response):
+        """
+        Record token counts and payload sizes of one model call
+
+        Args:
+            call: Call name (e.g. extract, analyze, categorize, recommend)
+            messages: Messages sent to the model
+            response: AIMessage (or merged AIMessageChunk) returned
+        """
+        self.model_payload_bytes.observe(message_payload_bytes(messages), call, "request")
+        self.model_payload_bytes.observe(len(str(response.content).encode("utf-8")), call, "response")
+
+        usage = dict(getattr(response, "usage_metadata", None) or {})
+        usage["cached_input_tokens"] = (usage.get("input_token_details") or {}).get("cache_read")
+        trace = _current_trace.get()
+        for kind, key in (("input", "input_tokens"), ("cached_input", "cached_input_tokens"),
+                          ("output", "output_tokens")):
+            if usage.get(key) is None:
+                continue
+            self.model_tokens.observe(usage[key], call, kind)
+            if trace is not None:
+                trace.add_tokens(kind, usage[key])
+
+    def observe_parse(self, call, outcome):
+        """
+        Count the parse outcome of a model reply
+
+        Args:
+            call: analyze, analyze_text or recommend
+            outcome: ok, repaired (after one repair call) or failed
+        """
+        self.model_parses.inc(call, outcome)
+
+    def observe_extraction_path(self, call, path):
+        """
+        Count which path produced a statement extraction
+
+        Args:
+            call: extract or analyze
+            path: text_parse, text_model or vision
+        """
+        self.extraction_paths.inc(call, path)
+
+    # ------------------------------------------------------------------
+    # Exposition
+    # ------------------------------------------------------------------
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
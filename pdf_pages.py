@@ -0,0 +1,187 @@
+"""
+Local rasterization of multi-page PDF statements
+
+Each page is rendered to an image with pdfium so it can go through the same
+preprocessing and vision extraction as an uploaded photo. Pages that cannot
+carry statement data are dropped before any model call:
+- blank pages (uniform after rendering)
+- pages whose text layer has no amounts at all (terms and conditions, ads)
+
+Scanned pages have no text layer and are always kept unless blank.
+
+Bank-generated (digital) PDFs carry a text layer; read_text() returns it
+without rendering anything, for the text-only fast path.
+"""
+
+import re
+import threading
+from contextlib import contextmanager
+
+import pypdfium2 as pdfium
+
+
+PDF_SIGNATURE = b"%PDF-"
+
+# 1,234.56 / 1234.56 / 1.234,56 - anything that looks like a printed amount
+AMOUNT_PATTERN = re.compile(r"\d[\d,.]*[.,]\d{2}\b")
+
+# A text layer shorter than this (non-whitespace characters) is treated as absent
+TEXT_LAYER_MIN_CHARS = 200
+
+# pdfium is not thread-safe - serialize document access across request threads
+_pdfium_lock = threading.Lock()
+
+
+class PdfError(ValueError):
+    """The upload is not a readable PDF statement"""
+
+
+def is_pdf(data):
+    """Check the PDF magic bytes of an upload"""
+    return data[:1024].lstrip().startswith(PDF_SIGNATURE)
+
+
+class RenderedPage:
+    """One rasterized page and what its text layer says about it"""
+
+    def __init__(self, number, page_count, image, text):
+        self.number = number
+        self.page_count = page_count
+        self.image = image
+        self.text = text
+
+    @property
+    def has_text_layer(self):
+        return bool(self.text.strip())
+
+
+class PdfRasterizer:
+    """Render PDF pages to images and pick the pages worth extracting"""
+
+    def __init__(self, dpi=150, max_pages=20, grayscale=True, max_edge=0, blank_threshold=8):
+        """
+        Args:
+            dpi: Render resolution (150 keeps statement print legible)
+            max_pages: Larger documents are rejected
+            grayscale: Render single-channel pages
+            max_edge: Render large pages at a lower resolution so their longest
+                      edge fits (0 = always use dpi); avoids rendering pixels
+                      that preprocessing would throw away
+            blank_threshold: Pages whose darkest and lightest pixels differ by
+                             less than this are treated as blank
+        """
+        self.dpi = dpi
+        self.max_pages = max_pages
+        self.grayscale = grayscale
+        self.max_edge = max_edge
+        self.blank_threshold = blank_threshold
+
+    @property
+    def signature(self):
+        """Stable description of the settings (part of result cache keys)"""
+        return f"pdf-{self.dpi}dpi-e{self.max_edge}-{'gray' if self.grayscale else 'color'}"
+
+    def read_text(self, pdf_bytes):
+        """
+        Return the text layer of a PDF, without rendering any page
+
+        Args:
+            pdf_bytes: Raw PDF upload
+
+        Returns:
+            str: Text of every page in order, or None
+                 when the PDF has no usable text layer (scanned statements)
+
+        Raises:
+            PdfError: The PDF cannot be opened, is empty or has too many pages
+        """
+        with self._open(pdf_bytes) as document:
+            texts = []
+            for index in range(len(document)):
+                page = document[index]
+                try:
+                    textpage = page.get_textpage()
+                    texts.append(textpage.get_text_range())
+                    textpage.close()
+                finally:
+                    page.close()
+
+        # pdfium separates lines with CRLF
+        text = "\n".join("\n".join(page_text.splitlines()) for page_text in texts)
+        if len(re.sub(r"\s", "", text)) < TEXT_LAYER_MIN_CHARS or not AMOUNT_PATTERN.search(text):
+            return None
+        return text
+
+    def render(self, pdf_bytes):
+        """
+        Rasterize every page that may carry statement data
+
+        Args:
+            pdf_bytes: Raw PDF upload
+
+        Returns:
+            list[RenderedPage]: Pages in document order (never empty)
+
+        Raises:
+            PdfError: The PDF cannot be opened, is empty or has too many pages
+        """
+        with self._open(pdf_bytes) as document:
+            page_count = len(document)
+            pages = [self._render_page(document, index, page_count) for index in range(page_count)]
+
+        selected = [page for page in pages if self._may_carry_data(page)]
+        # Never send nothing - let the model decide on the first page
+        return selected or pages[:1]
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _open(self, pdf_bytes):
+        """Open a PDF under the pdfium lock and check its page count"""
+        with _pdfium_lock:
+            try:
+                document = pdfium.PdfDocument(pdf_bytes)
+            except pdfium.PdfiumError as e:
+                raise PdfError(f"Could not read PDF: {e}") from e
+
+            try:
+                page_count = len(document)
+                if page_count == 0:
+                    raise PdfError("PDF has no pages")
+                if page_count > self.max_pages:
+                    raise PdfError(f"PDF has {page_count} pages. Maximum: {self.max_pages}")
+                yield document
+            finally:
+                document.close()
+
+    def _render_page(self, document, index, page_count):
+        page = document[index]
+        try:
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+            finally:
+                textpage.close()
+
+            # PDF units are points (1/72 inch)
+            scale = self.dpi / 72
+            if self.max_edge:
+                scale = min(scale, self.max_edge / max(page.get_size()))
+            bitmap = page.render(scale=scale, grayscale=self.grayscale)
+            # Copy out of pdfium's buffer before the bitmap is released
+            image = bitmap.to_pil().copy()
+            bitmap.close()
+        finally:
+            page.close()
+
+        return RenderedPage(index + 1, page_count, image, text)
+
+    def _may_carry_data(self, page):
+        low, high = page.image.convert("L").getextrema()
+        if high - low < self.blank_threshold:
+            return False
+        if page.has_text_layer and not AMOUNT_PATTERN.search(page.text):
+            return False
+        return True
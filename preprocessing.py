@@ -0,0 +1,214 @@
+"""
+Image preprocessing stage applied before statements are sent to the vision model
+
+Uploads are re-encoded to keep image tokens and request bytes down:
+- Optional auto-crop of uniform page margins
+- Grayscale conversion (statements carry no information in colour)
+- Downscale so the longest edge fits a configurable limit
+- Re-encode to an efficient format with the matching MIME type
+
+JPEG uploads that will be downscaled are decoded at reduced size (and
+straight to grayscale) so a phone photo never exists in memory at full
+resolution.
+"""
+
+import io
+import math
+
+from PIL import Image, ImageChops, ImageOps
+
+
+FORMAT_MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+def detect_mime_type(image_bytes):
+    """
+    Detect the MIME type of image bytes from their signature
+
+    Args:
+        image_bytes: Raw image bytes
+
+    Returns:
+        str: MIME type (defaults to image/png when unknown)
+    """
+    if image_bytes.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+
+class ImagePreprocessor:
+    """Configurable downscale / grayscale / crop / re-encode pipeline"""
+
+    def __init__(self, enabled=True, max_edge=1600, grayscale=True, output_format="WEBP",
+                 quality=85, autocrop=False, crop_threshold=24, crop_padding=12):
+        """
+        Args:
+            enabled: When False, uploads pass through untouched
+            max_edge: Longest allowed edge in pixels (0 disables downscaling)
+            grayscale: Convert to single-channel grayscale
+            output_format: PNG, JPEG or WEBP
+            quality: Encoder quality for lossy formats
+            autocrop: Trim uniform margins around the statement
+            crop_threshold: Minimum difference from the margin colour counted as content
+            crop_padding: Pixels of margin kept around the detected content
+        """
+        output_format = output_format.upper()
+        if output_format == "JPG":
+            output_format = "JPEG"
+        if output_format not in FORMAT_MIME_TYPES:
+            raise ValueError(
+                f"Unsupported output format: {output_format}. "
+                f"Allowed: {', '.join(FORMAT_MIME_TYPES)}"
+            )
+
+        self.enabled = enabled
+        self.max_edge = max_edge
+        self.grayscale = grayscale
+        self.output_format = output_format
+        self.quality = quality
+        self.autocrop = autocrop
+        self.crop_threshold = crop_threshold
+        self.crop_padding = crop_padding
+
+    @property
+    def signature(self):
+        """Stable description of the settings (part of result cache keys)"""
+        if not self.enabled:
+            return "raw"
+        return (
+            f"{self.output_format}-q{self.quality}-e{self.max_edge}"
+            f"-{'gray' if self.grayscale else 'color'}"
+            f"-{'crop' if self.autocrop else 'nocrop'}"
+        )
+
+    def process(self, image_bytes):
+        """
+        Run the pipeline over an uploaded image
+
+        Falls back to the original bytes when the image cannot be decoded or
+        when re-encoding would not make it smaller.
+
+        Args:
+            image_bytes: Raw uploaded image bytes
+
+        Returns:
+            tuple: (image bytes, MIME type)
+        """
+        if not self.enabled:
+            return image_bytes, detect_mime_type(image_bytes)
+
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as source:
+                original_size = self._draft(source)
+                ImageOps.exif_transpose(source, in_place=True)
+                image = source
+                image = self._transform(image)
+                processed = self._encode(image)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return image_bytes, detect_mime_type(image_bytes)
+
+        if len(processed) >= len(image_bytes) and image.size in (original_size, original_size[::-1]):
+            return image_bytes, detect_mime_type(image_bytes)
+
+        return processed, FORMAT_MIME_TYPES[self.output_format]
+
+    def process_image(self, image):
+        """
+        Run the pipeline over an already decoded image (e.g. a rendered PDF page)
+
+        Args:
+            image: PIL image
+
+        Returns:
+            tuple: (image bytes, MIME type)
+        """
+        if not self.enabled:
+            # There are no original bytes to pass through - send a lossless PNG
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            return buffer.getvalue(), "image/png"
+
+        return self._encode(self._transform(image)), FORMAT_MIME_TYPES[self.output_format]
+
+    # ------------------------------------------------------------------
+    # Pipeline steps
+    # ------------------------------------------------------------------
+
+    def _draft(self, image):
+        """
+        Configure the JPEG decoder to scale down (by 2, 4 or 8) and convert while decoding
+
+        Never scales below the size the image is downscaled to anyway. Skipped
+        with autocrop, whose crop is measured at full resolution.
+
+        Returns:
+            tuple: Size of the image before drafting
+        """
+        original_size = image.size
+        if image.format != "JPEG" or self.autocrop:
+            return original_size
+
+        scale = min(1.0, self.max_edge / max(original_size)) if self.max_edge else 1.0
+        if scale < 1.0 or self.grayscale:
+            image.draft(
+                "L" if self.grayscale else None,
+                (math.ceil(original_size[0] * scale), math.ceil(original_size[1] * scale))
+            )
+        return original_size
+
+    def _transform(self, image):
+        image = self._flatten(image)
+
+        if self.autocrop:
+            image = self._crop_margins(image)
+
+        if self.max_edge and max(image.size) > self.max_edge:
+            image = image.copy()
+            image.thumbnail((self.max_edge, self.max_edge), Image.Resampling.LANCZOS)
+
+        return image
+
+    def _flatten(self, image):
+        """Drop alpha (onto white) and convert to the target colour mode"""
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+            image = Image.alpha_composite(background, image)
+
+        return image.convert("L" if self.grayscale else "RGB")
+
+    def _crop_margins(self, image):
+        """Trim borders that match the top-left pixel colour"""
+        background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+        difference = ImageChops.difference(image, background).convert("L")
+        mask = difference.point(lambda value: 255 if value > self.crop_threshold else 0)
+        bbox = mask.getbbox()
+        if not bbox:
+            return image
+
+        left, top, right, bottom = bbox
+        pad = self.crop_padding
+        bbox = (
+            max(0, left - pad),
+            max(0, top - pad),
+            min(image.width, right + pad),
+            min(image.height, bottom + pad),
+        )
+        return image.crop(bbox)
+
+    def _encode(self, image):
+        buffer = io.BytesIO()
+        if self.output_format == "WEBP":
+            options = {"quality": self.quality, "method": 4}
+        elif self.output_format == "JPEG":
+            options = {"quality": self.quality, "optimize": True}
+        else:
+            options = {"optimize": True}
+        image.save(buffer, format=self.output_format, **options)
+        return buffer.getvalue()
@@ -0,0 +1,203 @@
+"""
+Recommendation templates shared between similar spending profiles
+
+Recommendations depend on the shape of the spending (which categories, in
+what proportions) and the reduction target far more than on the exact
+amounts. Profiles are normalized into a key - the category set, each
+category's share of spending rounded to a bucket of share_step percentage
+points, and the reduction percentage - and the recommendations of the first
+statement with that profile are stored as templates:
+
+- each recommendation keeps its category, reduction percentage and advice
+- every currency amount in the advice is stored as a fraction of that
+  category's spending
+
+A later statement with the same profile gets the templates re-scaled to its
+own numbers locally (amount_to_save, new_spending and the amounts quoted in
+the advice) instead of a model call. Its total savings is the sum of the
+re-scaled amount_to_save values, so the two always agree. Entries are
+evicted least recently used.
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict
+
+
+# Currency amounts quoted in advice text ("INR 1,250.00", "Rs. 300", "₹750")
+AMOUNT = re.compile(r"(?P<prefix>(?:INR|Rs\.?|₹)\s?)(?P<amount>\d[\d,]*(?:\.\d+)?)")
+
+
+def advice_template(advice, base):
+    """
+    Turn advice text into a template whose amounts are fractions of base
+
+    Args:
+        advice: Advice text from the model
+        base: Spending the amounts relate to (the category's current spending)
+
+    Returns:
+        tuple: (format string, [(fraction, grouped, decimals)] per amount)
+    """
+    amounts = []
+
+    def placeholder(match):
+        text = match.group("amount")
+        value = float(text.replace(",", ""))
+        decimals = len(text.split(".")[1]) if "." in text else 0
+        # Amounts under 1,000 do not show whether the model groups digits - assume it does
+        amounts.append((value / base, "," in text or value < 1000, decimals))
+        return f"{match.group('prefix')}{{{len(amounts) - 1}}}"
+
+    template = AMOUNT.sub(placeholder, advice.replace("{", "{{").replace("}", "}}"))
+    return template, amounts
+
+
+def render_advice(template, amounts, base):
+    """Fill an advice template with amounts scaled to base"""
+    values = [
+        format(fraction * base, f"{',' if grouped else ''}.{decimals}f")
+        for fraction, grouped, decimals in amounts
+    ]
+    return template.format(*values)
+
+
+class RecommendationCache:
+    """LRU cache of recommendation templates keyed on a normalized spending profile"""
+
+    def __init__(self, max_entries=1024, share_step=10.0, signature=""):
+        """
+        Args:
+            max_entries: Profiles kept before the least recently used is evicted
+            share_step: Width of a category share bucket in percentage points;
+                        larger steps match more statements with coarser advice
+            signature: Model/prompt version the recommendations came from
+                       (part of every key)
+        """
+        self.max_entries = max_entries
+        self.share_step = share_step
+        self.signature = signature
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def profile_key(self, breakdown):
+        """
+        Normalized profile of a spending breakdown
+
+        Args:
+            breakdown: Result of compute_spending_breakdown
+
+        Returns:
+            str: Cache key, or None when there is no spending to normalize
+        """
+        current_spending = breakdown['current_spending']
+        if not current_spending or not breakdown['sorted_categories']:
+            return None
+
+        # Half-up, not round(): banker's rounding sends exact midpoints (25%, 35%
+        # with 10-point steps) to uneven buckets
+        buckets = ",".join(
+            f"{category}={math.floor(amount / current_spending * 100 / self.share_step + 0.5)}"
+            for category, amount in sorted(breakdown['sorted_categories'])
+        )
+        return f"{self.signature}|{float(breakdown['reduction_percentage']):g}|{buckets}"
+
+    def get(self, breakdown):
+        """
+        Recommendations for a breakdown, re-scaled from a stored profile
+
+        Args:
+            breakdown: Result of compute_spending_breakdown
+
+        Returns:
+            dict: ReductionRecommendations data, or None on a miss
+        """
+        key = self.profile_key(breakdown)
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+
+        spending = dict(breakdown['sorted_categories'])
+        recommendations = []
+        for item in entry['recommendations']:
+            current = round(spending[item['category']], 2)
+            amount_to_save = round(current * item['reduction_percentage'] / 100, 2)
+            recommendations.append({
+                "category": item['category'],
+                "current_spending": current,
+                "reduction_percentage": item['reduction_percentage'],
+                "amount_to_save": amount_to_save,
+                "new_spending": round(current - amount_to_save, 2),
+                "advice": render_advice(item['advice'], item['amounts'], current)
+            })
+
+        return {
+            "recommendations": recommendations,
+            "total_savings": round(sum(item['amount_to_save'] for item in recommendations), 2)
+        }
+
+    def set(self, breakdown, recommendations):
+        """
+        Store the recommendations for a breakdown as templates
+
+        Recommendations for categories the breakdown does not contain are
+        dropped; nothing is stored when none is left.
+
+        Args:
+            breakdown: Result of compute_spending_breakdown
+            recommendations: ReductionRecommendations data from the model
+        """
+        key = self.profile_key(breakdown)
+        if key is None:
+            return
+
+        spending = dict(breakdown['sorted_categories'])
+        templates = []
+        for recommendation in recommendations.get('recommendations') or []:
+            base = spending.get(recommendation.get('category'))
+            if not base:
+                continue
+            template, amounts = advice_template(str(recommendation.get('advice', '')), base)
+            templates.append({
+                "category": recommendation['category'],
+                "reduction_percentage": float(recommendation.get('reduction_percentage') or 0),
+                "advice": template,
+                "amounts": amounts
+            })
+        if not templates:
+            return
+
+        with self._lock:
+            self._entries[key] = {"recommendations": templates}
+            self._entries.move_to_end(key)
+            self._counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self):
+        """Drop every stored profile"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored profiles"""
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "lookups": lookups,
+            "hit_rate": (counters["hits"] / lookups) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "share_step": self.share_step,
+        }
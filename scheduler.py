@@ -0,0 +1,347 @@
+"""
+Priority- and tenant-aware admission of model-bound requests
+
+Requests are admitted to at most max_active slots. Requests that find no free
+slot wait in a queue per workload class (e.g. "extract", "analyze"), and the
+queue a freed slot goes to is chosen by weight:
+
+- Classes: stride scheduling. Every admission advances its class's pass by
+  1/weight and the backlogged class with the lowest pass goes next, so with
+  weights extract=4, analyze=1 four extractions are admitted for every
+  analysis while both are waiting. A class that was idle re-joins at the
+  current pass instead of spending credit saved up while it had no traffic.
+- Reservations: reserved[class] slots are never given to other classes while
+  that class holds fewer, so a spike of long analyses cannot occupy every slot
+  and cheap extractions always have somewhere to run.
+- Tenants: within a class every tenant (API key) has its own FIFO and the
+  tenants are served round robin, so one tenant's burst queues behind its own
+  requests rather than everyone's.
+
+Waiting is bounded: a full queue (overall or for the tenant) is rejected at
+once with SchedulerQueueFullError (429), and a request still waiting after
+queue_timeout seconds gets SchedulerTimeoutError (503). Both are
+GatewayErrors, so the views answer them like any other upstream limit.
+
+Sync callers block on a condition variable; async callers poll with
+asyncio.sleep, so both paths share the same slots.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+from gateway import GatewayError
+
+
+ASYNC_POLL_SECONDS = 0.01
+
+
+class SchedulerQueueFullError(GatewayError):
+    """Raised when the scheduler queue (overall or for the tenant) is full"""
+
+    status_code = 429
+
+
+class SchedulerTimeoutError(GatewayError):
+    """Raised when a request was not admitted within the queue timeout"""
+
+
+def parse_class_settings(value, cast=float):
+    """
+    Parse "extract=4,analyze=1" into {"extract": 4.0, "analyze": 1.0}
+
+    Raises:
+        ValueError: When an entry is not name=value
+    """
+    settings = {}
+    for entry in (value or "").split(","):
+        if not entry.strip():
+            continue
+        name, separator, setting = entry.partition("=")
+        if not separator or not name.strip():
+            raise ValueError(f"Expected name=value, got {entry.strip()!r}")
+        settings[name.strip()] = cast(setting)
+    return settings
+
+
+class Ticket:
+    """One request waiting for (or holding) a scheduler slot"""
+
+    __slots__ = ("workload", "tenant", "enqueued_at", "granted")
+
+    def __init__(self, workload, tenant):
+        self.workload = workload
+        self.tenant = tenant
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class RequestScheduler:
+    """Weighted fair queueing of requests across workload classes and tenants"""
+
+    def __init__(self, max_active=8, weights=None, reserved=None, max_queued=256,
+                 max_queued_per_tenant=64, queue_timeout=30.0, default_tenant="anonymous",
+                 on_queue_wait=None):
+        """
+        Args:
+            max_active: Requests admitted at once
+            weights: Share of freed slots per class while several are waiting
+                     (classes not listed weigh 1)
+            reserved: Slots per class that other classes may not take
+            max_queued: Requests waiting across all classes (0 = unlimited)
+            max_queued_per_tenant: Requests one tenant may have waiting (0 = unlimited)
+            queue_timeout: Longest a request waits before SchedulerTimeoutError
+            default_tenant: Tenant of requests without an API key
+            on_queue_wait: Optional callback(workload, seconds) for every admission
+        """
+        self.max_active = max_active
+        self.weights = dict(weights or {})
+        self.reserved = dict(reserved or {})
+        self.max_queued = max_queued
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.queue_timeout = queue_timeout
+        self.default_tenant = default_tenant
+        self.on_queue_wait = on_queue_wait
+
+        if sum(self.reserved.values()) >= max_active:
+            raise ValueError("Reserved slots must leave at least one shared slot")
+
+        self._cond = threading.Condition()
+        # class -> OrderedDict(tenant -> deque of tickets); the first tenant is served next
+        self._queues = {}
+        self._queued_by_tenant = {}
+        self._queued = 0
+        self._active = {}
+        self._pass = {}
+        self._virtual_time = 0.0
+        self._counters = {}
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def acquire(self, workload, tenant=None):
+        """
+        Wait for a slot
+
+        Returns:
+            Ticket: Pass to release() when the request is done
+
+        Raises:
+            SchedulerQueueFullError: When the queue has no room for the request
+            SchedulerTimeoutError: When no slot was granted within the queue timeout
+        """
+        with self._cond:
+            ticket = self._enqueue(workload, tenant)
+            while not ticket.granted:
+                remaining = ticket.enqueued_at + self.queue_timeout - time.monotonic()
+                if remaining <= 0:
+                    raise self._timed_out(ticket)
+                self._cond.wait(remaining)
+        self._admitted(ticket)
+        return ticket
+
+    async def aacquire(self, workload, tenant=None):
+        """Async variant of acquire"""
+        with self._cond:
+            ticket = self._enqueue(workload, tenant)
+        try:
+            while True:
+                with self._cond:
+                    if ticket.granted:
+                        break
+                    remaining = ticket.enqueued_at + self.queue_timeout - time.monotonic()
+                    if remaining <= 0:
+                        raise self._timed_out(ticket)
+                await asyncio.sleep(min(remaining, ASYNC_POLL_SECONDS))
+        except asyncio.CancelledError:
+            # Client went away: give the slot (or the place in the queue) back
+            with self._cond:
+                if ticket.granted:
+                    self._release(ticket)
+                else:
+                    self._dequeue(ticket)
+            raise
+        self._admitted(ticket)
+        return ticket
+
+    def release(self, ticket):
+        """Give a slot back and admit whoever is next"""
+        with self._cond:
+            self._release(ticket)
+
+    @contextmanager
+    def slot(self, workload, tenant=None):
+        """Hold a slot for the duration of a with block"""
+        ticket = self.acquire(workload, tenant)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, workload, tenant=None):
+        """Async variant of slot"""
+        ticket = await self.aacquire(workload, tenant)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """Return active/queued requests and admission counters per class"""
+        with self._cond:
+            workloads = sorted(set(self._queues) | set(self._active) | set(self._counters))
+            per_class = {}
+            for workload in workloads:
+                counters = dict(self._counters.get(workload) or self._new_counters())
+                queued = sum(len(tickets) for tickets in self._queues.get(workload, {}).values())
+                per_class[workload] = {
+                    "active": self._active.get(workload, 0),
+                    "queued": queued,
+                    **counters,
+                    "avg_queue_wait_seconds": (
+                        counters["queue_wait_seconds"] / counters["admitted"] if counters["admitted"] else 0.0
+                    ),
+                    "weight": self._weight(workload),
+                    "reserved": self.reserved.get(workload, 0),
+                }
+            tenants = len(self._queued_by_tenant)
+
+        flat = {}
+        for workload, values in per_class.items():
+            for key, value in values.items():
+                flat[f"{workload}_{key}"] = value
+        return {
+            "active": sum(values["active"] for values in per_class.values()),
+            "queued": sum(values["queued"] for values in per_class.values()),
+            "queued_tenants": tenants,
+            "max_active": self.max_active,
+            **flat,
+        }
+
+    # ------------------------------------------------------------------
+    # Queueing
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _new_counters():
+        return {
+            "admitted": 0,
+            "rejected": 0,
+            "queue_timeouts": 0,
+            "queue_wait_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+        }
+
+    def _count(self, workload):
+        if workload not in self._counters:
+            self._counters[workload] = self._new_counters()
+        return self._counters[workload]
+
+    def _weight(self, workload):
+        return self.weights.get(workload, 1.0)
+
+    def _enqueue(self, workload, tenant):
+        """Queue a ticket and run the dispatcher (caller holds the lock)"""
+        tenant = tenant or self.default_tenant
+        if self.max_queued and self._queued >= self.max_queued:
+            self._count(workload)["rejected"] += 1
+            raise SchedulerQueueFullError(
+                "Server is busy: too many requests are waiting", retry_after=self._retry_after()
+            )
+        if self.max_queued_per_tenant and self._queued_by_tenant.get(tenant, 0) >= self.max_queued_per_tenant:
+            self._count(workload)["rejected"] += 1
+            raise SchedulerQueueFullError(
+                "Too many requests waiting for this API key", retry_after=self._retry_after()
+            )
+
+        tenants = self._queues.setdefault(workload, OrderedDict())
+        if not tenants:
+            # Re-join at the current pass: idle time earns no credit
+            self._pass[workload] = max(self._pass.get(workload, 0.0), self._virtual_time)
+        ticket = Ticket(workload, tenant)
+        tenants.setdefault(tenant, deque()).append(ticket)
+        self._queued += 1
+        self._queued_by_tenant[tenant] = self._queued_by_tenant.get(tenant, 0) + 1
+        self._dispatch()
+        return ticket
+
+    def _dequeue(self, ticket):
+        """Remove a waiting ticket from its queue (caller holds the lock)"""
+        tenants = self._queues[ticket.workload]
+        tickets = tenants[ticket.tenant]
+        tickets.remove(ticket)
+        if not tickets:
+            del tenants[ticket.tenant]
+        self._queued -= 1
+        self._queued_by_tenant[ticket.tenant] -= 1
+        if not self._queued_by_tenant[ticket.tenant]:
+            del self._queued_by_tenant[ticket.tenant]
+
+    def _eligible(self, workload):
+        """Whether a free slot may go to workload without eating another class's reservation"""
+        active = sum(self._active.values())
+        if active >= self.max_active:
+            return False
+        held_back = sum(
+            max(0, slots - self._active.get(other, 0))
+            for other, slots in self.reserved.items() if other != workload
+        )
+        return self.max_active - active > held_back
+
+    def _dispatch(self):
+        """Grant free slots to waiting tickets, lowest pass first (caller holds the lock)"""
+        granted = False
+        while True:
+            candidates = [
+                workload for workload, tenants in self._queues.items()
+                if tenants and self._eligible(workload)
+            ]
+            if not candidates:
+                break
+            workload = min(candidates, key=lambda name: self._pass[name])
+            tenants = self._queues[workload]
+
+            # Round robin: serve the first tenant, then move it to the back
+            tenant, tickets = next(iter(tenants.items()))
+            ticket = tickets[0]
+            self._dequeue(ticket)
+            if tenant in tenants:
+                tenants.move_to_end(tenant)
+
+            self._virtual_time = self._pass[workload]
+            self._pass[workload] += 1.0 / self._weight(workload)
+            self._active[workload] = self._active.get(workload, 0) + 1
+            ticket.granted = True
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _release(self, ticket):
+        self._active[ticket.workload] -= 1
+        self._dispatch()
+
+    def _admitted(self, ticket):
+        waited = time.monotonic() - ticket.enqueued_at
+        with self._cond:
+            counters = self._count(ticket.workload)
+            counters["admitted"] += 1
+            counters["queue_wait_seconds"] += waited
+            counters["max_queue_wait_seconds"] = max(counters["max_queue_wait_seconds"], waited)
+        if self.on_queue_wait:
+            self.on_queue_wait(ticket.workload, waited)
+
+    def _retry_after(self):
+        return max(1, round(self.queue_timeout / 2))
+
+    def _timed_out(self, ticket):
+        """Drop a ticket that waited too long and build its error (caller holds the lock)"""
+        self._dequeue(ticket)
+        self._count(ticket.workload)["queue_timeouts"] += 1
+        return SchedulerTimeoutError(
+            f"Request was not scheduled within {self.queue_timeout:g}s",
+            retry_after=self._retry_after()
+        )
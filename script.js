@@ -174,6 +174,7 @@ const analyzeResultContent = document.getElementById('analyzeResultContent');
 const analyzeError = document.getElementById('analyzeError');
 
 let analyzeFile = null;
+let analysisId = null; // Returned by /api/analyze; lets us re-plan without re-uploading
 
 // Upload zone click handler
 analyzeUploadZone.addEventListener('click', () => {
@@ -207,6 +208,7 @@ analyzeUploadZone.addEventListener('drop', (e) => {
 analyzeRemoveBtn.addEventListener('click', (e) => {
     e.stopPropagation();
     analyzeFile = null;
+    analysisId = null;
     analyzeFileInput.value = '';
     analyzePreview.style.display = 'none';
     analyzeUploadZone.querySelector('.upload-content').style.display = 'block';
@@ -235,18 +237,38 @@ analyzeBtn.addEventListener('click', async () => {
     analyzeBtn.disabled = true;
 
     try {
-        const formData = new FormData();
-        formData.append('image', analyzeFile);
-        formData.append('reduction_percentage', percentage);
+        let result = null;
+
+        // Same statement, new target: only recompute recommendations
+        if (analysisId) {
+            const response = await fetch(`${API_BASE_URL}/api/replan`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ analysis_id: analysisId, reduction_percentage: percentage })
+            });
+
+            if (response.status === 404) {
+                analysisId = null; // Expired on the server - fall back to a full analysis
+            } else {
+                result = await response.json();
+            }
+        }
 
-        const response = await fetch(`${API_BASE_URL}/api/analyze`, {
-            method: 'POST',
-            body: formData
-        });
+        if (!result) {
+            const formData = new FormData();
+            formData.append('image', analyzeFile);
+            formData.append('reduction_percentage', percentage);
 
-        const result = await response.json();
+            const response = await fetch(`${API_BASE_URL}/api/analyze`, {
+                method: 'POST',
+                body: formData
+            });
+
+            result = await response.json();
+        }
 
         if (result.status === 'success') {
+            analysisId = result.analysis_id || null;
             displayAnalyzeResults(result.data);
         } else {
             showAnalyzeError(result.message);
@@ -270,6 +292,7 @@ function handleAnalyzeFile(file) {
     }
 
     analyzeFile = file;
+    analysisId = null;
 
     // Show preview
     const reader = new FileReader();
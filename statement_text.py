@@ -0,0 +1,185 @@
+"""
+Deterministic parsing of statement text layers
+
+Bank-generated PDFs carry their text, so the statement header, summary and
+transaction table can often be read with a few label and line patterns
+instead of a model call. The parsers are deliberately strict: they return
+None unless every field was found and (for transactions) the parsed rows add
+up to the printed totals, so a partial parse never masquerades as a result.
+"""
+
+import re
+
+from store import normalize_date
+
+
+AMOUNT = r"-?(?:₹|Rs\.?|INR|\$)?\s?-?\d{1,3}(?:,\d{2,3})*\.\d{2}|-?(?:₹|Rs\.?|INR|\$)?\s?-?\d+\.\d{2}"
+MONTH = r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*"
+DATE = (rf"\d{{1,2}}[/.-]\d{{1,2}}[/.-]\d{{2,4}}"
+        rf"|\d{{1,2}}[ -]{MONTH}[ -,]*\d{{2,4}}"
+        rf"|\d{{1,2}}[ -]{MONTH}\b"
+        rf"|\d{{1,2}}/\d{{1,2}}")
+MASKED_CARD = r"\d{4}[ -]?[Xx*]{4}[ -]?[Xx*]{4}[ -]?\d{4}"
+
+HEADER_LABELS = {
+    "customer_name": ("Customer Name", "Card Holder Name", "Cardholder Name"),
+    "card_account_number": ("Card Account Number", "Card Number", "Card No", "Account Number"),
+    "statement_date": ("Statement Date",),
+    "total_amount_due": ("Total Amount Due", "Total Dues", "Total Due"),
+    "minimum_amount_due": ("Minimum Amount Due", "Minimum Due", "Min. Amount Due"),
+    "due_date": ("Payment Due Date", "Due Date"),
+}
+
+SUMMARY_LABELS = {
+    "total_debits": ("Total Debits", "Purchases & Other Charges", "Purchase & Other Charges",
+                     "Purchases/Debits", "Total Purchases"),
+    "total_credits": ("Total Credits", "Payments & Other Credits", "Payment & Other Credits",
+                      "Payments/Credits", "Total Payments"),
+    "closing_balance": ("Closing Balance", "Total Outstanding", "Total Dues", "Total Amount Due"),
+}
+
+TRANSACTION_LINE = re.compile(
+    rf"^\s*(?P<date>{DATE})\s+(?P<description>\S.*?)\s+(?P<amount>{AMOUNT})\s*(?P<marker>Cr|CR|Dr|DR)?\s*$"
+)
+
+# Summary rows that look like transactions in some layouts
+NOT_TRANSACTIONS = re.compile(r"opening balance|closing balance|previous balance|total", re.IGNORECASE)
+
+NAME = re.compile(r"^[ \t]*(?:MR|MRS|MS|MISS|DR)\.?[ \t]+[A-Z][A-Za-z.' ]+$", re.MULTILINE)
+
+
+def parse_amount(text):
+    """Parse a printed amount ('₹ 1,23,456.78', '-45.00') into a float"""
+    value = float(re.search(r"\d[\d,]*\.\d{2}", text).group(0).replace(",", ""))
+    return -value if "-" in text else value
+
+
+def printed_date(text):
+    """DD/MM/YYYY when the printed date has a year, otherwise the text as printed"""
+    iso = normalize_date(text)
+    if iso is None:
+        return text.strip()
+    year, month, day = iso.split("-")
+    return f"{day}/{month}/{year}"
+
+
+def find_labeled(text, labels, value_pattern):
+    """
+    Find the value printed after the first matching label
+
+    Args:
+        text: Statement text
+        labels: Label spellings, most specific first
+        value_pattern: Regex for the value (same or next line after the label)
+
+    Returns:
+        str: The value as printed, or None
+    """
+    for label in labels:
+        match = re.search(
+            rf"\b{re.escape(label)}\b\s*[:\-]?\s*(?P<value>{value_pattern})",
+            text, re.IGNORECASE | re.MULTILINE
+        )
+        if match:
+            return match.group("value").strip()
+    return None
+
+
+def parse_statement_header(text):
+    """
+    Read the CreditCardStatement fields from a statement text layer
+
+    Args:
+        text: Text of every page
+
+    Returns:
+        dict: CreditCardStatement data, or None when any field is missing
+    """
+    header = {
+        "customer_name": find_labeled(text, HEADER_LABELS["customer_name"], r"[A-Z][A-Za-z.' ]+?(?=\s*$|\s{2,})"),
+        "card_account_number": find_labeled(text, HEADER_LABELS["card_account_number"], MASKED_CARD),
+        "statement_date": find_labeled(text, HEADER_LABELS["statement_date"], DATE),
+        "total_amount_due": find_labeled(text, HEADER_LABELS["total_amount_due"], AMOUNT),
+        "minimum_amount_due": find_labeled(text, HEADER_LABELS["minimum_amount_due"], AMOUNT),
+        "due_date": find_labeled(text, HEADER_LABELS["due_date"], DATE),
+    }
+
+    if header["customer_name"] is None:
+        match = NAME.search(text)
+        header["customer_name"] = match.group(0).strip() if match else None
+    if header["card_account_number"] is None:
+        match = re.search(MASKED_CARD, text)
+        header["card_account_number"] = match.group(0) if match else None
+
+    if any(value is None for value in header.values()):
+        return None
+
+    for field in ("statement_date", "due_date"):
+        header[field] = printed_date(header[field])
+    return header
+
+
+def parse_transactions(text):
+    """
+    Read transaction rows (date, description, amount[, Cr]) from a text layer
+
+    Returns:
+        list[dict]: Transactions with date, description and signed amount
+    """
+    transactions = []
+    for line in text.splitlines():
+        match = TRANSACTION_LINE.match(line)
+        if not match or NOT_TRANSACTIONS.search(match.group("description")):
+            continue
+        amount = parse_amount(match.group("amount"))
+        if (match.group("marker") or "").upper() == "CR":
+            amount = -abs(amount)
+        transactions.append({
+            "date": match.group("date"),
+            "description": match.group("description").strip(),
+            "amount": amount,
+        })
+    return transactions
+
+
+def parse_statement_analysis(text, tolerance=1.0):
+    """
+    Read the statement summary and transaction table from a text layer
+
+    Args:
+        text: Text of every page
+        tolerance: Allowed difference between the printed totals and the
+                   sum of the parsed transactions
+
+    Returns:
+        dict: ExtractedStatement data (transactions without categories), or
+              None when a summary field is missing or the rows do not add up
+    """
+    summary = {}
+    for field, labels in SUMMARY_LABELS.items():
+        value = find_labeled(text, labels, AMOUNT)
+        if value is None:
+            return None
+        summary[field] = parse_amount(value)
+
+    transactions = parse_transactions(text)
+    if not transactions:
+        return None
+
+    debits = sum(txn["amount"] for txn in transactions if txn["amount"] > 0)
+    credits = -sum(txn["amount"] for txn in transactions if txn["amount"] < 0)
+    if abs(debits - summary["total_debits"]) > tolerance or abs(credits - summary["total_credits"]) > tolerance:
+        return None
+
+    statement_date = find_labeled(text, HEADER_LABELS["statement_date"], DATE)
+    account = find_labeled(text, HEADER_LABELS["card_account_number"], MASKED_CARD)
+    if account is None:
+        match = re.search(MASKED_CARD, text)
+        account = match.group(0) if match else None
+
+    return {
+        "card_account_number": account,
+        "statement_date": printed_date(statement_date) if statement_date else None,
+        **summary,
+        "transactions": transactions,
+    }
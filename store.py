@@ -0,0 +1,630 @@
+"""
+SQLite store for extracted statements and their transactions
+
+Every statement extracted by the analysis pipeline is persisted once (keyed by
+its analysis id), so history and analytics questions are answered from local
+indexed tables instead of re-uploading and re-extracting images.
+
+Dates are normalized to ISO 8601 (YYYY-MM-DD) so range queries use the
+indexes directly. Transactions without their own date take the statement date.
+
+Ingestion is incremental: every transaction is fingerprinted (ISO date,
+normalized description, amount, and how many identical rows came before it
+on the same statement) and only rows whose fingerprint the account has not
+seen yet are stored. Overlapping screenshots and carried-over rows on
+consecutive statements are therefore counted once, and the running
+per-category totals in category_totals are updated from the new rows only.
+statement_transactions links every row printed on a statement to its stored
+transaction, so a statement still lists all of its rows. Statements without
+a card account number are stored in full - their rows are not matched
+against anyone's history.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statements (
+    id INTEGER PRIMARY KEY,
+    analysis_id TEXT NOT NULL UNIQUE,
+    account TEXT,
+    statement_date TEXT,
+    total_debits REAL,
+    total_credits REAL,
+    closing_balance REAL,
+    transaction_count INTEGER NOT NULL,
+    new_transaction_count INTEGER,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    statement_id INTEGER NOT NULL REFERENCES statements(id) ON DELETE CASCADE,
+    account TEXT,
+    txn_date TEXT,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT,
+    merchant TEXT,
+    fingerprint TEXT
+);
+
+CREATE TABLE IF NOT EXISTS statement_transactions (
+    statement_id INTEGER NOT NULL REFERENCES statements(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    transaction_id INTEGER NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
+    PRIMARY KEY (statement_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS category_totals (
+    account TEXT NOT NULL,
+    category TEXT NOT NULL,
+    debits REAL NOT NULL,
+    credits REAL NOT NULL,
+    transaction_count INTEGER NOT NULL,
+    PRIMARY KEY (account, category)
+);
+
+CREATE INDEX IF NOT EXISTS idx_statements_account_date ON statements(account, statement_date);
+CREATE INDEX IF NOT EXISTS idx_statements_date ON statements(statement_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions(account, txn_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_category_date ON transactions(account, category, txn_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_category_date ON transactions(category, txn_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(txn_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_statement ON transactions(statement_id);
+"""
+
+# Created after _migrate has added the fingerprint column to older databases.
+# Transactions without an account are never deduplicated: there is no telling
+# whose history they belong to
+FINGERPRINT_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_account_fingerprint
+    ON transactions(account, fingerprint) WHERE account IS NOT NULL AND fingerprint IS NOT NULL;
+"""
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d-%m-%y",
+                "%d %b %Y", "%d %B %Y", "%d-%b-%Y", "%d-%b-%y", "%b %d, %Y", "%B %d, %Y")
+
+# Statement rows often print dates without a year ("23 Apr", "23/04")
+YEARLESS_FORMATS = ("%d %b", "%d %B", "%d-%b", "%d/%m", "%d-%m")
+
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+_WORDS = re.compile(r"[A-Z0-9]+")
+
+MAX_PAGE_SIZE = 1000
+
+# Fingerprints per "IN (...)" lookup (SQLite's bound-parameter limit is 999 on older builds)
+LOOKUP_CHUNK = 500
+
+
+def normalize_date(text, reference=None):
+    """
+    Normalize a printed date to YYYY-MM-DD
+
+    Args:
+        text: Date as printed on the statement
+        reference: ISO statement date used to fill in a missing year
+
+    Returns:
+        str: ISO date, or None when the text is not a recognizable date
+    """
+    if not text:
+        return None
+    text = re.sub(r"\s+", " ", str(text)).strip()
+
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+
+    if reference:
+        ref = date.fromisoformat(reference)
+        for fmt in YEARLESS_FORMATS:
+            try:
+                parsed = datetime.strptime(f"{text} {ref.year}", f"{fmt} %Y").date()
+            except ValueError:
+                continue
+            # A December transaction on a January statement belongs to the previous year
+            if parsed > ref:
+                parsed = parsed.replace(year=ref.year - 1)
+            return parsed.isoformat()
+
+    return None
+
+
+def normalize_account(text):
+    """Collapse whitespace so the same card always maps to one account key"""
+    if not text:
+        return None
+    return re.sub(r"\s+", " ", str(text)).strip().upper()
+
+
+def merchant_key(description):
+    """Group descriptions by merchant: uppercase words, without reference/card numbers"""
+    return " ".join(filter(str.isalpha, _WORDS.findall(str(description).upper()))) or "UNKNOWN"
+
+
+def normalize_description(description):
+    """Uppercase words and numbers only, so spacing and punctuation differences match"""
+    return " ".join(_WORDS.findall(str(description).upper()))
+
+
+def transaction_fingerprint(txn_date, description, amount, occurrence=0):
+    """
+    Hash identifying one transaction of an account across statements
+
+    Args:
+        txn_date: ISO transaction date (or None)
+        description: Description as printed
+        amount: Signed amount
+        occurrence: Identical rows before this one on the same statement, so
+                    two equal purchases on one day stay two transactions
+    """
+    key = f"{txn_date or ''}|{normalize_description(description)}|{float(amount):.2f}|{occurrence}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def fingerprint_rows(statement_data):
+    """
+    Normalized rows of a StatementAnalysis with their fingerprints
+
+    Returns:
+        list: (txn_date, description, amount, category, fingerprint) per transaction
+    """
+    statement_date = normalize_date(statement_data.get('statement_date'))
+    seen = {}
+    rows = []
+    for txn in statement_data.get('transactions', []):
+        txn_date = normalize_date(txn.get('date'), statement_date) or statement_date
+        description = txn.get('description', '')
+        amount = float(txn.get('amount', 0.0))
+        identity = (txn_date, normalize_description(description), round(amount, 2))
+        occurrence = seen.get(identity, 0)
+        seen[identity] = occurrence + 1
+        rows.append((
+            txn_date, description, amount, txn.get('category'),
+            transaction_fingerprint(txn_date, description, amount, occurrence)
+        ))
+    return rows
+
+
+def is_iso_date(text):
+    """Check that a query parameter is a YYYY-MM-DD date"""
+    if not text or not ISO_DATE.fullmatch(text):
+        return False
+    try:
+        date.fromisoformat(text)
+    except ValueError:
+        return False
+    return True
+
+
+class StatementStore:
+    """Persisted statements and transactions with indexed history queries"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: SQLite database file (":memory:" keeps it in memory for tests)
+        """
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._memory_connection = None
+
+        if path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+
+        with self._write_lock:
+            connection = self._connection()
+            connection.executescript(SCHEMA)
+            self._migrate(connection)
+            connection.executescript(FINGERPRINT_INDEX)
+            self._backfill_category_totals(connection)
+            self._backfill_statement_transactions(connection)
+
+    def reset_connections(self):
+        """Forget connections inherited from a parent process (pre-fork servers call this in each worker)"""
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def save_analysis(self, analysis_id, statement_data):
+        """
+        Persist an extracted StatementAnalysis (no-op when already stored)
+
+        Only transactions the account has not seen before are stored and
+        added to the running category totals (every transaction when the
+        statement has no card account number). Each row on the statement is
+        linked to its stored transaction, new or not.
+
+        Args:
+            analysis_id: Cache key of the analysis (unique per image/prompt/model)
+            statement_data: Extracted StatementAnalysis dict
+
+        Returns:
+            dict: 'new_transactions' and 'duplicate_transactions' counts, or
+                  None when the statement was already stored
+        """
+        account = normalize_account(statement_data.get('card_account_number'))
+        statement_date = normalize_date(statement_data.get('statement_date'))
+        rows = fingerprint_rows(statement_data)
+
+        connection = self._connection()
+        with self._write_lock, connection:
+            cursor = connection.execute(
+                """INSERT OR IGNORE INTO statements
+                   (analysis_id, account, statement_date, total_debits,
+                    total_credits, closing_balance, transaction_count, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    analysis_id, account, statement_date,
+                    statement_data.get('total_debits'), statement_data.get('total_credits'),
+                    statement_data.get('closing_balance'), len(rows), time.time()
+                )
+            )
+            if cursor.rowcount == 0:
+                return None
+
+            statement_id = cursor.lastrowid
+            totals = {}
+            links = []
+            for position, (txn_date, description, amount, category, fingerprint) in enumerate(rows):
+                # The unique fingerprint index skips rows the account already has
+                cursor = connection.execute(
+                    """INSERT OR IGNORE INTO transactions
+                       (statement_id, account, txn_date, description, amount, category, merchant, fingerprint)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        statement_id, account, txn_date, description, amount,
+                        category, merchant_key(description), fingerprint
+                    )
+                )
+                if cursor.rowcount:
+                    transaction_id = cursor.lastrowid
+                    debits, credits, count = totals.get(category or "Other", (0.0, 0.0, 0))
+                    totals[category or "Other"] = (
+                        debits + max(amount, 0.0), credits + max(-amount, 0.0), count + 1
+                    )
+                else:
+                    transaction_id = connection.execute(
+                        "SELECT id FROM transactions WHERE account = ? AND fingerprint = ?",
+                        (account, fingerprint)
+                    ).fetchone()[0]
+                links.append((statement_id, position, transaction_id))
+
+            new_count = sum(count for _, _, count in totals.values())
+            connection.execute(
+                "UPDATE statements SET new_transaction_count = ? WHERE id = ?", (new_count, statement_id)
+            )
+            connection.executemany(
+                "INSERT INTO statement_transactions (statement_id, position, transaction_id) VALUES (?, ?, ?)",
+                links
+            )
+            connection.executemany(
+                """INSERT INTO category_totals (account, category, debits, credits, transaction_count)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (account, category) DO UPDATE SET
+                       debits = debits + excluded.debits,
+                       credits = credits + excluded.credits,
+                       transaction_count = transaction_count + excluded.transaction_count""",
+                [
+                    (account or "", category, debits, credits, count)
+                    for category, (debits, credits, count) in totals.items()
+                ]
+            )
+        return {"new_transactions": new_count, "duplicate_transactions": len(rows) - new_count}
+
+    def known_categories(self, statement_data):
+        """
+        Stored categories of the transactions an account has already seen
+
+        Args:
+            statement_data: Extracted StatementAnalysis dict
+
+        Returns:
+            list: Stored category per transaction (None for new transactions,
+                  and for every transaction when the account is unknown)
+        """
+        account = normalize_account(statement_data.get('card_account_number'))
+        fingerprints = [row[-1] for row in fingerprint_rows(statement_data)]
+        if account is None:
+            return [None] * len(fingerprints)
+
+        connection = self._connection()
+        known = {}
+        for start in range(0, len(fingerprints), LOOKUP_CHUNK):
+            chunk = fingerprints[start:start + LOOKUP_CHUNK]
+            known.update(connection.execute(
+                f"""SELECT fingerprint, category FROM transactions
+                    WHERE account = ? AND fingerprint IN ({", ".join("?" * len(chunk))})""",
+                [account] + chunk
+            ).fetchall())
+        return [known.get(fingerprint) for fingerprint in fingerprints]
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def list_statements(self, account=None, date_from=None, date_to=None, limit=50, offset=0):
+        """
+        List stored statements, newest first
+
+        Args:
+            account: Only this card account
+            date_from: Earliest statement date (YYYY-MM-DD, inclusive)
+            date_to: Latest statement date (YYYY-MM-DD, inclusive)
+            limit: Page size (capped at MAX_PAGE_SIZE)
+            offset: Rows to skip
+
+        Returns:
+            dict: 'statements' page and 'total_count'
+        """
+        where, params = self._filters(
+            ("account", "=", normalize_account(account)),
+            ("statement_date", ">=", date_from),
+            ("statement_date", "<=", date_to)
+        )
+        connection = self._connection()
+        total = connection.execute(f"SELECT COUNT(*) FROM statements{where}", params).fetchone()[0]
+        rows = connection.execute(
+            f"""SELECT analysis_id, account, statement_date, total_debits, total_credits,
+                       closing_balance, transaction_count, new_transaction_count, created_at
+                FROM statements{where}
+                ORDER BY statement_date DESC, id DESC LIMIT ? OFFSET ?""",
+            params + [min(limit, MAX_PAGE_SIZE), offset]
+        ).fetchall()
+        return {"statements": [dict(row) for row in rows], "total_count": total}
+
+    def get_statement(self, analysis_id):
+        """Return one stored statement with every transaction on it, or None"""
+        connection = self._connection()
+        row = connection.execute(
+            """SELECT id, analysis_id, account, statement_date, total_debits, total_credits,
+                      closing_balance, transaction_count, new_transaction_count, created_at
+               FROM statements WHERE analysis_id = ?""",
+            (analysis_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        statement = dict(row)
+        statement_id = statement.pop('id')
+        statement['transactions'] = [
+            dict(txn) for txn in connection.execute(
+                """SELECT t.txn_date, t.description, t.amount, t.category
+                   FROM statement_transactions st JOIN transactions t ON t.id = st.transaction_id
+                   WHERE st.statement_id = ? ORDER BY st.position""",
+                (statement_id,)
+            )
+        ]
+        return statement
+
+    def query_transactions(self, account=None, category=None, date_from=None, date_to=None,
+                           limit=100, offset=0):
+        """
+        Query transaction history
+
+        Legacy repeats that _migrate left without a fingerprint are skipped,
+        so every transaction is counted once, as in category_totals.
+
+        Args:
+            account: Only this card account
+            category: Only this category
+            date_from: Earliest transaction date (YYYY-MM-DD, inclusive)
+            date_to: Latest transaction date (YYYY-MM-DD, inclusive)
+            limit: Page size (capped at MAX_PAGE_SIZE)
+            offset: Rows to skip
+
+        Returns:
+            dict: 'transactions' page plus 'total_count', 'total_debits' and
+                  'total_credits' over every matching row
+        """
+        where, params = self._filters(
+            ("t.account", "=", normalize_account(account)),
+            ("t.category", "=", category),
+            ("t.txn_date", ">=", date_from),
+            ("t.txn_date", "<=", date_to),
+            clauses=["t.fingerprint IS NOT NULL"]
+        )
+        connection = self._connection()
+        summary = connection.execute(
+            f"""SELECT COUNT(*),
+                       COALESCE(SUM(CASE WHEN amount > 0 THEN amount END), 0.0),
+                       COALESCE(-SUM(CASE WHEN amount < 0 THEN amount END), 0.0)
+                FROM transactions t{where}""",
+            params
+        ).fetchone()
+        rows = connection.execute(
+            f"""SELECT t.txn_date, t.description, t.amount, t.category, t.account,
+                       s.analysis_id, s.statement_date
+                FROM transactions t JOIN statements s ON s.id = t.statement_id{where}
+                ORDER BY t.txn_date DESC, t.id DESC LIMIT ? OFFSET ?""",
+            params + [min(limit, MAX_PAGE_SIZE), offset]
+        ).fetchall()
+
+        return {
+            "transactions": [dict(row) for row in rows],
+            "total_count": summary[0],
+            "total_debits": round(summary[1], 2),
+            "total_credits": round(summary[2], 2),
+        }
+
+    def transaction_rows(self, account=None, date_from=None, date_to=None):
+        """
+        Every matching transaction as (txn_date, amount, category, merchant)
+        tuples, unpaged, for loading into columnar analytics (legacy repeats
+        without a fingerprint are skipped, as in query_transactions)
+
+        Args:
+            account: Only this card account
+            date_from: Earliest transaction date (YYYY-MM-DD, inclusive)
+            date_to: Latest transaction date (YYYY-MM-DD, inclusive)
+        """
+        where, params = self._filters(
+            ("account", "=", normalize_account(account)),
+            ("txn_date", ">=", date_from),
+            ("txn_date", "<=", date_to),
+            clauses=["fingerprint IS NOT NULL"]
+        )
+        cursor = self._connection().execute(
+            f"SELECT txn_date, amount, category, merchant FROM transactions{where}", params
+        )
+        # Plain tuples instead of sqlite3.Row - cheaper to build and to unzip
+        cursor.row_factory = None
+        return cursor.fetchall()
+
+    def category_totals(self, account=None):
+        """
+        Running debit/credit totals per category, kept up to date on every save
+
+        Args:
+            account: Only this card account (all accounts when None)
+
+        Returns:
+            dict: 'categories' (largest debits first), 'total_debits',
+                  'total_credits' and 'transaction_count'
+        """
+        where, params = self._filters(("account", "=", normalize_account(account)))
+        rows = self._connection().execute(
+            f"""SELECT category, SUM(debits) AS debits, SUM(credits) AS credits,
+                       SUM(transaction_count) AS transaction_count
+                FROM category_totals{where}
+                GROUP BY category ORDER BY debits DESC""",
+            params
+        ).fetchall()
+        categories = [
+            {
+                "category": row['category'],
+                "debits": round(row['debits'], 2),
+                "credits": round(row['credits'], 2),
+                "transaction_count": row['transaction_count'],
+            }
+            for row in rows
+        ]
+        return {
+            "categories": categories,
+            "total_debits": round(sum(row['debits'] for row in rows), 2),
+            "total_credits": round(sum(row['credits'] for row in rows), 2),
+            "transaction_count": sum(row['transaction_count'] for row in rows),
+        }
+
+    def stats(self):
+        """Return stored row counts"""
+        connection = self._connection()
+        return {
+            "statements": connection.execute("SELECT COUNT(*) FROM statements").fetchone()[0],
+            "transactions": connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0],
+            "accounts": connection.execute(
+                "SELECT COUNT(DISTINCT account) FROM statements"
+            ).fetchone()[0],
+        }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _filters(*conditions, clauses=()):
+        """
+        Build a WHERE clause from (column, operator, value) triples, skipping None values
+
+        Args:
+            conditions: (column, operator, value) triples
+            clauses: SQL conditions without parameters, always applied
+        """
+        clauses, params = list(clauses), []
+        for column, operator, value in conditions:
+            if value is None:
+                continue
+            clauses.append(f"{column} {operator} ?")
+            params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @staticmethod
+    def _migrate(connection):
+        """Bring a database created before transaction fingerprints up to the current schema"""
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(transactions)")}
+        if "fingerprint" not in columns:
+            with connection:
+                connection.execute("ALTER TABLE statements ADD COLUMN new_transaction_count INTEGER")
+                connection.execute("ALTER TABLE transactions ADD COLUMN fingerprint TEXT")
+                # Rows stored before deduplication stay; repeats keep a NULL fingerprint
+                seen = set()
+                occurrences = {}
+                updates = []
+                for row in connection.execute(
+                    "SELECT id, statement_id, account, txn_date, description, amount FROM transactions ORDER BY id"
+                ):
+                    identity = (row[1], row[3], normalize_description(row[4]), round(row[5], 2))
+                    occurrence = occurrences.get(identity, 0)
+                    occurrences[identity] = occurrence + 1
+                    fingerprint = transaction_fingerprint(row[3], row[4], row[5], occurrence)
+                    if row[2] is None or (row[2], fingerprint) not in seen:
+                        seen.add((row[2], fingerprint))
+                        updates.append((fingerprint, row[0]))
+                connection.executemany("UPDATE transactions SET fingerprint = ? WHERE id = ?", updates)
+
+    @staticmethod
+    def _backfill_category_totals(connection):
+        """
+        Build the running totals once for a database that has transactions but none yet
+
+        Legacy repeats that _migrate left without a fingerprint are not counted.
+        """
+        if connection.execute("SELECT 1 FROM category_totals LIMIT 1").fetchone():
+            return
+        with connection:
+            connection.execute(
+                """INSERT INTO category_totals (account, category, debits, credits, transaction_count)
+                   SELECT COALESCE(account, ''), COALESCE(category, 'Other'),
+                          COALESCE(SUM(CASE WHEN amount > 0 THEN amount END), 0.0),
+                          COALESCE(-SUM(CASE WHEN amount < 0 THEN amount END), 0.0),
+                          COUNT(*)
+                   FROM transactions WHERE fingerprint IS NOT NULL GROUP BY 1, 2"""
+            )
+
+    @staticmethod
+    def _backfill_statement_transactions(connection):
+        """Link the rows of statements stored before statement_transactions existed"""
+        if connection.execute("SELECT 1 FROM statement_transactions LIMIT 1").fetchone():
+            return
+        with connection:
+            connection.execute(
+                """INSERT INTO statement_transactions (statement_id, position, transaction_id)
+                   SELECT statement_id, id, id FROM transactions"""
+            )
+
+    def _connection(self):
+        """One connection per thread (sqlite3 connections are not shareable)"""
+        if self.path == ":memory:":
+            # A private in-memory database exists per connection - share one
+            if self._memory_connection is None:
+                self._memory_connection = self._connect()
+            return self._memory_connection
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=self.path != ":memory:")
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA foreign_keys = ON")
+        if self.path != ":memory:":
+            # Readers do not block the writer (and vice versa)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
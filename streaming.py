@@ -0,0 +1,99 @@
+"""
+Helpers for streaming analysis results as server-sent events (SSE)
+
+RecommendationStreamParser consumes the recommendation model's output as it
+arrives and yields each CategoryRecommendation object as soon as its closing
+brace is seen, so clients can render advice before the full JSON is complete.
+"""
+
+import json
+
+
+def format_sse(event, data):
+    """
+    Format one server-sent event
+
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+
+    Returns:
+        str: SSE frame terminated by a blank line
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class RecommendationStreamParser:
+    """Incrementally extract objects from the "recommendations" JSON array"""
+
+    ARRAY_KEY = '"recommendations"'
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._in_array = False
+        self._array_done = False
+        self._depth = 0
+        self._object_start = None
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        """
+        Add streamed text and return the objects completed by it
+
+        Args:
+            text: Next chunk of model output
+
+        Returns:
+            list[dict]: Newly completed recommendation objects
+        """
+        self._buffer += text
+        completed = []
+
+        if not self._in_array and not self._array_done:
+            self._find_array_start()
+
+        while self._in_array and self._position < len(self._buffer):
+            char = self._buffer[self._position]
+            self._position += 1
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = self._position - 1
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    raw = self._buffer[self._object_start:self._position]
+                    self._object_start = None
+                    try:
+                        completed.append(json.loads(raw))
+                    except ValueError:
+                        pass
+            elif char == "]" and self._depth == 0:
+                self._in_array = False
+                self._array_done = True
+
+        return completed
+
+    def _find_array_start(self):
+        key_index = self._buffer.find(self.ARRAY_KEY)
+        if key_index == -1:
+            return
+        bracket_index = self._buffer.find("[", key_index + len(self.ARRAY_KEY))
+        if bracket_index == -1:
+            return
+        self._in_array = True
+        self._position = bracket_index + 1
@@ -0,0 +1,142 @@
+"""
+Schema-constrained model output
+
+In structured-output mode the model is asked for JSON that conforms to the
+JSON Schema of a pydantic model (OpenAI strict json_schema response format)
+instead of free-form text with a JSON template in the prompt. Replies are
+validated against the same pydantic model. A reply that still fails
+validation (e.g. cut off at the token limit) gets one cheap text-only repair
+call that sees only the broken reply and the validation errors, never the
+statement image.
+"""
+
+import copy
+import functools
+import json
+
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+
+
+# Longest broken reply quoted back in a repair prompt
+REPAIR_MAX_CHARS = 20000
+
+
+def strict_json_schema(model):
+    """
+    JSON Schema of a pydantic model in the form strict structured output accepts
+
+    Every object lists all of its properties as required and forbids extra
+    ones; optional fields stay nullable. Defaults are dropped.
+
+    Args:
+        model: Pydantic model class
+
+    Returns:
+        dict: JSON Schema
+    """
+    schema = copy.deepcopy(model.model_json_schema())
+
+    def tighten(node):
+        if isinstance(node, list):
+            for item in node:
+                tighten(item)
+            return
+        if not isinstance(node, dict):
+            return
+        node.pop("default", None)
+        if node.get("type") == "object" and "properties" in node:
+            node["required"] = list(node["properties"])
+            node["additionalProperties"] = False
+        for value in node.values():
+            tighten(value)
+
+    tighten(schema)
+    return schema
+
+
+def response_format(model):
+    """
+    Response format constraining a reply to a pydantic model
+
+    Args:
+        model: Pydantic model class
+
+    Returns:
+        dict: OpenAI json_schema response format
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": model.__name__,
+            "schema": strict_json_schema(model),
+            "strict": True,
+        },
+    }
+
+
+def strip_code_fences(text):
+    """Drop a markdown code fence around a JSON reply, if any"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def validate_output(model, text):
+    """
+    Validate a model reply against a pydantic model
+
+    Args:
+        model: Pydantic model class
+        text: Raw reply text
+
+    Returns:
+        dict: Validated data (optional fields filled with their defaults)
+
+    Raises:
+        OutputParserException: The reply is not valid JSON for the model
+    """
+    try:
+        return model.model_validate_json(strip_code_fences(text)).model_dump()
+    except ValidationError as e:
+        raise OutputParserException(
+            f"Reply does not match {model.__name__}: {e}", llm_output=text
+        ) from e
+
+
+@functools.lru_cache(maxsize=None)
+def repair_prompt_prefix(model):
+    """Static part of the repair prompt for a pydantic model (instructions and schema)"""
+    return f"""Your previous reply could not be used: it is not valid JSON for the required schema.
+
+Return the corrected data as a single JSON object matching this JSON Schema. Keep every
+value that was already present; only fix the structure and complete what is cut off.
+{json.dumps(strict_json_schema(model))}
+"""
+
+
+def build_repair_prompt(model, text, error):
+    """
+    Build the text-only prompt asking the model to fix an invalid reply
+
+    The instructions and schema come first (identical for every repair of the
+    same model), the validation errors and the invalid reply last.
+
+    Args:
+        model: Pydantic model class the reply must match
+        text: The invalid reply
+        error: The validation error
+
+    Returns:
+        str: Repair prompt
+    """
+    return f"""{repair_prompt_prefix(model)}
+Validation errors:
+{error}
+
+Previous reply:
+{text[:REPAIR_MAX_CHARS]}
+"""
@@ -0,0 +1,175 @@
+"""
+Tiled extraction of tall statement images
+
+Long scrolled screenshots and tall scans are downscaled so far when sent as
+one image (by the preprocessing stage and again by the provider) that small
+transaction rows become illegible. Tall images are instead cut into
+overlapping horizontal tiles of roughly page proportions, each extracted on
+its own. Rows inside an overlap are read twice; merge_tile_transactions()
+removes those duplicates before aggregation.
+"""
+
+import io
+import math
+
+from PIL import Image, ImageOps
+
+from store import merchant_key
+
+
+class ImageTile:
+    """One horizontal slice of a tall image"""
+
+    def __init__(self, number, tile_count, image, top, bottom):
+        self.number = number
+        self.tile_count = tile_count
+        self.image = image
+        self.top = top
+        self.bottom = bottom
+
+
+class ImageTiler:
+    """Split tall images into overlapping horizontal tiles"""
+
+    def __init__(self, min_aspect=2.0, tile_aspect=1.4, overlap=0.15, max_tiles=12):
+        """
+        Args:
+            min_aspect: Images at least this many times taller than wide are tiled
+            tile_aspect: Tile height as a multiple of the image width
+            overlap: Fraction of each tile shared with the next one; must be
+                     taller than a transaction row so every row is whole in
+                     at least one tile
+            max_tiles: Taller images get taller tiles instead of more tiles
+        """
+        if not 0 <= overlap < 0.5:
+            raise ValueError(f"Tile overlap must be in [0, 0.5): {overlap}")
+
+        self.min_aspect = min_aspect
+        self.tile_aspect = tile_aspect
+        self.overlap = overlap
+        self.max_tiles = max_tiles
+
+    @property
+    def signature(self):
+        """Stable description of the settings (part of result cache keys)"""
+        return f"tile-a{self.min_aspect}-t{self.tile_aspect}-o{self.overlap}-m{self.max_tiles}"
+
+    def layout(self, width, height):
+        """
+        Compute the tile rows for an image size
+
+        Args:
+            width: Image width in pixels
+            height: Image height in pixels
+
+        Returns:
+            list[tuple]: (top, bottom) of each tile, or an empty list when the
+                         image is not tall enough to tile
+        """
+        if width <= 0 or height < width * self.min_aspect:
+            return []
+
+        tile_height = round(width * self.tile_aspect)
+        # Tiles advance by tile_height * (1 - overlap); taller images would need too many
+        count = math.ceil((height - tile_height) / (tile_height * (1 - self.overlap))) + 1
+        if count > self.max_tiles:
+            count = self.max_tiles
+            tile_height = math.ceil(height / (count - (count - 1) * self.overlap))
+        if count < 2:
+            return []
+
+        # Spread the tiles evenly so the last one ends exactly at the bottom
+        step = (height - tile_height) / (count - 1)
+        return [(round(index * step), round(index * step) + tile_height) for index in range(count)]
+
+    def split(self, image_bytes):
+        """
+        Cut an uploaded image into tiles
+
+        Args:
+            image_bytes: Raw uploaded image bytes
+
+        Returns:
+            list[ImageTile]: Tiles top to bottom, or an empty list when the
+                             image is not tall (or cannot be decoded)
+        """
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as source:
+                image = ImageOps.exif_transpose(source)
+                rows = self.layout(*image.size)
+                if not rows:
+                    return []
+                image.load()
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return []
+
+        return [
+            ImageTile(number, len(rows), image.crop((0, top, image.width, bottom)), top, bottom)
+            for number, (top, bottom) in enumerate(rows, 1)
+        ]
+
+
+def transaction_key(txn):
+    """Identity of a transaction row that survives small OCR differences between tiles"""
+    try:
+        amount = round(float(txn.get('amount')), 2)
+    except (TypeError, ValueError):
+        amount = None
+    return str(txn.get('date') or "").strip(), amount, merchant_key(txn.get('description') or "")
+
+
+def overlap_length(previous, current):
+    """
+    Find how many leading rows of a tile repeat the trailing rows of the tile above
+
+    Rows cut by a tile edge may be missing or misread on one side, so one
+    unmatched edge row is tolerated on each side of the overlap.
+
+    Args:
+        previous: Transaction keys of the tile above
+        current: Transaction keys of this tile
+
+    Returns:
+        tuple: (rows to drop from the end of previous, rows to drop from the
+                start of current); (0, 0) when the tiles share no rows
+    """
+    best = (0, 0, 0)
+    for trim_previous in (0, 1):
+        for trim_current in (0, 1):
+            end = len(previous) - trim_previous
+            for length in range(min(end, len(current) - trim_current), 0, -1):
+                if previous[end - length:end] == current[trim_current:trim_current + length]:
+                    # Longest overlap wins; on ties prefer fewer edge rows dropped
+                    if length > best[0]:
+                        best = (length, trim_previous, trim_current)
+                    break
+
+    length, trim_previous, trim_current = best
+    if not length:
+        return 0, 0
+    return trim_previous, trim_current + length
+
+
+def merge_tile_transactions(tile_transactions):
+    """
+    Concatenate per-tile transactions, dropping rows read twice in an overlap
+
+    Args:
+        tile_transactions: One transaction list per tile, top to bottom
+
+    Returns:
+        list[dict]: Transactions in statement order
+    """
+    merged = []
+    previous_keys, appended = [], 0
+    for transactions in tile_transactions:
+        transactions = list(transactions or [])
+        keys = [transaction_key(txn) for txn in transactions]
+
+        drop_previous, drop_current = overlap_length(previous_keys, keys)
+        # Only rows the tile above actually contributed can be replaced
+        drop_previous = min(drop_previous, appended)
+        del merged[len(merged) - drop_previous:]
+        merged.extend(transactions[drop_current:])
+        previous_keys, appended = keys, len(transactions) - drop_current
+    return merged